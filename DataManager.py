@@ -1,6 +1,138 @@
 import os
-import json
+import time
+import atexit
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
+from app.scripts.GunRouletteGame.storage import (
+    create_storage,
+    is_group_data_dir,
+    peek_current_game,
+)
+from app.scripts.GunRouletteGame.fileio import sync_pending_writes
+from app.scripts.GunRouletteGame.tracing import traced
+from app.scripts.GunRouletteGame.expiry import touch_loaded_game
+
+# 数据根目录 data/GunRouletteGame，可通过环境变量 GUN_ROULETTE_DATA_DIR 指定其他目录
+BASE_DATA_DIR = os.environ.get("GUN_ROULETTE_DATA_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data",
+    "GunRouletteGame",
+)
+
+# 脏数据写回间隔（秒），为 0 时每次修改立即落盘
+FLUSH_INTERVAL_SECONDS = 5
+# 每个群组在内存中缓存的玩家数据条数上限
+PLAYER_CACHE_SIZE = 512
+# 群组闲置多久（秒）后写回并关闭其 DataManager，从内存中移除，下次访问时重新加载；
+# 环境变量 GUN_ROULETTE_GROUP_IDLE_EVICT 设定，0 表示常驻不移除
+GROUP_IDLE_EVICT_SECONDS = int(
+    os.environ.get("GUN_ROULETTE_GROUP_IDLE_EVICT", "1800") or 0
+)
+# 是否用游戏日志保存进行中的游戏（环境变量 GUN_ROULETTE_GAME_JOURNAL=1 开启）：
+# 开始和每次未结束游戏的biu立即追加一条记录，不再标记游戏状态待写回，
+# 游戏状态快照只在开始后的写回和结算时写入，加载时由快照加日志恢复当前游戏。
+# 关闭时进行中的游戏随写回间隔保存，进程崩溃最多丢失 FLUSH_INTERVAL_SECONDS 内的biu
+GAME_JOURNAL_ENABLED = os.environ.get("GUN_ROULETTE_GAME_JOURNAL", "0") == "1"
+
+# 玩家数据格式版本
+PLAYER_DATA_VERSION = 2
+# 玩家数据中保留的最近参与游戏ID数量
+RECENT_GAMES_LIMIT = 20
+# 玩家发起游戏时间保留时长（秒），用于检查发起游戏频率
+INITIATION_HISTORY_SECONDS = 24 * 60 * 60
+
+# 进程内常驻的 DataManager 实例 {group_id: DataManager}
+_data_managers = {}
+_data_managers_lock = threading.Lock()
+
+
+def get_data_manager(group_id, touch=True):
+    """
+    获取群组对应的常驻 DataManager 实例。
+
+    同一进程内每个群组只会创建一次 DataManager，游戏状态和热点玩家数据常驻内存，
+    避免每条命令都重新创建目录、重新读取 game_status.json。
+    闲置超过 GROUP_IDLE_EVICT_SECONDS 的群组由心跳移除（见 evict_data_manager），
+    心跳中的预加载等后台访问传入 touch=False，不计为群组活动。
+    """
+    group_id = str(group_id)
+    data_manager = _data_managers.get(group_id)
+    if data_manager is None:
+        with _data_managers_lock:
+            data_manager = _data_managers.get(group_id)
+            if data_manager is None:
+                data_manager = DataManager(group_id)
+                _data_managers[group_id] = data_manager
+    if touch:
+        data_manager.last_access_time = time.monotonic()
+    return data_manager
+
+
+def get_loaded_data_managers():
+    """获取当前进程中已加载的所有 DataManager 实例"""
+    return list(_data_managers.values())
+
+
+def is_data_manager_loaded(group_id):
+    """群组的 DataManager 是否常驻内存（未加载或已因闲置移除时返回 False）"""
+    return str(group_id) in _data_managers
+
+
+def evict_data_manager(group_id):
+    """
+    写回并关闭闲置群组的 DataManager，从常驻实例中移除，释放玩家缓存和存储打开的文件。
+    调用方需持有群组锁；写回期间被访问过、有进行中的游戏或仍有脏数据时不移除，
+    返回是否已移除
+    """
+    group_id = str(group_id)
+    data_manager = _data_managers.get(group_id)
+    if data_manager is None or not data_manager.is_idle():
+        return False
+    data_manager.flush()
+    with _data_managers_lock:
+        if (
+            _data_managers.get(group_id) is not data_manager
+            or not data_manager.is_idle()
+            or data_manager.has_dirty_data()
+        ):
+            return False
+        del _data_managers[group_id]
+    data_manager.storage.close()
+    return True
+
+
+def load_groups_with_running_games(group_filter=None):
+    """
+    扫描数据目录，加载存储中有进行中游戏（游戏状态快照或游戏日志）的群组，
+    加载时按游戏最近活动时间加入闲置超时表，重启后无人发言的群组也能按时结算。
+    group_filter(group_id) 返回 False 的群组跳过，返回本次加载的群组数
+    """
+    if not os.path.isdir(BASE_DATA_DIR):
+        return 0
+    loaded = 0
+    for name in os.listdir(BASE_DATA_DIR):
+        data_dir = os.path.join(BASE_DATA_DIR, name)
+        if name in _data_managers or not is_group_data_dir(data_dir):
+            continue
+        if group_filter is not None and not group_filter(name):
+            continue
+        current_game, has_events = peek_current_game(data_dir)
+        if has_events or (
+            current_game is not None and current_game.get("status") == "running"
+        ):
+            get_data_manager(name)
+            loaded += 1
+    return loaded
+
+
+def flush_all_data_managers():
+    """将所有群组的脏数据立即落盘，进程退出时调用"""
+    for data_manager in list(_data_managers.values()):
+        data_manager.flush()
+
+
+atexit.register(flush_all_data_managers)
 
 
 class DataManager:
@@ -8,27 +140,36 @@ class DataManager:
     数据管理类
 
     负责管理游戏数据，包括游戏状态、玩家、分数等。
+    游戏状态和玩家数据的修改先写入内存并标记为脏数据，按 FLUSH_INTERVAL_SECONDS 间隔
+    或进程退出时统一写回文件。进行中游戏的开始和biu另外追加到游戏日志（GAME_JOURNAL_ENABLED），
+    写入游戏状态快照时清空日志。请通过 get_data_manager 获取实例。
     """
 
     def __init__(self, group_id):
-        base_data_path = os.path.join(
-            os.path.dirname(
-                os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            ),
-            "data",
-            "GunRouletteGame",
-        )
-        self.data_dir = os.path.join(base_data_path, str(group_id))
-        self.game_history_dir = os.path.join(self.data_dir, "game_history")
-        self.player_data_dir = os.path.join(self.data_dir, "player_data")
-
+        self.data_dir = os.path.join(BASE_DATA_DIR, str(group_id))
         os.makedirs(self.data_dir, exist_ok=True)
-        os.makedirs(self.game_history_dir, exist_ok=True)
-        os.makedirs(self.player_data_dir, exist_ok=True)
 
         self.group_id = str(group_id)
+        # 存储后端，由 storage.STORAGE_BACKEND 决定使用 JSON 文件还是 SQLite
+        self.storage = create_storage(self.data_dir)
         self.game_status = self._load_game_status()
 
+        # 玩家数据缓存 {user_id: player_data}，按最近访问顺序排列
+        self._player_cache = OrderedDict()
+        # 待写回的玩家ID集合
+        self._dirty_players = set()
+        # 游戏状态是否待写回
+        self._game_status_dirty = False
+        # 游戏日志中是否有快照之后追加的事件
+        self._game_journal_dirty = False
+        self._last_flush_time = time.monotonic()
+        # 最近一次通过 get_data_manager 访问的时间，用于移除闲置群组
+        self.last_access_time = time.monotonic()
+        # 用上次快照之后的游戏日志恢复进行中的游戏
+        self._replay_game_events()
+        # 进行中的游戏按最近一次活动时间加入闲置超时表
+        touch_loaded_game(self.group_id, self.game_status.get("current_game"))
+
     def _load_game_status(self):
         """
         加载或初始化游戏状态文件。
@@ -52,7 +193,6 @@ class DataManager:
             }
         }
         """
-        status_file = os.path.join(self.data_dir, "game_status.json")
         default_game_status = {
             "group_id": self.group_id,
             "daily_games_ended_count": 0,
@@ -62,46 +202,167 @@ class DataManager:
             "current_game": None,
         }
 
-        if os.path.exists(status_file):
-            try:
-                with open(status_file, "r", encoding="utf-8") as f:
-                    loaded_status = json.load(f)
-                    # 可以在这里添加版本迁移或字段检查逻辑
-                    return loaded_status
-            except (json.JSONDecodeError, FileNotFoundError):
-                # 文件损坏或不存在，使用默认值并保存
-                with open(status_file, "w", encoding="utf-8") as f:
-                    json.dump(default_game_status, f, ensure_ascii=False, indent=4)
-                return default_game_status
-        else:
-            with open(status_file, "w", encoding="utf-8") as f:
-                json.dump(default_game_status, f, ensure_ascii=False, indent=4)
-            return default_game_status
+        loaded_status = self.storage.load_game_status()
+        if loaded_status is not None:
+            # 可以在这里添加版本迁移或字段检查逻辑
+            return loaded_status
+        # 数据损坏或不存在，使用默认值并保存
+        self.storage.save_game_status(default_game_status)
+        return default_game_status
 
     def save_game_status(self):
         """
-        保存当前游戏状态到文件 game_status.json
+        标记当前游戏状态待保存，到达写回间隔时写入文件 game_status.json
+        """
+        self._game_status_dirty = True
+        self._maybe_flush()
+
+    def save_game_start(self):
+        """
+        保存刚开始的游戏：追加开始事件，快照按写回间隔写入
+        """
+        if GAME_JOURNAL_ENABLED:
+            self.storage.append_game_event(
+                {"type": "start", "game": self.game_status["current_game"]}
+            )
+            self._game_journal_dirty = True
+        self.save_game_status()
+
+    def save_game_shot(self, user_id):
+        """
+        保存一次未结束游戏的biu：只追加一条记录（玩家、置权、biu顺序、是否命中），
+        不重写游戏状态快照。结束游戏的biu由结算一并保存。
+        """
+        if not GAME_JOURNAL_ENABLED:
+            self.save_game_status()
+            return
+        current_game = self.game_status["current_game"]
+        participant = current_game["participants"][user_id]
+        self.storage.append_game_event(
+            {
+                "type": "shot",
+                "game_id": current_game["id"],
+                "user_id": user_id,
+                "bet": participant["bet"],
+                "shot_order": participant["shot_order"],
+                "is_hit": participant["is_hit"],
+                "shot_time": participant["shot_time"],
+            }
+        )
+        self._game_journal_dirty = True
+
+    def _replay_game_events(self):
+        """
+        将游戏日志中的事件应用到游戏状态快照上。
+        事件可能已包含在快照中（写入快照后、清空日志前中断），重复应用不会改变结果。
         """
-        status_file = os.path.join(self.data_dir, "game_status.json")
-        with open(status_file, "w", encoding="utf-8") as f:
-            json.dump(self.game_status, f, ensure_ascii=False, indent=4)
+        events = self.storage.load_game_events()
+        if not events:
+            return
+        current_game = self.game_status.get("current_game")
+        for event in events:
+            if event.get("type") == "start":
+                if current_game is None or current_game["id"] != event["game"]["id"]:
+                    current_game = event["game"]
+            elif event.get("type") == "shot":
+                if current_game is None or current_game["id"] != event["game_id"]:
+                    continue
+                if event["user_id"] in current_game["participants"]:
+                    continue
+                current_game["participants"][event["user_id"]] = {
+                    "bet": event["bet"],
+                    "shot_order": event["shot_order"],
+                    "is_hit": event["is_hit"],
+                    "shot_time": event["shot_time"],
+                }
+                current_game["shots_fired_count"] += 1
+                if event["is_hit"]:
+                    current_game["is_bullet_fired_this_game"] = True
+        # 已有历史记录说明该局已结算，只是日志尚未清空
+        if (
+            current_game is not None
+            and self.storage.get_game_history(current_game["id"]) is not None
+        ):
+            current_game = None
+        self.game_status["current_game"] = current_game
+        # 下次写回时写入快照并清空日志
+        self._game_status_dirty = True
+        self._game_journal_dirty = True
+
+    @traced("DataManager.flush")
+    def flush(self):
+        """
+        将内存中所有待保存的游戏状态和玩家数据立即写入存储后端，
+        支持事务的后端在一次提交中完成
+        """
+        with self.storage.transaction():
+            if self._dirty_players:
+                self.storage.save_players(
+                    {
+                        user_id: self._player_cache[user_id]
+                        for user_id in self._dirty_players
+                    }
+                )
+                self._dirty_players.clear()
+            if self._game_status_dirty:
+                self.storage.save_game_status(self.game_status)
+                self._game_status_dirty = False
+                # 快照已包含日志中的所有事件，清空日志
+                if self._game_journal_dirty:
+                    self.storage.clear_game_events()
+                    self._game_journal_dirty = False
+        # batch 持久化模式下统一 fsync 本次写回的文件
+        sync_pending_writes()
+        self._last_flush_time = time.monotonic()
+
+    def is_flush_due(self):
+        """
+        有脏数据且距上次写回已超过 FLUSH_INTERVAL_SECONDS
+        """
+        if not (self._game_status_dirty or self._dirty_players):
+            return False
+        return time.monotonic() - self._last_flush_time >= FLUSH_INTERVAL_SECONDS
+
+    def has_dirty_data(self):
+        """
+        是否有尚未写回的游戏状态、玩家数据或游戏日志事件
+        """
+        return bool(
+            self._dirty_players or self._game_status_dirty or self._game_journal_dirty
+        )
+
+    def is_idle(self):
+        """
+        闲置超过 GROUP_IDLE_EVICT_SECONDS 且没有进行中的游戏，可以从内存中移除
+        """
+        if GROUP_IDLE_EVICT_SECONDS <= 0:
+            return False
+        if self.game_status.get("current_game") is not None:
+            return False
+        return time.monotonic() - self.last_access_time >= GROUP_IDLE_EVICT_SECONDS
+
+    def flush_if_due(self):
+        """
+        距上次写回已超过 FLUSH_INTERVAL_SECONDS 时写回脏数据
+        """
+        if self.is_flush_due():
+            self.flush()
+
+    def _maybe_flush(self):
+        if FLUSH_INTERVAL_SECONDS <= 0:
+            self.flush()
+        else:
+            self.flush_if_due()
 
     def get_game_history(self, game_id):
         """
-        获取指定 game_id 的游戏历史记录。
+        获取指定 game_id 的游戏历史记录，不存在或损坏时返回 None。
         """
-        history_file = os.path.join(self.game_history_dir, f"{game_id}.json")
-        if os.path.exists(history_file):
-            try:
-                with open(history_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                return None  # 文件损坏
-        return None
+        return self.storage.get_game_history(game_id)
 
     def save_game_history(self, game_id, game_data):
         """
-        保存单场游戏历史记录到 data_dir/群号/game_history/游戏ID.json
+        保存单场游戏历史记录
         game_data 结构示例:
         {
             "game_id": "unique_game_id",
@@ -117,38 +378,126 @@ class DataManager:
             }
         }
         """
-        history_file = os.path.join(self.game_history_dir, f"{game_id}.json")
-        with open(history_file, "w", encoding="utf-8") as f:
-            json.dump(game_data, f, ensure_ascii=False, indent=4)
+        self.storage.save_game_history(game_id, game_data)
+
+    def get_player_recent_games(self, user_id, limit=10):
+        """
+        获取玩家最近参与的 limit 局游戏历史记录，最新的在前。
+        通过按玩家的历史索引查询，不读取其他玩家的记录。
+        """
+        return self.storage.get_player_history(str(user_id), limit)
+
+    def get_games_by_date(self, date_str):
+        """
+        获取指定日期（东八区 YYYY-MM-DD）开始的所有游戏历史记录，用于每日报表。
+        """
+        return self.storage.get_history_by_date(date_str)
+
+    def rebuild_history_indexes(self):
+        """
+        重建游戏历史的偏移索引和按玩家、按日期的二级索引，返回索引的记录数。
+        """
+        return self.storage.rebuild_history_indexes()
 
     def get_player_data(self, user_id):
         """
-        获取指定玩家的数据 data_dir/群号/player_data/玩家QQ号.json
+        获取指定玩家的数据，优先从内存缓存读取，未命中时读取
+        data_dir/群号/player_data/玩家QQ号.json 并放入缓存。
         返回玩家数据字典，如果玩家文件不存在或解析失败，则返回默认玩家数据。
         """
-        player_file = os.path.join(self.player_data_dir, f"{user_id}.json")
-        default_player_data = {
+        user_id = str(user_id)
+        player_data = self._player_cache.get(user_id)
+        if player_data is None:
+            player_data = self._read_player_data(user_id)
+            self._cache_player_data(user_id, player_data)
+        else:
+            self._player_cache.move_to_end(user_id)
+        return player_data
+
+    def _read_player_data(self, user_id):
+        """
+        从存储后端读取指定玩家的数据，旧格式数据在读取时自动迁移。
+        玩家数据格式（版本 2）：
+        {
+            "version": 2,
+            "user_id": "str",
+            "total_score": 0,                 # 总得分
+            "games_participated_count": 0,    # 参与游戏次数
+            "recent_game_ids": [],            # 最近参与的游戏ID，最多 RECENT_GAMES_LIMIT 个
+            "games_initiated_count": 0,       # 发起游戏次数
+            "recent_initiation_times": [],    # 最近一天内发起游戏的时间（秒级时间戳），用于检查发起游戏频率
+        }
+        """
+        player_data = self.storage.load_player(user_id)
+        if player_data is None:
+            # 不存在或损坏，返回默认数据，但不覆盖原数据，让save时重建
+            return self._default_player_data(user_id)
+        if player_data.get("version") != PLAYER_DATA_VERSION:
+            player_data = self._migrate_player_data(user_id, player_data)
+        return player_data
+
+    @staticmethod
+    def _default_player_data(user_id):
+        return {
+            "version": PLAYER_DATA_VERSION,
             "user_id": str(user_id),
             "total_score": 0,
-            "games_participated_ids": [],
-            "games_initiated_timestamps": [],  # 用于检查发起游戏频率
+            "games_participated_count": 0,
+            "recent_game_ids": [],
+            "games_initiated_count": 0,
+            "recent_initiation_times": [],
         }
-        if os.path.exists(player_file):
-            try:
-                with open(player_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                # 文件损坏，返回默认数据，但不覆盖原文件，让save时重建
-                return default_player_data
-        return default_player_data
+
+    @classmethod
+    def _migrate_player_data(cls, user_id, old_data):
+        """
+        将旧格式（完整的 games_participated_ids 列表和 ISO 时间字符串列表）迁移为版本 2
+        """
+        player_data = cls._default_player_data(old_data.get("user_id", user_id))
+        player_data["total_score"] = old_data.get("total_score", 0)
+        participated_ids = old_data.get("games_participated_ids", [])
+        player_data["games_participated_count"] = len(participated_ids)
+        player_data["recent_game_ids"] = participated_ids[-RECENT_GAMES_LIMIT:]
+        initiated_timestamps = old_data.get("games_initiated_timestamps", [])
+        player_data["games_initiated_count"] = len(initiated_timestamps)
+        player_data["recent_initiation_times"] = [
+            int(datetime.fromisoformat(t).timestamp()) for t in initiated_timestamps
+        ]
+        return player_data
+
+    @staticmethod
+    def _add_participation(player_data, game_id):
+        """
+        记录一次参与，同一局游戏只计一次
+        """
+        if game_id in player_data["recent_game_ids"]:
+            return
+        player_data["games_participated_count"] += 1
+        player_data["recent_game_ids"].append(game_id)
+        del player_data["recent_game_ids"][:-RECENT_GAMES_LIMIT]
 
     def save_player_data(self, user_id, player_data):
         """
-        保存玩家数据到 data_dir/群号/player_data/玩家QQ号.json
+        保存玩家数据，先写入内存缓存，到达写回间隔时写入
+        data_dir/群号/player_data/玩家QQ号.json
         """
-        player_file = os.path.join(self.player_data_dir, f"{user_id}.json")
-        with open(player_file, "w", encoding="utf-8") as f:
-            json.dump(player_data, f, ensure_ascii=False, indent=4)
+        user_id = str(user_id)
+        self._cache_player_data(user_id, player_data)
+        self._dirty_players.add(user_id)
+        self._maybe_flush()
+
+    def _cache_player_data(self, user_id, player_data):
+        """
+        放入玩家数据缓存，超出 PLAYER_CACHE_SIZE 时淘汰最久未访问的玩家，
+        被淘汰的玩家如有未保存的修改会先写回文件
+        """
+        self._player_cache[user_id] = player_data
+        self._player_cache.move_to_end(user_id)
+        while len(self._player_cache) > PLAYER_CACHE_SIZE:
+            evicted_id, evicted_data = self._player_cache.popitem(last=False)
+            if evicted_id in self._dirty_players:
+                self.storage.save_players({evicted_id: evicted_data})
+                self._dirty_players.discard(evicted_id)
 
     # 辅助方法，可以在 GameManager 中调用
     def update_player_score(self, user_id, score_change):
@@ -156,18 +505,60 @@ class DataManager:
         player_data["total_score"] += score_change
         self.save_player_data(user_id, player_data)
 
+    def add_player_scores(self, score_changes):
+        """
+        在内存中为多名玩家累加积分并标记待写回，不触发写回，
+        由调用方在写入相关记录的同一事务中调用 flush 提交
+        """
+        for user_id, score_change in score_changes.items():
+            user_id = str(user_id)
+            player_data = self.get_player_data(user_id)
+            player_data["total_score"] += score_change
+            self._dirty_players.add(user_id)
+
     def record_player_game_participation(self, user_id, game_id):
         player_data = self.get_player_data(user_id)
-        if game_id not in player_data["games_participated_ids"]:
-            player_data["games_participated_ids"].append(game_id)
+        self._add_participation(player_data, game_id)
         self.save_player_data(user_id, player_data)
 
+    @traced("DataManager.settle_game")
+    def settle_game(self, game_id, score_changes, history_data):
+        """
+        批量结算一场游戏。
+
+        在内存中一次性更新所有参与者的总得分和参与记录（每个玩家至多读取一次），
+        然后在同一个存储事务中写入游戏历史、参与者数据和当前游戏状态，
+        调用前应已更新 game_status。
+
+        Args:
+            game_id (str): 游戏ID。
+            score_changes (dict): 每个玩家的得分变化 {user_id: score_change}。
+            history_data (dict): 游戏历史记录，格式见 save_game_history。
+        """
+        for user_id, score_change in score_changes.items():
+            user_id = str(user_id)
+            player_data = self.get_player_data(user_id)
+            player_data["total_score"] += score_change
+            self._add_participation(player_data, game_id)
+            self._dirty_players.add(user_id)
+        self._game_status_dirty = True
+
+        # 结算结果不等待写回间隔，立即提交
+        with self.storage.transaction():
+            self.storage.save_game_history(game_id, history_data)
+            self.flush()
+
     def record_player_game_initiation(self, user_id):
         player_data = self.get_player_data(user_id)
-        player_data["games_initiated_timestamps"].append(
-            datetime.now(timezone(timedelta(hours=8))).isoformat()
-        )
-        # 可以考虑限制列表长度，例如只保留最近N次记录
+        now_timestamp = int(time.time())
+        player_data["games_initiated_count"] += 1
+        # 只保留最近一天内的发起时间
+        player_data["recent_initiation_times"] = [
+            t
+            for t in player_data["recent_initiation_times"]
+            if t > now_timestamp - INITIATION_HISTORY_SECONDS
+        ]
+        player_data["recent_initiation_times"].append(now_timestamp)
         self.save_player_data(user_id, player_data)
 
     def get_rank(self):
@@ -175,29 +566,21 @@ class DataManager:
         获取轮盘排行榜
         返回列表，每个元素是一个字典，包含玩家ID、总得分
         """
-        # 获取所有玩家数据
-        player_data_dir = os.path.join(self.data_dir, "player_data")
-        player_files = [f for f in os.listdir(player_data_dir) if f.endswith(".json")]
-
-        # 读取玩家数据并排序
-        players = []
-        for player_file in player_files:
-            with open(
-                os.path.join(player_data_dir, player_file), "r", encoding="utf-8"
-            ) as f:
-                player_data = json.load(f)
-                players.append(
-                    {
-                        "user_id": player_data["user_id"],
-                        "total_score": player_data["total_score"],
-                    }
-                )
+        # 存储后端只包含已写回的分数，多取未写回玩家数量的条数，再用内存中的最新分数覆盖
+        candidates = {
+            rank["user_id"]: rank["total_score"]
+            for rank in self.storage.top_players(10 + len(self._dirty_players))
+        }
+        for user_id in self._dirty_players:
+            candidates[user_id] = self._player_cache[user_id]["total_score"]
+        players = [
+            {"user_id": user_id, "total_score": total_score}
+            for user_id, total_score in candidates.items()
+        ]
 
         # 按照分数从高到低排序，取前10名
-        players.sort(key=lambda x: x["total_score"], reverse=True)
-        players = players[:10]
-
-        return players
+        players.sort(key=lambda x: (-x["total_score"], x["user_id"]))
+        return players[:10]
 
     def get_my_roulette(self, user_id):
         """
@@ -208,6 +591,6 @@ class DataManager:
         message = f"玩家 [CQ:at,qq={user_id}]({user_id}) 的轮盘信息：\n"
         message += "-----------------\n"
         message += f"总得分：{player_data['total_score']}\n"
-        message += f"参与游戏次数：{len(player_data['games_participated_ids'])}\n"
-        message += f"发起游戏次数：{len(player_data['games_initiated_timestamps'])}"
+        message += f"参与游戏次数：{player_data['games_participated_count']}\n"
+        message += f"发起游戏次数：{player_data['games_initiated_count']}"
         return message
@@ -7,7 +7,10 @@
 import uuid
 import random
 from datetime import datetime, timedelta, timezone
-from app.scripts.GunRouletteGame.DataManager import DataManager
+from app.scripts.GunRouletteGame.DataManager import get_data_manager
+from app.scripts.GunRouletteGame.metrics import GAMES_ENDED_TOTAL
+from app.scripts.GunRouletteGame.tracing import traced
+from app.scripts.GunRouletteGame.expiry import cancel_game, touch_game
 
 # 游戏规则常量
 # 每日游戏上限
@@ -22,6 +25,14 @@ MAX_BET_AMOUNT = 10
 DEFAULT_BULLET_COUNT = 4
 
 
+def calculate_score_change(bullet_count, bet, is_hit):
+    """
+    一名参与者在一局中的得分变化：中弹损失 biubiu数 * 置权点数，否则获得同样的分数。
+    bet 和 is_hit 也可以是 NumPy 数组，经济模拟器按同一规则批量计算。
+    """
+    return (1 - 2 * is_hit) * bullet_count * bet
+
+
 class GameManager:
     """
     游戏核心逻辑管理类。
@@ -43,8 +54,9 @@ class GameManager:
         self.group_id = str(group_id)
         self.initiator_id = str(initiator_id)
         self.bullet_count = max(1, int(bullet_count))  # 确保biubiu数至少为1
-        self.data_manager = DataManager(group_id=self.group_id)
+        self.data_manager = get_data_manager(self.group_id)
 
+    @traced("GameManager.start_game")
     def start_game(self):
         """
         开始一场新的轮盘游戏。
@@ -78,34 +90,26 @@ class GameManager:
         # 3. 检查玩家发起游戏频率
         player_data = self.data_manager.get_player_data(self.initiator_id)
         now = datetime.now(timezone.utc)
-        cooldown_limit_time = now - timedelta(hours=PLAYER_INITIATION_COOLDOWN_HOURS)
+        now_timestamp = int(now.timestamp())
+        cooldown_seconds = PLAYER_INITIATION_COOLDOWN_HOURS * 60 * 60
 
         recent_initiations = [
             t
-            for t in player_data.get("games_initiated_timestamps", [])
-            if datetime.fromisoformat(t) > cooldown_limit_time
+            for t in player_data.get("recent_initiation_times", [])
+            if t > now_timestamp - cooldown_seconds
         ]
         if recent_initiations:
-            # 计算最近一次发起游戏到现在的时间差，用于友好提示
-            last_init_time = datetime.fromisoformat(recent_initiations[-1])
-            time_since_last_init = now - last_init_time
-            remaining_cooldown = (
-                timedelta(hours=PLAYER_INITIATION_COOLDOWN_HOURS) - time_since_last_init
-            )
+            # 计算剩余冷却时间，用于友好提示
+            remaining_cooldown = cooldown_seconds - (now_timestamp - recent_initiations[-1])
 
             # 将 remaining_cooldown 转换为更易读的格式，例如 xx分xx秒
-            remaining_minutes = int(remaining_cooldown.total_seconds() // 60)
-            remaining_seconds = int(remaining_cooldown.total_seconds() % 60)
+            remaining_minutes = int(remaining_cooldown // 60)
+            remaining_seconds = int(remaining_cooldown % 60)
 
             return {
                 "success": False,
                 "message": f"您发起游戏过于频繁，请在 {remaining_minutes}分{remaining_seconds}秒 后再试。",
             }
-        player_data["games_initiated_timestamps"] = [
-            t
-            for t in player_data.get("games_initiated_timestamps", [])
-            if datetime.fromisoformat(t) > (now - timedelta(days=1))
-        ]  # 清理一天前的记录
 
         # 生成一个六位的唯一ID
         game_id = "".join(random.choices("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=6))
@@ -125,7 +129,8 @@ class GameManager:
         }
 
         self.data_manager.game_status["current_game"] = current_game_data
-        self.data_manager.save_game_status()
+        self.data_manager.save_game_start()
+        touch_game(self.group_id, game_id)
 
         # 记录玩家发起游戏的时间戳
         self.data_manager.record_player_game_initiation(self.initiator_id)
@@ -137,6 +142,7 @@ class GameManager:
             "bullet_count": self.bullet_count,
         }
 
+    @traced("GameManager.player_shoot")
     def player_shoot(self, user_id: str, bet_amount: int):
         """
         处理玩家biu的逻辑。
@@ -199,7 +205,10 @@ class GameManager:
             game_data["participants"][user_id]["is_hit"] = True
 
         game_data["shots_fired_count"] += 1  # 无论是否命中，都增加已biu次数
-        self.data_manager.save_game_status()  # 保存参与者、biu次数和biubiu击发状态的更新
+        if not is_hit and game_data["shots_fired_count"] < game_data["bullet_count"]:
+            # 游戏未结束，保存本次biu；结束游戏的biu由 _end_game 结算时一并保存
+            self.data_manager.save_game_shot(user_id)
+            touch_game(self.group_id, game_data["id"])
 
         if is_hit:
             # 玩家中弹，游戏结束
@@ -268,6 +277,7 @@ class GameManager:
                     "hit": False,
                 }
 
+    @traced("GameManager.end_game")
     def _end_game(self, hit_player_id: str | None = None):  # 修正类型提示
         """
         结束当前游戏，计算得分，保存历史记录。
@@ -296,19 +306,18 @@ class GameManager:
             outcome = "player_hit"
             for pid, p_data in participants.items():
                 bet = p_data["bet"]
+                score_change = calculate_score_change(
+                    bullet_count, bet, pid == hit_player_id
+                )
                 if pid == hit_player_id:
-                    score_change = -1 * bullet_count * bet
                     outcome_summary_parts.append(
                         f"玩家 [CQ:at,qq={pid}] 中弹，置权 {bet} 点，损失 {abs(score_change)} 分。"
                     )
                 else:
-                    score_change = 1 * bullet_count * bet
                     outcome_summary_parts.append(
                         f"玩家 [CQ:at,qq={pid}] 安全，置权 {bet} 点，获得 {score_change} 分。"
                     )
                 score_changes[pid] = score_change
-                self.data_manager.update_player_score(pid, score_change)
-                self.data_manager.record_player_game_participation(pid, game_id)
         else:  # 无人中弹
             outcome = "all_safe"
             if participants:  # 只有当有参与者时才进行计分和记录
@@ -318,17 +327,15 @@ class GameManager:
                     bet = p_data["bet"]
                     # 当所有人都安全时，每个参与者根据其置权获得奖励
                     # 奖励计算方式：biubiu数 * 置权点数
-                    score_change = bullet_count * bet
+                    score_change = calculate_score_change(bullet_count, bet, False)
                     score_changes[pid] = score_change
-                    self.data_manager.update_player_score(pid, score_change)
-                    self.data_manager.record_player_game_participation(pid, game_id)
                     outcome_summary_parts.append(
                         f"玩家 [CQ:at,qq={pid}] 安全，置权 {bet} 点，获得 {score_change} 分。"
                     )
             else:  # 没有参与者
                 outcome_summary_parts.append("所有biubiu安全射出！但没有玩家参与。")
 
-        # 保存游戏历史
+        # 游戏历史
         history_data = {
             "game_id": game_id,
             "group_id": self.group_id,
@@ -342,7 +349,6 @@ class GameManager:
             "participants_log": participants,  # 记录包含置权、是否命中等详细信息
             "score_changes": score_changes,  # 记录每个玩家的得分变化
         }
-        self.data_manager.save_game_history(game_id, history_data)
 
         # 更新群组游戏状态
         self.data_manager.game_status["daily_games_ended_count"] += 1
@@ -352,7 +358,11 @@ class GameManager:
             "%Y-%m-%d"
         )  # 确保日期更新
         self.data_manager.game_status["current_game"] = None
-        self.data_manager.save_game_status()
+
+        # 一次性提交玩家得分、参与记录、游戏历史和群组状态
+        self.data_manager.settle_game(game_id, score_changes, history_data)
+        cancel_game(self.group_id, game_id)
+        GAMES_ENDED_TOTAL.inc(outcome)
 
         summary = "\n".join(outcome_summary_parts)
         return {
@@ -362,10 +372,11 @@ class GameManager:
             "outcome": outcome,
         }
 
-    def admin_end_game(self):
+    @traced("GameManager.admin_end_game")
+    def admin_end_game(self, reason="已由管理员手动结束"):
         """
         由管理员手动结束当前游戏。
-        游戏将以"无人中弹"的方式结算。
+        游戏将以"无人中弹"的方式结算。闲置超时自动结束也走这一流程，reason 为结算消息中的结束原因。
 
         Returns:
             dict: 包含操作结果和信息的字典。
@@ -383,7 +394,7 @@ class GameManager:
         # _end_game 会处理计分、保存历史、清空当前游戏状态等
         end_game_result = self._end_game(hit_player_id=None)
 
-        admin_message = f"⚠️注意：本轮轮盘游戏 (ID: {game_id}) 已由管理员手动结束。\n"
+        admin_message = f"⚠️注意：本轮轮盘游戏 (ID: {game_id}) {reason}。\n"
 
         # 附加原有的结算信息
         full_message = admin_message + end_game_result.get(
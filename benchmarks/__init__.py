@@ -0,0 +1,5 @@
+"""
+压力测试与性能基准
+
+在不依赖机器人框架的情况下驱动插件，用于复现高峰场景和测量延迟。
+"""
@@ -0,0 +1,281 @@
+"""
+端到端吞吐量基准
+
+在临时数据目录中模拟 N 个群、每群 M 名玩家，按设定比例发送普通聊天、开始轮盘、biu、
+轮盘排行、我的轮盘、轮盘签到等 OneBot 群消息事件，全部经过 main.handle_events 处理。
+各群并发运行，同一群内的事件依次处理。
+
+输出每秒处理事件数、整体和分命令的 p50/p99 延迟、平均每个事件的文件操作次数，
+结果保存为 JSON，可用 --compare 与之前的结果对比。
+--shards N 时以 N 个分片工作进程运行，耗时包含等待所有事件处理完、回复全部发送；
+此时主进程只能测到事件交给工作进程的耗时，文件读写也发生在工作进程中，延迟和文件操作
+次数记为 null（不适用），只比较吞吐。
+
+用法（在插件目录下运行）：
+    python -m benchmarks.e2e --groups 10 --players 20 --events 200
+    python -m benchmarks.e2e --backend sqlite --compare benchmarks/results/e2e-xxx.json
+    python -m benchmarks.e2e --groups 100 --shards 4
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.harness import (
+    SENT_MESSAGES,
+    FileOperationCounter,
+    group_message_event,
+    install_stub_app,
+    percentile,
+    run_shard_worker,
+)
+
+# 默认事件比例 {事件类型: 权重}
+DEFAULT_EVENT_MIX = {
+    "chat": 40,
+    "start": 5,
+    "biu": 35,
+    "rank": 5,
+    "my": 5,
+    "signin": 10,
+}
+# 结果目录
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+_CHAT_MESSAGES = ["早上好", "哈哈哈", "[CQ:image,file=abc.jpg]", "今天吃什么", "1"]
+
+
+def parse_event_mix(mix_str):
+    """
+    解析 "chat=40,biu=35" 格式的事件比例
+    """
+    mix = {}
+    for item in mix_str.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in DEFAULT_EVENT_MIX:
+            raise ValueError(f"未知的事件类型: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def build_raw_message(kind, rng):
+    if kind == "chat":
+        return rng.choice(_CHAT_MESSAGES)
+    if kind == "start":
+        return f"开始轮盘 {rng.randint(3, 8)}"
+    if kind == "biu":
+        return f"biu {rng.randint(1, 10)}"
+    if kind == "rank":
+        return "轮盘排行"
+    if kind == "my":
+        return "我的轮盘"
+    return "轮盘签到"
+
+
+async def run_group(main, group_id, players, events_per_group, mix, seed, latencies):
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    for index in range(events_per_group):
+        kind = rng.choices(kinds, weights)[0]
+        user_id = str(30000 + rng.randrange(players))
+        event = group_message_event(
+            group_id, user_id, build_raw_message(kind, rng), f"{group_id}-{index}"
+        )
+        started = time.perf_counter()
+        await main.handle_events(None, event)
+        latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+
+def summarize_latencies(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+async def run_benchmark(args, mix):
+    from app.scripts.GunRouletteGame import main
+    from app.scripts.GunRouletteGame.signin import SignIn
+    from app.scripts.GunRouletteGame.outbox import drain_outboxes
+    from app.scripts.GunRouletteGame.DataManager import flush_all_data_managers
+    from app.scripts.GunRouletteGame.signin import persist_all_signins
+    from app.scripts.GunRouletteGame.sharding import (
+        drain_shards,
+        set_worker_entry,
+        stop_shards,
+    )
+
+    set_worker_entry(run_shard_worker)
+
+    # 固定在签到时间内
+    noon = datetime.now(timezone(timedelta(hours=8))).replace(hour=12)
+    SignIn._get_utc8_now = lambda self: noon
+
+    group_ids = [str(800000 + index) for index in range(args.groups)]
+    latencies = {}
+    counter = FileOperationCounter()
+    if args.shards:
+        # 工作进程在第一个事件到达时启动，先用一次心跳启动，不计入耗时
+        await main.handle_events(None, {"post_type": "meta_event"})
+        await drain_shards()
+    with counter.patch():
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                run_group(
+                    main,
+                    group_id,
+                    args.players,
+                    args.events,
+                    mix,
+                    args.seed + index,
+                    latencies,
+                )
+                for index, group_id in enumerate(group_ids)
+            )
+        )
+        # 心跳写回一次，计入文件操作
+        await main.handle_events(None, {"post_type": "meta_event"})
+        await drain_shards()
+        elapsed = time.perf_counter() - started
+        await drain_outboxes()
+        stop_shards()
+        persist_all_signins()
+        flush_all_data_managers()
+
+    total_events = args.groups * args.events
+    all_latencies = [value for values in latencies.values() for value in values]
+    result = {
+        "benchmark": "e2e",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "groups": args.groups,
+            "players": args.players,
+            "events_per_group": args.events,
+            "mix": mix,
+            "seed": args.seed,
+            "backend": os.environ.get("GUN_ROULETTE_STORAGE_BACKEND", "json"),
+            "durability": os.environ.get("GUN_ROULETTE_DURABILITY", "batch"),
+            "shards": args.shards,
+        },
+        "events": total_events,
+        "elapsed_seconds": elapsed,
+        "events_per_second": total_events / elapsed if elapsed else 0.0,
+        "latency": summarize_latencies(all_latencies),
+        "commands": {
+            kind: summarize_latencies(values) for kind, values in latencies.items()
+        },
+        "file_operations": {
+            "total": counter.total(),
+            "per_event": counter.total() / total_events if total_events else 0.0,
+            "by_kind": counter.counts,
+        },
+        "messages_sent": len(SENT_MESSAGES),
+    }
+    if args.shards:
+        # 主进程中测到的只是分发耗时，文件读写在工作进程中，均不适用
+        result["latency"] = None
+        result["commands"] = None
+        result["file_operations"] = None
+    return result
+
+
+def print_result(result, previous=None):
+    def delta(path, higher_is_better):
+        if previous is None:
+            return ""
+        old = previous
+        new = result
+        for key in path:
+            old = old.get(key, {}) if isinstance(old, dict) else {}
+            new = new[key]
+        if not isinstance(old, (int, float)) or not old:
+            return ""
+        change = (new - old) / old * 100
+        better = change >= 0 if higher_is_better else change <= 0
+        return f"  ({change:+.1f}% {'好' if better else '差'})"
+
+    print(
+        f"事件数: {result['events']}，耗时: {result['elapsed_seconds']:.3f}s，"
+        f"吞吐: {result['events_per_second']:.1f} 事件/秒"
+        + delta(["events_per_second"], True)
+    )
+    latency = result["latency"]
+    if latency is None:
+        print("延迟、文件操作: 不适用（分片模式下在工作进程中处理）")
+        return
+    print(
+        f"延迟 p50: {latency['p50_ms']:.2f}ms{delta(['latency', 'p50_ms'], False)}，"
+        f"p99: {latency['p99_ms']:.2f}ms{delta(['latency', 'p99_ms'], False)}"
+    )
+    print(
+        f"文件操作: 每事件 {result['file_operations']['per_event']:.2f} 次"
+        + delta(["file_operations", "per_event"], False)
+        + f"，{result['file_operations']['by_kind']}"
+    )
+    for kind, summary in sorted(result["commands"].items()):
+        print(
+            f"  {kind:<6} {summary['count']:>6} 次  p50 {summary['p50_ms']:.2f}ms  "
+            f"p99 {summary['p99_ms']:.2f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GunRouletteGame 端到端吞吐量基准")
+    parser.add_argument("--groups", type=int, default=10, help="群数量")
+    parser.add_argument("--players", type=int, default=20, help="每群玩家数")
+    parser.add_argument("--events", type=int, default=200, help="每群事件数")
+    parser.add_argument(
+        "--mix",
+        default=",".join(f"{kind}={weight}" for kind, weight in DEFAULT_EVENT_MIX.items()),
+        help="事件比例，例如 chat=40,start=5,biu=35,rank=5,my=5,signin=10",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument(
+        "--backend", choices=["json", "sqlite"], default=None, help="存储后端"
+    )
+    parser.add_argument("--shards", type=int, default=0, help="分片工作进程数")
+    parser.add_argument("--data-dir", default=None, help="数据目录，默认使用临时目录")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件路径")
+    parser.add_argument("--compare", default=None, help="与之前的结果 JSON 对比")
+    args = parser.parse_args()
+
+    if args.backend:
+        os.environ["GUN_ROULETTE_STORAGE_BACKEND"] = args.backend
+    os.environ["GUN_ROULETTE_SHARDS"] = str(args.shards)
+    mix = parse_event_mix(args.mix)
+    data_dir = install_stub_app(args.data_dir)
+    print(f"数据目录: {data_dir}")
+
+    result = asyncio.run(run_benchmark(args, mix))
+
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    print_result(result, previous)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(
+            RESULTS_DIR, f"e2e-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+    print(f"结果已保存: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
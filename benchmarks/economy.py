@@ -0,0 +1,145 @@
+"""
+经济模拟
+
+用 simulator.py 按 GameManager 的规则模拟大量游戏，比较不同biubiu数、置权范围和置权策略下的
+分数通胀、得分方差和中弹位置分布。多个取值用逗号分隔时运行所有组合（参数扫描）。
+
+用法（在插件目录下运行）：
+    python -m benchmarks.economy --days 30 --games-per-day 100000
+    python -m benchmarks.economy --bullets 3,4,6 --strategy uniform,max,chase
+    python -m benchmarks.economy --max-bet 5,10,20 --output sweep.json
+    python -m benchmarks.economy --engine python --games-per-day 1000   未安装 NumPy 时
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+from datetime import datetime
+
+from benchmarks.harness import install_stub_app
+
+# 结果目录
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def _str_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def print_result(result):
+    config = result["config"]
+    inflation = result["daily_inflation"]
+    per_game = result["score_per_game"]
+    per_participation = result["score_per_participation"]
+    scores = result["player_scores"]
+    print(
+        f"biubiu数 {config['bullet_count']}  每局 {config['players_per_game']} 人  "
+        f"置权 {config['min_bet']}-{config['max_bet']}  策略 {config['strategy']}  "
+        f"({result['games']} 局，{result['games_per_second']:,.0f} 局/秒，{result['engine']})"
+    )
+    print(
+        f"  每天新增总分 {inflation['mean']:,.1f} ± {inflation['std']:,.1f}  "
+        f"（每名玩家 {inflation['per_player_mean']:,.2f}）"
+    )
+    print(
+        f"  每局得分 {per_game['mean']:.2f} ± {per_game['std']:.2f}  "
+        f"每次参与 {per_participation['mean']:.2f} ± {per_participation['std']:.2f}"
+    )
+    print(
+        f"  玩家累计得分 p1 {scores['p1']:,}  p50 {scores['p50']:,}  "
+        f"p99 {scores['p99']:,}  标准差 {scores['std']:,.1f}"
+    )
+    positions = "  ".join(
+        f"{position}:{fraction * 100:.1f}%({result['expected_hit_positions'][position] * 100:.1f}%)"
+        for position, fraction in result["hit_positions"].items()
+    )
+    print(f"  中弹位置 实际(理论) {positions}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GunRouletteGame 经济模拟")
+    parser.add_argument("--bullets", type=_int_list, default=None, help="biubiu数")
+    parser.add_argument(
+        "--players-per-game",
+        type=_int_list,
+        default=None,
+        help="每局愿意参与的玩家数，默认等于biubiu数",
+    )
+    parser.add_argument("--population", type=int, default=1000, help="玩家池大小")
+    parser.add_argument("--games-per-day", type=int, default=10_000, help="每天局数")
+    parser.add_argument("--days", type=int, default=30, help="模拟天数")
+    parser.add_argument(
+        "--strategy",
+        type=_str_list,
+        default=["uniform"],
+        help="置权策略：fixed:N、min、max、uniform、chase、protect[:N]",
+    )
+    parser.add_argument("--min-bet", type=_int_list, default=None, help="最小置权")
+    parser.add_argument("--max-bet", type=_int_list, default=None, help="最大置权")
+    parser.add_argument("--seed", type=int, default=1, help="随机种子")
+    parser.add_argument(
+        "--engine", choices=["auto", "numpy", "python"], default="auto", help="模拟引擎"
+    )
+    parser.add_argument("--output", default=None, help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    install_stub_app()
+    from app.scripts.GunRouletteGame.GameManager import (
+        DEFAULT_BULLET_COUNT,
+        MAX_BET_AMOUNT,
+        MIN_BET_AMOUNT,
+    )
+    from app.scripts.GunRouletteGame.simulator import SimulationConfig, simulate
+
+    results = []
+    for bullet_count, players_per_game, strategy, min_bet, max_bet in itertools.product(
+        args.bullets or [DEFAULT_BULLET_COUNT],
+        args.players_per_game or [None],
+        args.strategy,
+        args.min_bet or [MIN_BET_AMOUNT],
+        args.max_bet or [MAX_BET_AMOUNT],
+    ):
+        config = SimulationConfig(
+            bullet_count=bullet_count,
+            players_per_game=players_per_game or bullet_count,
+            population=args.population,
+            games_per_day=args.games_per_day,
+            days=args.days,
+            strategy=strategy,
+            min_bet=min_bet,
+            max_bet=max_bet,
+            seed=args.seed,
+        )
+        result = simulate(config, args.engine)
+        print_result(result)
+        results.append(result)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(
+            RESULTS_DIR, f"economy-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "benchmark": "economy",
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "results": results,
+            },
+            f,
+            ensure_ascii=False,
+            indent=4,
+        )
+    print(f"结果已保存: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
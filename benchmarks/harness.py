@@ -0,0 +1,161 @@
+"""
+压力测试运行环境
+
+插件运行时依赖机器人框架提供的 app.config、app.api、app.switch 模块，
+install_stub_app 会注册这些模块的最小替身，并把插件挂载为 app.scripts.GunRouletteGame，
+使压力测试可以直接调用 main.handle_events。发送的消息（经发送队列合并后）记录在 SENT_MESSAGES 中。
+"""
+
+import os
+import sys
+import types
+import builtins
+import tempfile
+import threading
+import contextlib
+
+# 插件目录
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 压力测试中发送的所有消息 [(group_id 或 "private:user_id", message)]
+SENT_MESSAGES = []
+
+# 压力测试中的管理员QQ号
+BENCHMARK_OWNER_ID = "10000"
+
+
+async def _send_group_msg(websocket, group_id, message):
+    SENT_MESSAGES.append((str(group_id), message))
+
+
+async def _send_private_msg(websocket, user_id, message):
+    SENT_MESSAGES.append((f"private:{user_id}", message))
+
+
+def _new_module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+def install_stub_app(data_dir=None):
+    """
+    注册框架模块的替身并指定数据目录，必须在导入插件模块之前调用。
+
+    Args:
+        data_dir: 数据目录，为空时使用新建的临时目录
+
+    Returns:
+        str: 本次使用的数据目录
+    """
+    if data_dir is None:
+        data_dir = tempfile.mkdtemp(prefix="gun_roulette_bench_")
+    os.environ["GUN_ROULETTE_DATA_DIR"] = data_dir
+    # 压力测试测量插件自身的处理能力，默认不对发送队列限速
+    os.environ.setdefault("GUN_ROULETTE_OUTBOX_MESSAGES_PER_SECOND", "0")
+    if "app.scripts.GunRouletteGame" in sys.modules:
+        return data_dir
+
+    switches = {}
+    _new_module("app", __path__=[])
+    _new_module("app.scripts", __path__=[])
+    _new_module("app.scripts.GunRouletteGame", __path__=[PLUGIN_DIR])
+    _new_module("app.config")
+    _new_module(
+        "app.api",
+        send_group_msg=_send_group_msg,
+        send_private_msg=_send_private_msg,
+        owner_id=[BENCHMARK_OWNER_ID],
+    )
+    _new_module(
+        "app.switch",
+        load_switch=lambda group_id, name: switches.get((group_id, name), True),
+        save_switch=lambda group_id, name, status: switches.__setitem__(
+            (group_id, name), status
+        ),
+    )
+    return data_dir
+
+
+def group_message_event(group_id, user_id, raw_message, message_id, role="member"):
+    """
+    构造一条群消息事件
+    """
+    return {
+        "post_type": "message",
+        "message_type": "group",
+        "group_id": str(group_id),
+        "user_id": str(user_id),
+        "raw_message": raw_message,
+        "message_id": message_id,
+        "sender": {"role": role},
+    }
+
+
+def percentile(sorted_values, fraction):
+    """
+    计算已排序数据的分位数（最近秩法）
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class FileOperationCounter:
+    """
+    统计文件操作次数：open、os.replace/rename/remove、os.listdir/scandir、os.fsync。
+    SQLite 后端通过 sqlite3 自身读写数据库文件，不计入统计。
+    """
+
+    _PATCHED_OS_FUNCTIONS = ("replace", "rename", "remove", "listdir", "scandir", "fsync")
+
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def _count(self, kind):
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def _wrap(self, kind, func):
+        def wrapper(*args, **kwargs):
+            self._count(kind)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+
+    @contextlib.contextmanager
+    def patch(self):
+        """
+        在上下文中替换 builtins.open 和 os 中的文件操作函数
+        """
+        originals = {"open": builtins.open}
+        builtins.open = self._wrap("open", builtins.open)
+        for name in self._PATCHED_OS_FUNCTIONS:
+            originals[name] = getattr(os, name)
+            setattr(os, name, self._wrap(name, originals[name]))
+        try:
+            yield self
+        finally:
+            builtins.open = originals.pop("open")
+            for name, func in originals.items():
+                setattr(os, name, func)
+
+
+def run_shard_worker(shard_index, event_connection, reply_connection):
+    """
+    分片工作进程入口：spawn 启动的子进程中没有框架模块，先注册替身再启动工作进程
+    """
+    install_stub_app(os.environ["GUN_ROULETTE_DATA_DIR"])
+    from app.scripts.GunRouletteGame.sharding import worker_main
+
+    worker_main(shard_index, event_connection, reply_connection)
@@ -0,0 +1,420 @@
+"""
+热点路径微基准
+
+针对 GameManager 和 DataManager 的热点方法单独计时：
+- start_game                        开始一局游戏
+- player_shoot                      一次未结束游戏的biu
+- end_game_N                        N 名参与者的一局结算（1/10/100）
+- get_rank_N                        群内 N 名玩家时获取排行榜（100/10k/100k）
+- perform_signin_large_history      一年签到记录、当天已有大量签到时的一次签到
+- signin_cold_load_large_history    同上，当天签到记录尚未加载时的一次签到
+
+所有用例交替运行 --rounds 轮，每轮重复执行多次取中位数，以最快一轮的中位数为结果，
+排除机器整体变慢的时段。基线保存在 benchmarks/baselines.json，结果比基线慢超过阈值百分比、
+且慢出的时间超过噪声估计即视为回退，进程以退出码 1 结束。噪声估计取基线的
+NOISE_FLOOR_FRACTION、最快一轮的四分位距和最快两轮中位数之差中的最大者，随用例耗时缩放。
+基线与机器相关，更换机器后应重新生成。
+
+用法（在插件目录下运行）：
+    python -m benchmarks.micro                       与基线对比
+    python -m benchmarks.micro --threshold 30        自定义回退阈值（百分比）
+    python -m benchmarks.micro --only get_rank       只运行名称包含 get_rank 的用例
+    python -m benchmarks.micro --quick               跳过 10 万玩家等耗时的用例
+    python -m benchmarks.micro --rounds 9            更多轮次，结果更稳定
+    python -m benchmarks.micro --update-baseline     用本次结果覆盖基线
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.harness import install_stub_app, percentile
+
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baselines.json"
+)
+# 默认回退阈值（百分比），可用环境变量 GUN_ROULETTE_BENCH_THRESHOLD 覆盖
+DEFAULT_REGRESSION_THRESHOLD = float(
+    os.environ.get("GUN_ROULETTE_BENCH_THRESHOLD", "25")
+)
+# 噪声估计的下限：基线中位数的该比例
+NOISE_FLOOR_FRACTION = 0.10
+# 每个用例每轮的默认重复次数
+DEFAULT_REPEAT = 100
+# 默认轮数
+DEFAULT_ROUNDS = 5
+# 签到历史的天数和每天签到人数
+SIGNIN_HISTORY_DAYS = 365
+SIGNIN_HISTORY_PER_DAY = 200
+# 当天已签到人数
+SIGNIN_TODAY_COUNT = 5000
+
+_group_counter = [900000]
+
+
+def _new_group_id():
+    _group_counter[0] += 1
+    return str(_group_counter[0])
+
+
+class MicroCase:
+    """
+    微基准用例。
+
+    Args:
+        name: 用例名称
+        setup: setup() -> state，整个用例执行前调用一次，不计时
+        run: run(state)，被计时的操作
+        before_each: before_each(state)，每次计时前调用，不计时
+        repeat: 重复次数
+        slow: 为 True 时 --quick 跳过
+    """
+
+    def __init__(self, name, setup, run, before_each=None, repeat=None, slow=False):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.before_each = before_each
+        self.repeat = repeat
+        self.slow = slow
+
+
+def _running_game(bullet_count, participant_count=0):
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "id": "BENCH0",
+        "status": "running",
+        "start_time": now,
+        "initiator_id": "40000",
+        "bullet_count": bullet_count,
+        "real_bullet_initially_present": True,
+        "is_bullet_fired_this_game": False,
+        "shots_fired_count": participant_count,
+        "participants": {
+            str(40000 + index): {
+                "bet": 1 + index % 10,
+                "shot_order": index,
+                "is_hit": False,
+                "shot_time": now,
+            }
+            for index in range(participant_count)
+        },
+    }
+
+
+def build_cases():
+    from app.scripts.GunRouletteGame.GameManager import GameManager
+    from app.scripts.GunRouletteGame.DataManager import get_data_manager
+    from app.scripts.GunRouletteGame.signin import (
+        SignIn,
+        _signin_sequencers,
+        get_signin_sequencer,
+    )
+
+    cases = []
+
+    # start_game
+    def setup_start_game():
+        return {"group_id": _new_group_id(), "index": 0}
+
+    def before_start_game(state):
+        get_data_manager(state["group_id"]).game_status["current_game"] = None
+        state["index"] += 1
+
+    def run_start_game(state):
+        GameManager(state["group_id"], str(50000 + state["index"]), 6).start_game()
+
+    cases.append(
+        MicroCase("start_game", setup_start_game, run_start_game, before_start_game)
+    )
+
+    # player_shoot：biubiu数足够大，游戏不会在计时期间结束
+    def setup_player_shoot():
+        group_id = _new_group_id()
+        data_manager = get_data_manager(group_id)
+        data_manager.game_status["current_game"] = _running_game(10**9)
+        data_manager.game_status["current_game"]["is_bullet_fired_this_game"] = True
+        return {"group_id": group_id, "index": 0}
+
+    def before_player_shoot(state):
+        state["index"] += 1
+
+    def run_player_shoot(state):
+        GameManager(state["group_id"], "40000").player_shoot(
+            str(60000 + state["index"]), 5
+        )
+
+    cases.append(
+        MicroCase(
+            "player_shoot", setup_player_shoot, run_player_shoot, before_player_shoot
+        )
+    )
+
+    # _end_game
+    for participant_count in (1, 10, 100):
+
+        def setup_end_game():
+            return {"group_id": _new_group_id()}
+
+        def before_end_game(state, participant_count=participant_count):
+            get_data_manager(state["group_id"]).game_status["current_game"] = (
+                _running_game(participant_count + 1, participant_count)
+            )
+
+        def run_end_game(state):
+            GameManager(state["group_id"], "40000")._end_game(hit_player_id=None)
+
+        cases.append(
+            MicroCase(
+                f"end_game_{participant_count}",
+                setup_end_game,
+                run_end_game,
+                before_end_game,
+                repeat=100,
+            )
+        )
+
+    # get_rank
+    for player_count, label, slow in (
+        (100, "100", False),
+        (10_000, "10k", False),
+        (100_000, "100k", True),
+    ):
+
+        def setup_get_rank(player_count=player_count):
+            group_id = _new_group_id()
+            data_manager = get_data_manager(group_id)
+            players = {}
+            for index in range(player_count):
+                player_data = data_manager._default_player_data(str(70000 + index))
+                player_data["total_score"] = (index * 7919) % 100_003
+                players[str(70000 + index)] = player_data
+            with data_manager.storage.transaction():
+                data_manager.storage.save_players(players)
+            return {"data_manager": data_manager}
+
+        def run_get_rank(state):
+            state["data_manager"].get_rank()
+
+        cases.append(
+            MicroCase(f"get_rank_{label}", setup_get_rank, run_get_rank, slow=slow)
+        )
+
+    # perform_signin
+    signin_time = datetime.now(timezone(timedelta(hours=8))).replace(hour=12)
+    SignIn._get_utc8_now = lambda self: signin_time
+    today_date_str = signin_time.strftime("%Y-%m-%d")
+
+    def setup_signin_history():
+        group_id = _new_group_id()
+        storage = get_data_manager(group_id).storage
+        with storage.transaction():
+            for day in range(1, SIGNIN_HISTORY_DAYS + 1):
+                date_str = (signin_time - timedelta(days=day)).strftime("%Y-%m-%d")
+                storage.add_signins(
+                    date_str,
+                    [
+                        {
+                            "user_id": str(80000 + index),
+                            "timestamp": signin_time.isoformat(),
+                            "order": index + 1,
+                            "points_awarded": 10,
+                        }
+                        for index in range(SIGNIN_HISTORY_PER_DAY)
+                    ],
+                )
+            storage.add_signins(
+                today_date_str,
+                [
+                    {
+                        "user_id": str(80000 + index),
+                        "timestamp": signin_time.isoformat(),
+                        "order": index + 1,
+                        "points_awarded": 10,
+                    }
+                    for index in range(SIGNIN_TODAY_COUNT)
+                ],
+            )
+        return {"group_id": group_id, "index": SIGNIN_TODAY_COUNT}
+
+    def before_signin(state):
+        state["index"] += 1
+
+    def run_signin(state):
+        SignIn(state["group_id"], str(80000 + state["index"])).perform_signin()
+
+    def before_cold_signin(state):
+        state["index"] += 1
+        # 丢弃常驻的签到序号分配器，计时包含当天签到记录的加载
+        get_signin_sequencer(state["group_id"]).persist()
+        _signin_sequencers.pop(state["group_id"], None)
+        storage = get_data_manager(state["group_id"]).storage
+        if hasattr(storage, "signin_log"):
+            storage.signin_log._days.clear()
+
+    cases.append(
+        MicroCase(
+            "perform_signin_large_history",
+            setup_signin_history,
+            run_signin,
+            before_signin,
+        )
+    )
+    cases.append(
+        MicroCase(
+            "signin_cold_load_large_history",
+            setup_signin_history,
+            run_signin,
+            before_cold_signin,
+            repeat=20,
+        )
+    )
+    return cases
+
+
+def run_case(case, state, repeat):
+    timings = []
+    for _ in range(case.repeat or repeat):
+        if case.before_each is not None:
+            case.before_each(state)
+        started = time.perf_counter()
+        case.run(state)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "repeat": len(timings),
+        "median_ms": percentile(timings, 0.50) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "iqr_ms": (percentile(timings, 0.75) - percentile(timings, 0.25)) * 1000,
+        "min_ms": timings[0] * 1000,
+    }
+
+
+def run_rounds(cases, repeat, rounds):
+    """
+    交替运行各用例 rounds 轮（每个用例只调用一次 setup），返回 {用例名: 最快一轮的结果}，
+    结果中附带各轮中位数 round_medians_ms
+    """
+    states = {case.name: case.setup() for case in cases}
+    round_results = {case.name: [] for case in cases}
+    for _ in range(rounds):
+        for case in cases:
+            round_results[case.name].append(run_case(case, states[case.name], repeat))
+    results = {}
+    for case in cases:
+        runs = sorted(round_results[case.name], key=lambda result: result["median_ms"])
+        result = dict(runs[0])
+        result["round_medians_ms"] = [run["median_ms"] for run in runs]
+        results[case.name] = result
+    return results
+
+
+def noise_estimate(result, baseline_ms):
+    """
+    本次结果的噪声估计（毫秒）
+    """
+    medians = result["round_medians_ms"]
+    round_spread = medians[1] - medians[0] if len(medians) > 1 else 0.0
+    return max(baseline_ms * NOISE_FLOOR_FRACTION, result["iqr_ms"], round_spread)
+
+
+def load_baselines():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+        return json.load(f).get("cases", {})
+
+
+def save_baselines(results):
+    cases = load_baselines()
+    cases.update(results)
+    with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "machine": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "backend": os.environ.get("GUN_ROULETTE_STORAGE_BACKEND", "json"),
+                },
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+                "cases": dict(sorted(cases.items())),
+            },
+            f,
+            ensure_ascii=False,
+            indent=4,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GunRouletteGame 热点路径微基准")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_REGRESSION_THRESHOLD,
+        help="中位数比基线慢超过该百分比即视为回退",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=DEFAULT_REPEAT, help="每轮重复次数"
+    )
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="轮数")
+    parser.add_argument("--only", default=None, help="只运行名称包含该字符串的用例")
+    parser.add_argument("--quick", action="store_true", help="跳过耗时的用例")
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="用本次结果覆盖基线"
+    )
+    parser.add_argument(
+        "--backend", choices=["json", "sqlite"], default=None, help="存储后端"
+    )
+    args = parser.parse_args()
+
+    if args.backend:
+        os.environ["GUN_ROULETTE_STORAGE_BACKEND"] = args.backend
+    data_dir = install_stub_app()
+    print(f"数据目录: {data_dir}")
+
+    baselines = load_baselines()
+    cases = [
+        case
+        for case in build_cases()
+        if not (args.only and args.only not in case.name)
+        and not (args.quick and case.slow)
+    ]
+    results = run_rounds(cases, args.repeat, max(1, args.rounds))
+    regressions = []
+    for case in cases:
+        result = results[case.name]
+        line = (
+            f"{case.name:<32} 中位数 {result['median_ms']:>9.3f}ms  "
+            f"p95 {result['p95_ms']:>9.3f}ms"
+        )
+        baseline = baselines.get(case.name)
+        if baseline and baseline.get("median_ms"):
+            change = (result["median_ms"] - baseline["median_ms"]) / baseline[
+                "median_ms"
+            ]
+            line += f"  基线 {baseline['median_ms']:.3f}ms ({change * 100:+.1f}%)"
+            if change * 100 > args.threshold and result["median_ms"] - baseline[
+                "median_ms"
+            ] > noise_estimate(result, baseline["median_ms"]):
+                line += "  回退"
+                regressions.append(case.name)
+        else:
+            line += "  无基线"
+        print(line)
+
+    if args.update_baseline:
+        save_baselines(results)
+        print(f"基线已更新: {BASELINE_FILE}")
+        return 0
+    if regressions:
+        print(f"以下用例比基线慢超过 {args.threshold:g}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+编解码基准
+
+用 GameManager 实际进行一局游戏，取得三类持久化记录，对每个可用的编解码器计时：
+- player    玩家数据（player_data/玩家QQ号.json）
+- status    进行中游戏的状态（game_status.json）
+- history   一局已结算的游戏历史记录
+
+对比对象还包括改动前的默认写法 json.dump(indent=4, ensure_ascii=False)（json-indent4）。
+输出每条记录的编码、解码耗时（中位数，微秒）和编码后的字节数。
+
+用法（在插件目录下运行）：
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --participants 100 --repeat 2000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+from benchmarks.harness import install_stub_app, percentile
+
+# 结果目录
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# 每次计时连续执行的次数，减少计时器本身的开销
+BATCH_SIZE = 20
+
+
+class _IndentedJsonCodec:
+    """
+    改动前的写法：带 4 格缩进的 JSON
+    """
+
+    name = "json-indent4"
+
+    def encode(self, data):
+        return json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8")
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+
+def build_records(participant_count):
+    """
+    进行一局 participant_count 人参与的游戏，返回 {记录类型: 记录}
+    """
+    from app.scripts.GunRouletteGame.GameManager import GameManager
+    from app.scripts.GunRouletteGame.DataManager import get_data_manager
+
+    group_id = "990001"
+    initiator_id = "40000"
+    game_manager = GameManager(group_id, initiator_id, 10**9)
+    game_manager.start_game()
+    for index in range(participant_count):
+        game_manager.player_shoot(str(40000 + index), 1 + index % 10)
+    data_manager = get_data_manager(group_id)
+    status = json.loads(json.dumps(data_manager.game_status))
+    game_id = status["current_game"]["id"]
+    game_manager.admin_end_game()
+    return {
+        "player": data_manager.get_player_data(initiator_id),
+        "status": status,
+        "history": data_manager.get_game_history(game_id),
+    }
+
+
+def time_operation(operation, value, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(BATCH_SIZE):
+            operation(value)
+        timings.append((time.perf_counter() - started) / BATCH_SIZE)
+    timings.sort()
+    return percentile(timings, 0.50) * 1_000_000
+
+
+def benchmark_codec(codec, records, repeat):
+    results = {}
+    for record_name, record in records.items():
+        raw = codec.encode(record)
+        if codec.decode(raw) != record:
+            raise AssertionError(f"{codec.name} 无法还原 {record_name} 记录")
+        results[record_name] = {
+            "bytes": len(raw),
+            "encode_us": time_operation(codec.encode, record, repeat),
+            "decode_us": time_operation(codec.decode, raw, repeat),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GunRouletteGame 编解码基准")
+    parser.add_argument(
+        "--participants", type=int, default=10, help="游戏状态和历史记录中的参与人数"
+    )
+    parser.add_argument("--repeat", type=int, default=500, help="重复次数")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件路径")
+    args = parser.parse_args()
+
+    install_stub_app()
+    from app.scripts.GunRouletteGame.codec import CODECS, available_codecs
+
+    records = build_records(args.participants)
+    codecs = [_IndentedJsonCodec()] + [CODECS[name]() for name in available_codecs()]
+    missing = sorted(set(CODECS) - set(available_codecs()))
+    if missing:
+        print(f"未安装，跳过: {', '.join(missing)}")
+
+    results = {}
+    print(f"{'编解码器':<14}{'记录':<10}{'字节':>8}{'编码 us':>10}{'解码 us':>10}")
+    for codec in codecs:
+        results[codec.name] = benchmark_codec(codec, records, args.repeat)
+        for record_name, result in results[codec.name].items():
+            print(
+                f"{codec.name:<16}{record_name:<10}{result['bytes']:>8}"
+                f"{result['encode_us']:>11.2f}{result['decode_us']:>11.2f}"
+            )
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(
+            RESULTS_DIR, f"serialization-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "benchmark": "serialization",
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "participants": args.participants,
+                "results": results,
+            },
+            f,
+            ensure_ascii=False,
+            indent=4,
+        )
+    print(f"结果已保存: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+早八签到高峰压力测试
+
+模拟东八区 08:00 签到开始时大量群友在同一时刻发送“轮盘签到”：
+所有签到事件并发进入 main.handle_events，检查名次唯一且连续、前几名奖励只发放一次、
+批量写入后签到记录和积分与回复一致，并输出回复延迟分位数。
+
+用法（在插件目录下运行）：
+    python -m benchmarks.signin_rush [签到人数] [群数量]
+"""
+
+import re
+import sys
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.harness import (
+    SENT_MESSAGES,
+    group_message_event,
+    install_stub_app,
+    percentile,
+)
+
+DEFAULT_SIGNIN_USERS = 500
+DEFAULT_GROUPS = 1
+
+_SIGNIN_ORDER_PATTERN = re.compile(r"您是今天第 (\d+) 位签到的勇士")
+
+
+async def run_signin_rush(user_count, group_count):
+    from app.scripts.GunRouletteGame import main
+    from app.scripts.GunRouletteGame.signin import (
+        SIGNIN_BASE_POINTS,
+        SIGNIN_BONUS_POINTS,
+        SignIn,
+        get_loaded_signin_sequencers,
+    )
+    from app.scripts.GunRouletteGame.DataManager import get_data_manager
+    from app.scripts.GunRouletteGame.outbox import drain_outboxes
+
+    rush_time = datetime(2024, 1, 1, 8, 0, 0, tzinfo=timezone(timedelta(hours=8)))
+    SignIn._get_utc8_now = lambda self: rush_time
+    today_date_str = rush_time.strftime("%Y-%m-%d")
+
+    group_ids = [str(700000 + index) for index in range(group_count)]
+    latencies = []
+
+    async def signin(group_id, user_id, message_id):
+        started = time.perf_counter()
+        await main.handle_events(
+            None, group_message_event(group_id, user_id, "轮盘签到", message_id)
+        )
+        latencies.append(time.perf_counter() - started)
+
+    events = [
+        signin(group_id, str(20000 + user_index), group_index * user_count + user_index)
+        for user_index in range(user_count)
+        for group_index, group_id in enumerate(group_ids)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*events)
+    elapsed = time.perf_counter() - started
+
+    # 等待回复发送完毕，并写入尚未到期的签到批次
+    await drain_outboxes()
+    for sequencer in get_loaded_signin_sequencers():
+        sequencer.persist()
+    for group_id in group_ids:
+        get_data_manager(group_id).flush()
+
+    for group_id in group_ids:
+        # 同一时间窗口内的回复会被合并为一条消息
+        orders = sorted(
+            int(order)
+            for sent_group_id, message in SENT_MESSAGES
+            if sent_group_id == group_id
+            for order in _SIGNIN_ORDER_PATTERN.findall(message)
+        )
+        assert orders == list(range(1, user_count + 1)), f"群 {group_id} 名次不连续"
+        data_manager = get_data_manager(group_id)
+        stored = data_manager.storage.get_signins(today_date_str)
+        assert len(stored) == user_count, f"群 {group_id} 签到记录数量不符"
+        for signin_entry in stored:
+            expected_points = SIGNIN_BASE_POINTS + SIGNIN_BONUS_POINTS.get(
+                signin_entry["order"], 0
+            )
+            player_data = data_manager.get_player_data(signin_entry["user_id"])
+            assert player_data["total_score"] == expected_points, "签到积分不符"
+
+    latencies.sort()
+    total = len(latencies)
+    print(f"签到人数: {user_count} x {group_count} 群，共 {total} 次签到")
+    print(f"实际发送消息: {len(SENT_MESSAGES)} 条")
+    print(f"总耗时: {elapsed:.3f}s，吞吐: {total / elapsed:.1f} 次/秒")
+    print(
+        f"回复延迟 p50: {percentile(latencies, 0.50) * 1000:.2f}ms，"
+        f"p99: {percentile(latencies, 0.99) * 1000:.2f}ms，"
+        f"最大: {latencies[-1] * 1000:.2f}ms"
+    )
+    print("名次唯一且连续，签到记录与积分一致")
+
+
+def main():
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIGNIN_USERS
+    group_count = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_GROUPS
+    data_dir = install_stub_app()
+    print(f"数据目录: {data_dir}")
+    asyncio.run(run_signin_rush(user_count, group_count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+序列化编解码
+
+所有持久化数据通过统一的编解码器读写，可选：
+- json：紧凑 JSON（无缩进、无多余空格），标准库实现
+- orjson：与 json 相同的格式，安装 orjson 时可用，编解码更快
+- msgpack：二进制格式，安装 msgpack 时可用，体积更小
+
+状态文件（游戏状态、玩家数据、排行榜索引）的写入格式由 STORAGE_CODEC（或环境变量
+GUN_ROULETTE_CODEC）选择，默认 auto：安装了 orjson 时用 orjson，否则用 json。
+读取时按文件内容判断格式（JSON 以 { 或 [ 开头，其余按 msgpack 解析），旧版带缩进的
+JSON 文件和切换格式前写入的文件都可以直接读取，文件名保持不变。
+
+按行追加的日志（游戏历史、签到记录、游戏日志和各索引）以换行分隔记录，
+SQLite 后端的 data 列保存文本，两者始终使用 JSON 文本，安装 orjson 时由 orjson 编码。
+
+orjson 和 msgpack 不支持超过 64 位的整数，遇到时该文件或该行回退到标准库 json。
+"""
+
+import os
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+# 状态文件写入格式："auto"、"json"、"orjson" 或 "msgpack"
+STORAGE_CODEC = os.environ.get("GUN_ROULETTE_CODEC", "auto")
+
+# JSON 文本中连续 20 位以上的数字可能超出 orjson 的整数范围（超出时 orjson 返回浮点数）。
+# 用 translate 把数字映射为 "0"、其他字节映射为空格后查找，比正则快一个数量级
+_DIGIT_MASK = bytes(0x30 if 0x30 <= byte <= 0x39 else 0x20 for byte in range(256))
+_LONG_NUMBER = b"0" * 20
+
+
+def _has_long_number(content):
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return _LONG_NUMBER in content.translate(_DIGIT_MASK)
+
+
+def _dumps_compact(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class CodecError(ValueError):
+    """
+    数据无法按任何已知格式解码
+    """
+
+
+class JsonCodec:
+    """
+    标准库紧凑 JSON
+    """
+
+    name = "json"
+    binary = False
+
+    @staticmethod
+    def available():
+        return True
+
+    def dumps(self, data):
+        return _dumps_compact(data)
+
+    def loads(self, text):
+        return json.loads(text)
+
+    def encode(self, data):
+        return _dumps_compact(data).encode("utf-8")
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    orjson 实现的紧凑 JSON，输出与 JsonCodec 相同
+    """
+
+    name = "orjson"
+
+    @staticmethod
+    def available():
+        return orjson is not None
+
+    def dumps(self, data):
+        return self.encode(data).decode("utf-8")
+
+    def loads(self, text):
+        if _has_long_number(text):
+            return json.loads(text)
+        return orjson.loads(text)
+
+    def encode(self, data):
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # 超过 64 位的整数等 orjson 不支持的值
+            return _dumps_compact(data).encode("utf-8")
+
+    def decode(self, raw):
+        return self.loads(raw)
+
+
+class MsgpackCodec:
+    """
+    MessagePack 二进制格式
+    """
+
+    name = "msgpack"
+    binary = True
+
+    @staticmethod
+    def available():
+        return msgpack is not None
+
+    def encode(self, data):
+        try:
+            return msgpack.packb(data, use_bin_type=True)
+        except OverflowError:
+            # 超过 64 位的整数，该文件改用 JSON，读取时按内容识别
+            return get_json_codec().encode(data)
+
+    def decode(self, raw):
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+
+_json_codec = None
+_state_codec = None
+
+
+def available_codecs():
+    """
+    列出当前环境可用的编解码器名称
+    """
+    return [name for name, codec_class in CODECS.items() if codec_class.available()]
+
+
+def get_codec(name):
+    """
+    按名称创建编解码器，"auto" 选择最快的 JSON 实现；不可用时回退到 json
+    """
+    if name == "auto":
+        return get_json_codec()
+    codec_class = CODECS.get(name)
+    if codec_class is None:
+        logging.error(f"未知的编解码器 {name}，使用 json")
+        return JsonCodec()
+    if not codec_class.available():
+        logging.error(f"编解码器 {name} 需要安装 {name}，使用 json")
+        return JsonCodec()
+    return codec_class()
+
+
+def get_json_codec():
+    """
+    获取用于 JSON 文本的编解码器：安装了 orjson 时用 orjson，否则用标准库
+    """
+    global _json_codec
+    if _json_codec is None:
+        _json_codec = OrjsonCodec() if OrjsonCodec.available() else JsonCodec()
+    return _json_codec
+
+
+def get_state_codec():
+    """
+    获取状态文件的写入编解码器
+    """
+    global _state_codec
+    if _state_codec is None:
+        _state_codec = get_codec(STORAGE_CODEC)
+    return _state_codec
+
+
+def set_state_codec(name):
+    """
+    切换状态文件的写入格式，已有文件在下次写入时转换
+    """
+    global _state_codec
+    _state_codec = get_codec(name)
+    return _state_codec
+
+
+def encode(data):
+    """
+    按当前写入格式编码状态数据，返回字节串
+    """
+    return get_state_codec().encode(data)
+
+
+def decode(raw):
+    """
+    按内容识别格式并解码状态数据，无法解码时抛出 CodecError
+    """
+    content = raw.lstrip()
+    if not content:
+        raise CodecError("文件为空")
+    try:
+        if content[:1] in (b"{", b"["):
+            return get_json_codec().decode(content)
+        if msgpack is None:
+            raise CodecError("不是 JSON 格式，读取 msgpack 格式需要安装 msgpack")
+        return MsgpackCodec().decode(raw)
+    except CodecError:
+        raise
+    except Exception as e:
+        raise CodecError(str(e)) from e
+
+
+def dumps_json(data):
+    """
+    把一条记录编码为单行 JSON 文本（不含换行）
+    """
+    return get_json_codec().dumps(data)
+
+
+def loads_json(text):
+    """
+    解码单行 JSON 文本（str 或 bytes），格式错误时抛出 json.JSONDecodeError
+    """
+    return get_json_codec().loads(text)
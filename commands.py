@@ -1,42 +1,152 @@
 # app/scripts/GunRouletteGame/commands.py
 
+import asyncio
 import logging
-from app.api import send_group_msg
 from app.scripts.GunRouletteGame.menu import Menu
 from app.scripts.GunRouletteGame.GameManager import (
     GameManager,
     MIN_BET_AMOUNT,
     MAX_BET_AMOUNT,
 )
-from app.scripts.GunRouletteGame.DataManager import DataManager
-from app.scripts.GunRouletteGame.signin import SignIn
+from app.scripts.GunRouletteGame.DataManager import (
+    get_data_manager,
+    load_groups_with_running_games,
+)
+from app.scripts.GunRouletteGame.signin import (
+    SignIn,
+    SIGNIN_PERSIST_INTERVAL_SECONDS,
+    get_signin_sequencer,
+)
+from app.scripts.GunRouletteGame.locks import get_group_lock
+from app.scripts.GunRouletteGame.executor import run_io
+from app.scripts.GunRouletteGame.tracing import detach_trace
+from app.scripts.GunRouletteGame.expiry import (
+    GAME_IDLE_TIMEOUT_SECONDS,
+    game_last_activity,
+    is_game_idle,
+    pop_expired_games,
+    touch_game,
+)
+from app.scripts.GunRouletteGame.sharding import (
+    SHARD_COUNT,
+    get_shard_index,
+    is_shard_worker,
+    shard_for_group,
+)
+from app.scripts.GunRouletteGame.outbox import (
+    PRIORITY_QUERY,
+    PRIORITY_RESULT,
+    queue_group_msg,
+)
 
 DEFAULT_BULLET_COUNT = 4
 DEFAULT_BET_AMOUNT = 1  # 默认置权点数
 
 
+# 以下同步函数包含文件读写，通过 run_io 在存储线程池中执行，调用方需持有群组锁
+def _get_my_roulette(group_id, user_id):
+    # 先写入待写入的签到，使刚签到的积分立即可见
+    get_signin_sequencer(group_id).persist()
+    return get_data_manager(group_id).get_my_roulette(user_id)
+
+
+def _get_rank(group_id):
+    get_signin_sequencer(group_id).persist()
+    return get_data_manager(group_id).get_rank()
+
+
+def _start_game(group_id, user_id, bullet_count):
+    game_manager = GameManager(
+        group_id=group_id, initiator_id=user_id, bullet_count=bullet_count
+    )
+    return game_manager.start_game()
+
+
+def _player_shoot(group_id, user_id, bet_amount):
+    # initiator_id 在 player_shoot 中实际未使用，但构造函数需要
+    game_manager = GameManager(group_id=group_id, initiator_id=user_id)
+    return game_manager.player_shoot(user_id=user_id, bet_amount=bet_amount)
+
+
+def _admin_end_game(group_id):
+    # GameManager 的 initiator_id 在此场景下不重要，但构造函数需要
+    # 这里我们用一个通用占位符，因为游戏结束逻辑不依赖它
+    game_manager = GameManager(group_id=group_id, initiator_id="admin_action")
+    return game_manager.admin_end_game()
+
+
+def _expire_idle_game(group_id, game_id):
+    # 取出到期项之后、获得群组锁之前可能有新的biu，以游戏数据为准再次确认
+    game_data = get_data_manager(group_id).game_status.get("current_game")
+    if not game_data or game_data.get("id") != game_id:
+        return None
+    if not is_game_idle(game_data):
+        touch_game(group_id, game_id, game_last_activity(game_data))
+        return None
+    game_manager = GameManager(group_id=group_id, initiator_id="idle_expiry")
+    return game_manager.admin_end_game(
+        reason=f"已超过 {GAME_IDLE_TIMEOUT_SECONDS // 60} 分钟无人biu，自动结束"
+    )
+
+
+# 各群组的签到批量写入任务 {group_id: asyncio.Task}
+_signin_persist_tasks = {}
+
+
+async def _persist_signins_later(group_id, delay):
+    # 批量写入可能合并多个事件的签到，不计入安排它的事件的追踪
+    detach_trace()
+    await asyncio.sleep(delay)
+    sequencer = get_signin_sequencer(group_id)
+    try:
+        async with get_group_lock(group_id):
+            await run_io(sequencer.persist)
+    except Exception as e:
+        logging.error(f"写入群 {group_id} 的签到记录失败: {e}", exc_info=True)
+
+
+def schedule_signin_persist(group_id):
+    """
+    安排一次签到批量写入：达到批量大小时立即写入，否则等待 SIGNIN_PERSIST_INTERVAL_SECONDS
+    合并这段时间内的所有签到。每个群组同时只有一个写入任务。
+    """
+    task = _signin_persist_tasks.get(group_id)
+    if task is not None and not task.done():
+        return
+    delay = (
+        0
+        if get_signin_sequencer(group_id).is_persist_due()
+        else SIGNIN_PERSIST_INTERVAL_SECONDS
+    )
+    _signin_persist_tasks[group_id] = asyncio.ensure_future(
+        _persist_signins_later(group_id, delay)
+    )
+
+
 async def handle_my_roulette(websocket, group_id, user_id, message_id):
     """处理我的轮盘命令"""
-    data_manager = DataManager(group_id)
-    my_roulette = data_manager.get_my_roulette(user_id)
+    async with get_group_lock(group_id):
+        my_roulette = await run_io(_get_my_roulette, group_id, user_id)
     message = f"[CQ:reply,id={message_id}]"
     message += my_roulette
     try:
-        await send_group_msg(websocket, group_id, message)
+        await queue_group_msg(websocket, group_id, message, priority=PRIORITY_QUERY)
     except Exception as e:
         logging.error(f"处理我的轮盘命令失败: {e}")
 
 
 async def handle_roulette_rank(websocket, group_id, message_id):
     """处理轮盘排行榜命令"""
-    data_manager = DataManager(group_id)
-    rank_list = data_manager.get_rank()
+    async with get_group_lock(group_id):
+        rank_list = await run_io(_get_rank, group_id)
     rank_message = "轮盘排行榜\n"
     rank_message += "-----------------\n"
     for i, rank in enumerate(rank_list, 1):
         rank_message += f"{i}.{rank['user_id']}：{rank['total_score']}分\n"
     try:
-        await send_group_msg(websocket, group_id, rank_message)
+        await queue_group_msg(
+            websocket, group_id, rank_message, priority=PRIORITY_QUERY
+        )
     except Exception as e:
         logging.error(f"处理轮盘排行榜命令失败: {e}")
 
@@ -44,10 +154,12 @@ async def handle_roulette_rank(websocket, group_id, message_id):
 async def handle_roulette_menu(websocket, group_id, message_id):
     """处理轮盘菜单命令"""
     try:
-        await send_group_msg(websocket, group_id, Menu().get_menu())
+        await queue_group_msg(
+            websocket, group_id, Menu().get_menu(), priority=PRIORITY_QUERY
+        )
     except Exception as e:
         logging.error(f"处理轮盘菜单命令失败: {e}")
-        await send_group_msg(
+        await queue_group_msg(
             websocket,
             group_id,
             f"[CQ:reply,id={message_id}] 获取轮盘菜单失败，错误信息：{str(e)}",
@@ -55,16 +167,13 @@ async def handle_roulette_menu(websocket, group_id, message_id):
 
 
 async def handle_start_roulette_game(
-    websocket, group_id, user_id, raw_message, message_id
+    websocket, group_id, user_id, parameter_str, message_id
 ):
     """处理开始卷卷轮盘游戏命令"""
     bullet_count = DEFAULT_BULLET_COUNT
-    command_keyword = "开始轮盘"
 
-    # 从原始消息中提取命令关键字后的参数部分
-    # 例如: "开始轮盘", "开始轮盘8", "开始轮盘 8"
-    # 移除 "开始轮盘" 前缀，并去除两端可能存在的空格
-    parameter_str = raw_message[len(command_keyword) :].strip()
+    # parameter_str 为命令关键字后的参数部分，已去除两端空格
+    # 例如: "开始轮盘" -> "", "开始轮盘8" / "开始轮盘 8" -> "8"
 
     if parameter_str:  # 如果关键字 "开始轮盘" 之后有非空白内容
         try:
@@ -73,95 +182,91 @@ async def handle_start_roulette_game(
                 bullet_count = parsed_bullet_count
             else:
                 # biubiu数必须为正整数
-                await send_group_msg(
+                await queue_group_msg(
                     websocket,
                     group_id,
                     f"[CQ:reply,id={message_id}]无效的biubiu数量，必须为正整数。将使用默认值 {DEFAULT_BULLET_COUNT} 颗。",
+                    priority=PRIORITY_RESULT,
                 )
                 # bullet_count 保持默认值 DEFAULT_BULLET_COUNT
         except ValueError:
             # 参数不是一个有效的整数 (例如 "abc", "8 abc")
-            await send_group_msg(
+            await queue_group_msg(
                 websocket,
                 group_id,
                 f"[CQ:reply,id={message_id}]无效的biubiu数量格式，请输入纯数字。将使用默认值 {DEFAULT_BULLET_COUNT} 颗。",
+                priority=PRIORITY_RESULT,
             )
             # bullet_count 保持默认值 DEFAULT_BULLET_COUNT
     # 如果 parameter_str 为空 (即命令仅为 "开始轮盘"), bullet_count 保持默认值 DEFAULT_BULLET_COUNT
 
     try:
         # 实例化GameManager，传入 initiator_id
-        game_manager = GameManager(
-            group_id=group_id, initiator_id=user_id, bullet_count=bullet_count
-        )
-        game_result = game_manager.start_game()
+        async with get_group_lock(group_id):
+            game_result = await run_io(_start_game, group_id, user_id, bullet_count)
 
         reply_message = f"[CQ:reply,id={message_id}]"
         if game_result and game_result.get("success"):
             # 游戏开始成功的消息由 GameManager 返回
-            await send_group_msg(
+            await queue_group_msg(
                 websocket,
                 group_id,
                 f"{reply_message}{game_result.get('message')}",
+                priority=PRIORITY_RESULT,
             )
         elif game_result:  # game_result 存在但 success 为 False
-            await send_group_msg(
+            await queue_group_msg(
                 websocket,
                 group_id,
                 f"{reply_message}🚫🚫🚫开启卷卷轮盘游戏失败，失败原因："
                 + game_result.get("message", "未知错误"),
+                priority=PRIORITY_RESULT,
             )
         else:  # game_result 为 None 或其他意外情况
-            await send_group_msg(
+            await queue_group_msg(
                 websocket,
                 group_id,
                 f"{reply_message}🚫🚫🚫开启卷卷轮盘游戏失败，无法获取游戏结果。",
+                priority=PRIORITY_RESULT,
             )
     except Exception as e:
         logging.error(f"开始卷卷轮盘游戏失败: {e}")
-        await send_group_msg(
+        await queue_group_msg(
             websocket,
             group_id,
             f"[CQ:reply,id={message_id}] 🚫🚫🚫开启卷卷轮盘游戏失败，发生内部错误: {str(e)}",
         )
 
 
-async def handle_player_shoot(websocket, group_id, user_id, raw_message, message_id):
+async def handle_player_shoot(
+    websocket, group_id, user_id, potential_bet_str, message_id
+):
     """处理玩家biu命令"""
     bet_amount = DEFAULT_BET_AMOUNT  # 默认置权1点
     try:
-        command_keyword = "biu"
-        # 确保消息以 "biu" 开头，然后提取后续的参数
-        if raw_message.startswith(command_keyword):
-            potential_bet_str = raw_message[len(command_keyword) :].strip()
-
-            if potential_bet_str:  # 如果 "biu" 后面有内容
-                try:
-                    parsed_bet = int(potential_bet_str)
-                    if MIN_BET_AMOUNT <= parsed_bet <= MAX_BET_AMOUNT:
-                        bet_amount = parsed_bet
-                    else:
-                        await send_group_msg(
-                            websocket,
-                            group_id,
-                            f"[CQ:reply,id={message_id}]️️️无效的置权点数，请输入 {MIN_BET_AMOUNT}-{MAX_BET_AMOUNT} 之间的整数，将使用默认值 {DEFAULT_BET_AMOUNT} 点。",
-                        )
-                        # bet_amount 保持为 DEFAULT_BET_AMOUNT
-                except ValueError:
-                    await send_group_msg(
+        # potential_bet_str 为 "biu" 之后的参数部分，已去除两端空格
+        if potential_bet_str:  # 如果 "biu" 后面有内容
+            try:
+                parsed_bet = int(potential_bet_str)
+                if MIN_BET_AMOUNT <= parsed_bet <= MAX_BET_AMOUNT:
+                    bet_amount = parsed_bet
+                else:
+                    await queue_group_msg(
                         websocket,
                         group_id,
-                        f"[CQ:reply,id={message_id}]️️️无效的置权点数，请输入数字，将使用默认值 {DEFAULT_BET_AMOUNT} 点。",
+                        f"[CQ:reply,id={message_id}]️️️无效的置权点数，请输入 {MIN_BET_AMOUNT}-{MAX_BET_AMOUNT} 之间的整数，将使用默认值 {DEFAULT_BET_AMOUNT} 点。",
+                        priority=PRIORITY_RESULT,
                     )
                     # bet_amount 保持为 DEFAULT_BET_AMOUNT
-            # else: 如果 potential_bet_str 为空，表示玩家只发送了 "biu"，使用默认置权
-        else:
-            # 此情况理论上不应发生，因为 main.py 中有 startswith("biu") 的判断
-            # 但为保险起见，记录一个警告，并使用默认置权
-            logging.warning(
-                f"handle_player_shoot 接收到非预期格式的消息: {raw_message}"
-            )
-            # bet_amount 保持为 DEFAULT_BET_AMOUNT
+            except ValueError:
+                await queue_group_msg(
+                    websocket,
+                    group_id,
+                    f"[CQ:reply,id={message_id}]️️️无效的置权点数，请输入数字，将使用默认值 {DEFAULT_BET_AMOUNT} 点。",
+                    priority=PRIORITY_RESULT,
+                )
+                # bet_amount 保持为 DEFAULT_BET_AMOUNT
+        # else: 如果 potential_bet_str 为空，表示玩家只发送了 "biu"，使用默认置权
 
     except Exception as e:
         logging.warning(f"解析置权点数时出错: {e}，将使用默认值。")
@@ -169,43 +274,43 @@ async def handle_player_shoot(websocket, group_id, user_id, raw_message, message
 
     try:
         # GameManager 需要 group_id 来加载正确的游戏状态，但不需要 initiator_id 和 bullet_count 进行biu操作
-        # 可以在 GameManager 中直接从加载的 game_status 获取 bullet_count
-        # 但为了保持一致性或未来可能的扩展，我们可以选择实例化一个新的GameManager对象
-        # 或者，如果 GameManager 设计为单例或可重用，则可以直接调用方法
-        # 当前设计，每次都实例化一个新的 Manager，它会自己加载状态
-        game_manager = GameManager(
-            group_id=group_id, initiator_id=user_id
-        )  # initiator_id 在 player_shoot 中实际未使用，但构造函数需要
-        shoot_result = game_manager.player_shoot(user_id=user_id, bet_amount=bet_amount)
+        # 每次实例化的 GameManager 共享群组常驻的 DataManager，不会重复读取状态
+        # 同一群组的biu按到达顺序串行处理，避免并发修改游戏状态导致重复结算
+        async with get_group_lock(group_id):
+            shoot_result = await run_io(_player_shoot, group_id, user_id, bet_amount)
 
         reply_message_base = f"[CQ:reply,id={message_id}]"
 
         if shoot_result and shoot_result.get("success"):
             message_to_send = f"{reply_message_base}{shoot_result.get('message')}"
-            await send_group_msg(websocket, group_id, message_to_send)
+            await queue_group_msg(
+                websocket, group_id, message_to_send, priority=PRIORITY_RESULT
+            )
 
             # 如果游戏结束，可以考虑发送一个更详细的总结，或者已经在 shoot_result['message'] 中
             # if shoot_result.get("game_over"):
             #     details = shoot_result.get("details", {})
             #     summary_message = details.get("summary", "游戏已结束。")
-            #     # await send_group_msg(websocket, group_id, f"本场游戏总结：\n{summary_message}")
+            #     # await queue_group_msg(websocket, group_id, f"本场游戏总结：\n{summary_message}")
 
         elif shoot_result:  # shoot_result 存在但 success 为 False
-            await send_group_msg(
+            await queue_group_msg(
                 websocket,
                 group_id,
                 f"{reply_message_base}🚫{shoot_result.get('message', '操作失败')}",
+                priority=PRIORITY_RESULT,
             )
         else:
-            await send_group_msg(
+            await queue_group_msg(
                 websocket,
                 group_id,
                 f"{reply_message_base}🚫biu失败，无法获取游戏结果。",
+                priority=PRIORITY_RESULT,
             )
 
     except Exception as e:
         logging.error(f"处理玩家biu命令失败: {e}")
-        await send_group_msg(
+        await queue_group_msg(
             websocket,
             group_id,
             f"[CQ:reply,id={message_id}] 🚫处理biu命令失败，发生内部错误: {str(e)}。",
@@ -215,58 +320,107 @@ async def handle_player_shoot(websocket, group_id, user_id, raw_message, message
 async def handle_admin_end_game(websocket, group_id, message_id):
     """处理管理员结束游戏命令"""
     try:
-        # GameManager 的 initiator_id 在此场景下不重要，但构造函数需要
-        # 可以传入一个占位符或者管理员自己的ID（如果需要记录操作者）
-        # 这里我们用一个通用占位符，因为游戏结束逻辑不依赖它
-        admin_user_id_placeholder = "admin_action"
-        game_manager = GameManager(
-            group_id=group_id, initiator_id=admin_user_id_placeholder
-        )
-        result = game_manager.admin_end_game()
+        async with get_group_lock(group_id):
+            result = await run_io(_admin_end_game, group_id)
 
         reply_message_base = f"[CQ:reply,id={message_id}]"
 
         if result and result.get("success"):
-            await send_group_msg(
+            await queue_group_msg(
                 websocket,
                 group_id,
                 f"{reply_message_base}{result.get('message')}",
+                priority=PRIORITY_RESULT,
             )
         elif result:  # result 存在但 success 为 False
-            await send_group_msg(
+            await queue_group_msg(
                 websocket,
                 group_id,
                 f"{reply_message_base}🚫{result.get('message', '操作失败')}",
+                priority=PRIORITY_RESULT,
             )
         else:
-            await send_group_msg(
+            await queue_group_msg(
                 websocket,
                 group_id,
                 f"{reply_message_base}🚫结束游戏失败，无法获取处理结果。",
+                priority=PRIORITY_RESULT,
             )
     except Exception as e:
         logging.error(f"管理员结束游戏失败: {e}", exc_info=True)
-        await send_group_msg(
+        await queue_group_msg(
             websocket,
             group_id,
             f"[CQ:reply,id={message_id}] 🚫管理员结束游戏时发生内部错误: {str(e)}。",
         )
 
 
+# 是否已扫描存储中进行中的游戏
+_persisted_games_scheduled = False
+
+
+def _owns_group(group_id):
+    """分片工作进程只加载分配给自己的群组"""
+    return shard_for_group(group_id, SHARD_COUNT) == get_shard_index()
+
+
+async def _schedule_persisted_games():
+    """
+    首次心跳时加载存储中有进行中游戏的群组，使重启前的游戏也加入闲置超时表，
+    否则重启后一直无人发言的群组不会加载，游戏也就不会自动结束
+    """
+    global _persisted_games_scheduled
+    if _persisted_games_scheduled or GAME_IDLE_TIMEOUT_SECONDS <= 0:
+        return
+    _persisted_games_scheduled = True
+    try:
+        await run_io(
+            load_groups_with_running_games,
+            _owns_group if is_shard_worker() else None,
+        )
+    except Exception as e:
+        logging.error(f"加载进行中的游戏失败: {e}", exc_info=True)
+
+
+async def handle_idle_game_expiry(websocket):
+    """结算闲置超时的游戏，由心跳调用"""
+    await _schedule_persisted_games()
+    for group_id, game_id in pop_expired_games():
+        try:
+            async with get_group_lock(group_id):
+                result = await run_io(_expire_idle_game, group_id, game_id)
+            if result and result.get("success"):
+                await queue_group_msg(
+                    websocket, group_id, result["message"], priority=PRIORITY_RESULT
+                )
+        except Exception as e:
+            logging.error(f"自动结束群 {group_id} 的闲置游戏失败: {e}", exc_info=True)
+
+
 async def handle_roulette_signin(websocket, group_id, user_id, message_id):
     """处理轮盘签到命令"""
     try:
-
         signin_manager = SignIn(group_id=group_id, user_id=user_id)
+        today_date_str = signin_manager._get_utc8_now().strftime("%Y-%m-%d")
+        if not signin_manager.sequencer.is_ready(today_date_str):
+            # 当天首次签到时加载签到记录，之后的签到只访问内存
+            async with get_group_lock(group_id):
+                await run_io(signin_manager.sequencer.load_day, today_date_str)
+        # 名次在事件循环中按消息处理顺序分配，不等待群组锁和文件读写
         signin_result = signin_manager.perform_signin()
 
         reply_message = f"[CQ:reply,id={message_id}]{signin_result.get('message', '签到处理时发生未知错误。')}"
 
-        await send_group_msg(websocket, group_id, reply_message)
+        await queue_group_msg(
+            websocket, group_id, reply_message, priority=PRIORITY_RESULT
+        )
+
+        if signin_result.get("success"):
+            schedule_signin_persist(group_id)
 
     except Exception as e:
         logging.error(f"处理轮盘签到命令失败: {e}", exc_info=True)
-        await send_group_msg(
+        await queue_group_msg(
             websocket,
             group_id,
             f"[CQ:reply,id={message_id}] 😥处理签到命令失败，发生内部错误: {str(e)}。",
@@ -0,0 +1,195 @@
+"""
+群消息命令分发
+
+所有命令在导入时注册到 CommandRegistry：完全匹配的命令放在字典中，前缀命令按首字符分桶并按长度
+从长到短排列。分发时先用首字符判断消息是否可能是命令，绝大多数普通聊天消息在这一步直接返回，
+不会读取开关文件或任何数据文件。匹配成功后统一完成功能开关检查、禁用群组检查和参数截取，
+并记录每个命令的调用次数和耗时。权限检查由需要的命令自行处理。
+"""
+
+import time
+import logging
+from app.scripts.GunRouletteGame.metrics import COMMAND_DURATION, COMMANDS_TOTAL
+from app.scripts.GunRouletteGame.tracing import span
+
+# 单次分发耗时超过该值（秒）时记录警告
+SLOW_COMMAND_SECONDS = 1.0
+
+
+class Command:
+    """
+    命令定义。
+
+    Args:
+        name: 命令名称，用于统计
+        keyword: 命令关键字
+        handler: 异步处理函数，签名为 handler(websocket, context)
+        prefix: 为 True 时按前缀匹配，关键字之后的内容（去除两端空白）作为参数
+        ignore_case: 匹配时忽略大小写
+        check_ban: 是否在禁用群组中拒绝该命令
+        require_enabled: 是否只在群组开启功能时响应
+    """
+
+    def __init__(
+        self,
+        name,
+        keyword,
+        handler,
+        prefix=False,
+        ignore_case=False,
+        check_ban=True,
+        require_enabled=True,
+    ):
+        self.name = name
+        self.keyword = keyword.lower() if ignore_case else keyword
+        self.handler = handler
+        self.prefix = prefix
+        self.ignore_case = ignore_case
+        self.check_ban = check_ban
+        self.require_enabled = require_enabled
+
+
+class CommandContext:
+    """
+    一次命令调用的上下文，参数只在匹配时截取一次
+    """
+
+    __slots__ = (
+        "group_id",
+        "user_id",
+        "message_id",
+        "raw_message",
+        "args",
+        "is_authorized_user",
+    )
+
+    def __init__(
+        self, group_id, user_id, message_id, raw_message, args, is_authorized_user
+    ):
+        self.group_id = group_id
+        self.user_id = user_id
+        self.message_id = message_id
+        self.raw_message = raw_message
+        self.args = args
+        self.is_authorized_user = is_authorized_user
+
+
+class CommandStats:
+    """
+    单个命令的分发统计
+    """
+
+    __slots__ = ("count", "errors", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, elapsed, failed):
+        self.count += 1
+        if failed:
+            self.errors += 1
+        self.total_seconds += elapsed
+        if elapsed > self.max_seconds:
+            self.max_seconds = elapsed
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_seconds": self.total_seconds,
+            "avg_seconds": self.total_seconds / self.count if self.count else 0.0,
+            "max_seconds": self.max_seconds,
+        }
+
+
+class CommandRegistry:
+    """
+    预编译的命令表。
+    """
+
+    def __init__(self):
+        self._exact = {}  # {关键字: Command}
+        self._exact_ignore_case = {}  # {小写关键字: Command}
+        self._prefix_buckets = {}  # {首字符: [Command]}，按关键字长度从长到短
+        self._first_chars = set()
+        self._stats = {}  # {命令名称: CommandStats}
+        self.unmatched_count = 0
+
+    def register(self, command):
+        """
+        注册命令，关键字重复时抛出 ValueError
+        """
+        if command.prefix:
+            bucket_keys = {command.keyword[0]}
+            if command.ignore_case:
+                bucket_keys.add(command.keyword[0].upper())
+            for first_char in bucket_keys:
+                bucket = self._prefix_buckets.setdefault(first_char, [])
+                if any(existing.keyword == command.keyword for existing in bucket):
+                    raise ValueError(f"命令关键字 {command.keyword} 重复注册")
+                bucket.append(command)
+                bucket.sort(key=lambda existing: len(existing.keyword), reverse=True)
+            self._first_chars.update(bucket_keys)
+        else:
+            table = self._exact_ignore_case if command.ignore_case else self._exact
+            if command.keyword in table:
+                raise ValueError(f"命令关键字 {command.keyword} 重复注册")
+            table[command.keyword] = command
+            self._first_chars.add(command.keyword[0])
+            if command.ignore_case:
+                self._first_chars.add(command.keyword[0].upper())
+        self._stats.setdefault(command.name, CommandStats())
+        return command
+
+    def match(self, raw_message):
+        """
+        匹配命令，返回 (Command, 参数字符串)，不是命令时返回 None
+        """
+        if not raw_message or raw_message[0] not in self._first_chars:
+            self.unmatched_count += 1
+            return None
+        command = self._exact.get(raw_message)
+        if command is not None:
+            return command, ""
+        if self._exact_ignore_case:
+            command = self._exact_ignore_case.get(raw_message.lower())
+            if command is not None:
+                return command, ""
+        for command in self._prefix_buckets.get(raw_message[0], ()):
+            head = raw_message[: len(command.keyword)]
+            if command.ignore_case:
+                head = head.lower()
+            if head == command.keyword:
+                return command, raw_message[len(command.keyword) :].strip()
+        self.unmatched_count += 1
+        return None
+
+    async def run(self, command, websocket, context):
+        """
+        执行命令并记录耗时
+        """
+        started = time.perf_counter()
+        failed = True
+        try:
+            with span("command", command=command.name):
+                await command.handler(websocket, context)
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stats[command.name].record(elapsed, failed)
+            COMMANDS_TOTAL.inc(command.name, "error" if failed else "ok")
+            COMMAND_DURATION.observe(elapsed, command.name)
+            if elapsed > SLOW_COMMAND_SECONDS:
+                logging.warning(
+                    f"命令 {command.name} 在群 {context.group_id} 处理耗时 {elapsed:.3f} 秒"
+                )
+
+    def get_stats(self):
+        """
+        获取各命令的分发统计
+        返回字典 {命令名称: {count, errors, total_seconds, avg_seconds, max_seconds}}
+        """
+        return {name: stats.to_dict() for name, stats in self._stats.items()}
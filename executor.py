@@ -0,0 +1,119 @@
+"""
+存储 I/O 线程池
+
+DataManager、SignIn 和功能开关的文件读写都是同步阻塞的，在事件循环线程中执行时，
+一次慢速磁盘写入会阻塞所有群组的消息处理。命令处理函数通过 run_io 把这些调用
+放到有界线程池中执行并等待结果，事件循环只负责调度。
+"""
+
+import os
+import asyncio
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.scripts.GunRouletteGame.profiling import current_event_profile
+from app.scripts.GunRouletteGame.tracing import span
+
+# 线程池大小
+IO_EXECUTOR_WORKERS = int(os.environ.get("GUN_ROULETTE_IO_WORKERS", "4"))
+# 同时提交到线程池的最大任务数，超出后新任务在事件循环中等待（背压），避免无限排队
+IO_EXECUTOR_MAX_PENDING = int(os.environ.get("GUN_ROULETTE_IO_MAX_PENDING", "256"))
+
+_executor = None
+_executor_lock = threading.Lock()
+_submit_semaphore = None
+# 已提交但尚未完成的任务数
+_pending_count = 0
+# 正在线程中执行的任务数
+_running_count = 0
+_running_lock = threading.Lock()
+# 等待提交的任务数（受 IO_EXECUTOR_MAX_PENDING 限制而等待）
+_waiting_count = 0
+
+
+def get_io_executor():
+    """
+    获取全局存储 I/O 线程池，首次使用时创建
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=IO_EXECUTOR_WORKERS,
+                    thread_name_prefix="GunRouletteGameIO",
+                )
+    return _executor
+
+
+def get_io_stats():
+    """
+    获取线程池状态：
+    workers: 线程数
+    running: 正在执行的任务数
+    queued: 已提交、等待空闲线程的任务数
+    waiting: 因达到提交上限而在事件循环中等待的任务数
+    """
+    return {
+        "workers": IO_EXECUTOR_WORKERS,
+        "running": _running_count,
+        "queued": _pending_count - _running_count,
+        "waiting": _waiting_count,
+    }
+
+
+def _run_counted(func):
+    global _running_count
+    with _running_lock:
+        _running_count += 1
+    try:
+        return func()
+    finally:
+        with _running_lock:
+            _running_count -= 1
+
+
+async def run_io(func, *args, **kwargs):
+    """
+    在存储 I/O 线程池中执行同步函数并等待结果，异常会原样抛出。
+    调用在当前上下文的副本中执行，追踪区段等 contextvar 在工作线程中同样可用
+    """
+    with span("run_io", function=getattr(func, "__qualname__", repr(func))):
+        return await _submit_io(functools.partial(func, *args, **kwargs))
+
+
+async def _submit_io(call):
+    global _submit_semaphore, _pending_count, _waiting_count
+    if _submit_semaphore is None:
+        _submit_semaphore = asyncio.Semaphore(IO_EXECUTOR_MAX_PENDING)
+
+    _waiting_count += 1
+    try:
+        await _submit_semaphore.acquire()
+    finally:
+        _waiting_count -= 1
+
+    _pending_count += 1
+    try:
+        profile = current_event_profile()
+        if profile is not None:
+            # 被抽样的事件在工作线程中同样进行性能分析
+            call = profile.wrap_io_call(call)
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            get_io_executor(), context.run, _run_counted, call
+        )
+    finally:
+        _pending_count -= 1
+        _submit_semaphore.release()
+
+
+def shutdown_io_executor():
+    """
+    等待已提交的任务完成并关闭线程池
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,159 @@
+"""
+闲置游戏自动结束
+
+进行中的游戏超过 GAME_IDLE_TIMEOUT_SECONDS 没有新的biu时，由心跳按管理员结束游戏的方式结算
+（所有参与者按无人中弹计分），并向群里发送结算消息，避免无人继续的游戏一直占用群组。
+
+每个有进行中游戏的群组在最小堆中只保留一项 (截止时间, 群号)。开始游戏和每次biu只更新内存中的
+截止时间，不调整堆；堆顶到期时如果截止时间已被推迟，就按新的截止时间重新入堆，否则交给心跳结算。
+每次心跳只处理堆顶已到期的项，开销与到期的游戏数有关，与群组数无关。
+
+超时由环境变量 GUN_ROULETTE_GAME_IDLE_TIMEOUT（秒，默认 3600）设定，0 表示不自动结束。
+"""
+
+import os
+import time
+import heapq
+import threading
+from datetime import datetime
+
+# 游戏闲置多久（秒）后自动结束，0 表示不自动结束
+GAME_IDLE_TIMEOUT_SECONDS = int(
+    os.environ.get("GUN_ROULETTE_GAME_IDLE_TIMEOUT", "3600") or 0
+)
+
+
+def game_last_activity(game_data):
+    """
+    游戏最近一次活动（开始或biu）的 Unix 时间戳
+    """
+    times = [game_data["start_time"]]
+    times.extend(
+        participant["shot_time"]
+        for participant in game_data.get("participants", {}).values()
+        if participant.get("shot_time")
+    )
+    return max(datetime.fromisoformat(time_str).timestamp() for time_str in times)
+
+
+class ExpiryScheduler:
+    """
+    按截止时间排序的游戏超时表，可从存储线程池和事件循环同时访问
+    """
+
+    def __init__(self, timeout_seconds):
+        self.timeout_seconds = timeout_seconds
+        self._heap = []  # [(入堆时的截止时间, group_id)]
+        self._scheduled = {}  # {group_id: 该群组在堆中有效项的截止时间}
+        self._deadlines = {}  # {group_id: (当前截止时间, game_id)}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def touch(self, group_id, game_id, last_activity=None):
+        """
+        记录游戏的一次活动，截止时间推迟到 last_activity（默认当前时间）之后 timeout_seconds
+        """
+        if self.timeout_seconds <= 0:
+            return
+        if last_activity is None:
+            last_activity = time.time()
+        deadline = last_activity + self.timeout_seconds
+        with self._lock:
+            self._deadlines[group_id] = (deadline, game_id)
+            scheduled = self._scheduled.get(group_id)
+            # 截止时间只会推迟时不入堆，等堆顶到期时再处理；提前时（加载已闲置的游戏）才需要新的一项
+            if scheduled is None or deadline < scheduled:
+                self._scheduled[group_id] = deadline
+                heapq.heappush(self._heap, (deadline, group_id))
+
+    def cancel(self, group_id, game_id):
+        """
+        游戏已结束，不再需要超时；堆中的项到期时直接丢弃
+        """
+        with self._lock:
+            current = self._deadlines.get(group_id)
+            if current is not None and current[1] == game_id:
+                del self._deadlines[group_id]
+
+    def pop_expired(self, now=None):
+        """
+        取出截止时间不晚于 now 的游戏，返回 [(group_id, game_id)]
+        """
+        if now is None:
+            now = time.time()
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                heap_deadline, group_id = heapq.heappop(self._heap)
+                if self._scheduled.get(group_id) != heap_deadline:
+                    continue  # 已被更早的一项取代
+                del self._scheduled[group_id]
+                current = self._deadlines.get(group_id)
+                if current is None:
+                    continue  # 游戏已结束
+                deadline, game_id = current
+                if deadline > now:
+                    # 期间有过biu，按新的截止时间重新入堆
+                    self._scheduled[group_id] = deadline
+                    heapq.heappush(self._heap, (deadline, group_id))
+                    continue
+                del self._deadlines[group_id]
+                expired.append((group_id, game_id))
+        return expired
+
+    def next_deadline(self):
+        """
+        堆顶的截止时间（可能已被推迟），没有进行中的游戏时返回 None
+        """
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+
+_scheduler = ExpiryScheduler(GAME_IDLE_TIMEOUT_SECONDS)
+
+
+def get_expiry_scheduler():
+    return _scheduler
+
+
+def touch_game(group_id, game_id, last_activity=None):
+    """
+    游戏开始或有新的biu时调用
+    """
+    _scheduler.touch(str(group_id), game_id, last_activity)
+
+
+def touch_loaded_game(group_id, game_data):
+    """
+    从存储加载到进行中的游戏时调用，按游戏中记录的最近活动时间计算截止时间
+    """
+    if game_data is None or game_data.get("status") != "running":
+        return
+    touch_game(group_id, game_data["id"], game_last_activity(game_data))
+
+
+def cancel_game(group_id, game_id):
+    """
+    游戏结算后调用
+    """
+    _scheduler.cancel(str(group_id), game_id)
+
+
+def pop_expired_games(now=None):
+    """
+    取出已闲置超时的游戏 [(group_id, game_id)]，由心跳调用
+    """
+    return _scheduler.pop_expired(now)
+
+
+def is_game_idle(game_data, now=None):
+    """
+    按游戏数据判断是否已闲置超时，结算前在群组锁内再次确认
+    """
+    if GAME_IDLE_TIMEOUT_SECONDS <= 0:
+        return False
+    if now is None:
+        now = time.time()
+    return now - game_last_activity(game_data) >= GAME_IDLE_TIMEOUT_SECONDS
@@ -0,0 +1,134 @@
+"""
+文件读写工具
+
+状态文件统一通过临时文件加重命名的方式原子写入，写入中途崩溃不会留下截断的文件；
+替换前的上一份文件保留为 .bak，读取时目标文件损坏或缺失会自动回退到 .bak。
+文件内容由 codec.py 按当前写入格式编码，读取时按内容识别格式。
+
+DURABILITY_MODE（或环境变量 GUN_ROULETTE_DURABILITY）控制 fsync 策略：
+- "always"：每次写入都 fsync 文件和所在目录，最安全，写入开销最大
+- "batch"：写入时不 fsync，记录待同步的文件，由 sync_pending_writes 在每次写回结束时统一 fsync
+- "none"：从不 fsync，交给操作系统自行刷盘
+"""
+
+import os
+import time
+import logging
+import threading
+from app.scripts.GunRouletteGame.metrics import StorageTimer
+from app.scripts.GunRouletteGame.codec import CodecError, decode, encode
+
+DURABILITY_MODE = os.environ.get("GUN_ROULETTE_DURABILITY", "batch")
+
+# 上一份正常文件的后缀
+BACKUP_SUFFIX = ".bak"
+# 原子写入时使用的临时文件后缀
+TEMP_SUFFIX = ".tmp"
+
+# batch 模式下待 fsync 的文件和目录
+_pending_sync_paths = set()
+_pending_sync_lock = threading.Lock()
+
+
+def _fsync_path(path, is_dir=False):
+    try:
+        fd = os.open(path, os.O_RDONLY | (getattr(os, "O_DIRECTORY", 0) if is_dir else 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # 部分平台不支持对目录 fsync
+    finally:
+        os.close(fd)
+
+
+def mark_written(path):
+    """
+    按持久化模式处理一次已完成的写入：always 立即 fsync，batch 记录待同步
+    """
+    if DURABILITY_MODE == "always":
+        _fsync_path(path)
+        _fsync_path(os.path.dirname(path), is_dir=True)
+    elif DURABILITY_MODE == "batch":
+        with _pending_sync_lock:
+            _pending_sync_paths.add(path)
+
+
+def sync_pending_writes():
+    """
+    batch 模式下对所有待同步的文件及其目录执行 fsync
+    """
+    with _pending_sync_lock:
+        paths = list(_pending_sync_paths)
+        _pending_sync_paths.clear()
+    if not paths:
+        return
+    with StorageTimer("fsync"):
+        directories = set()
+        for path in paths:
+            _fsync_path(path)
+            directories.add(os.path.dirname(path))
+        for directory in directories:
+            _fsync_path(directory, is_dir=True)
+
+
+def atomic_write_data(path, data):
+    """
+    原子写入状态文件：写入临时文件后重命名替换，原文件保留为 .bak
+    """
+    content = encode(data)
+    tmp_path = path + TEMP_SUFFIX
+    with StorageTimer("write"):
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+            f.flush()
+            if DURABILITY_MODE == "always":
+                os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.replace(path, path + BACKUP_SUFFIX)
+        os.replace(tmp_path, path)
+        if DURABILITY_MODE == "always":
+            _fsync_path(os.path.dirname(path), is_dir=True)
+    if DURABILITY_MODE == "batch":
+        with _pending_sync_lock:
+            _pending_sync_paths.add(path)
+
+
+def _read_data_file(path):
+    with StorageTimer("read"):
+        with open(path, "rb") as f:
+            content = f.read()
+    return decode(content)
+
+
+def load_data_with_recovery(path):
+    """
+    读取状态文件，文件损坏或缺失时回退到上一份正常的 .bak 文件。
+
+    两者都不可用时返回 None；如果目标文件存在但已损坏，会将其重命名为
+    .corrupt-时间戳 保留现场，避免随后写入默认数据时被覆盖。
+    """
+    backup_path = path + BACKUP_SUFFIX
+    path_exists = os.path.exists(path)
+    if path_exists:
+        try:
+            return _read_data_file(path)
+        except (CodecError, OSError) as e:
+            logging.error(f"文件 {path} 已损坏，尝试从备份恢复: {e}")
+    if os.path.exists(backup_path):
+        try:
+            data = _read_data_file(backup_path)
+            if path_exists:
+                logging.warning(f"文件 {path} 已从备份 {backup_path} 恢复")
+            return data
+        except (CodecError, OSError) as e:
+            logging.error(f"备份文件 {backup_path} 已损坏: {e}")
+    if path_exists:
+        corrupt_path = f"{path}.corrupt-{int(time.time())}"
+        try:
+            os.replace(path, corrupt_path)
+            logging.error(f"文件 {path} 及其备份均不可用，已保留为 {corrupt_path}")
+        except OSError:
+            pass
+    return None
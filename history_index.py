@@ -0,0 +1,114 @@
+"""
+游戏历史二级索引
+
+在分段历史日志（见 history_log.py）之上按玩家和日期维护记录位置：
+data_dir/群号/game_history/by_player/玩家QQ号.jsonl   该玩家参与的每局记录位置
+data_dir/群号/game_history/by_date/YYYY-MM-DD.jsonl   按开始日期（东八区）分桶的记录位置
+
+每行是一条 [分段文件名, 偏移, 长度]，查询时只读取相关玩家或日期的索引文件，
+再按位置读取对应的历史记录，不会读取无关的记录。
+"""
+
+import os
+import json
+import shutil
+from datetime import datetime, timedelta, timezone
+from app.scripts.GunRouletteGame.fileio import mark_written
+from app.scripts.GunRouletteGame.codec import dumps_json, loads_json
+
+# 读取玩家索引尾部时每次向前读取的字节数
+TAIL_READ_BLOCK_SIZE = 4096
+
+
+def history_date_of(game_data):
+    """
+    返回游戏开始时间对应的东八区日期字符串 YYYY-MM-DD，缺少开始时间时返回 None
+    """
+    if not game_data.get("start_time"):
+        return None
+    start_time = datetime.fromisoformat(game_data["start_time"])
+    return start_time.astimezone(timezone(timedelta(hours=8))).strftime("%Y-%m-%d")
+
+
+class HistoryIndex:
+    """
+    按玩家和日期的游戏历史索引。
+    """
+
+    def __init__(self, history_dir):
+        self.player_index_dir = os.path.join(history_dir, "by_player")
+        self.date_index_dir = os.path.join(history_dir, "by_date")
+        os.makedirs(self.player_index_dir, exist_ok=True)
+        os.makedirs(self.date_index_dir, exist_ok=True)
+
+    @staticmethod
+    def _append_location(path, location):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(dumps_json(list(location)) + "\n")
+        mark_written(path)
+
+    def add(self, location, game_data):
+        """
+        为一条历史记录添加玩家索引和日期索引
+        """
+        for user_id in game_data.get("participants_log", {}):
+            self._append_location(
+                os.path.join(self.player_index_dir, f"{user_id}.jsonl"), location
+            )
+        date_str = history_date_of(game_data)
+        if date_str is not None:
+            self._append_location(
+                os.path.join(self.date_index_dir, f"{date_str}.jsonl"), location
+            )
+
+    @staticmethod
+    def _parse_locations(lines):
+        locations = []
+        for line in lines:
+            try:
+                locations.append(tuple(loads_json(line)))
+            except (json.JSONDecodeError, TypeError):
+                continue  # 跳过写入中断的索引行
+        return locations
+
+    def player_locations(self, user_id, limit):
+        """
+        获取玩家最近 limit 局的记录位置，最新的在前。
+        只从索引文件尾部向前读取所需的行数。
+        """
+        path = os.path.join(self.player_index_dir, f"{user_id}.jsonl")
+        if limit <= 0 or not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b""
+            # 多读一行，保证最前面的一行是完整的
+            while position > 0 and data.count(b"\n") <= limit:
+                read_size = min(TAIL_READ_BLOCK_SIZE, position)
+                position -= read_size
+                f.seek(position)
+                data = f.read(read_size) + data
+        lines = data.decode("utf-8", errors="ignore").splitlines()
+        if position > 0:
+            lines = lines[1:]
+        locations = self._parse_locations(lines)
+        return list(reversed(locations[-limit:]))
+
+    def date_locations(self, date_str):
+        """
+        获取指定日期开始的所有记录位置，按写入顺序排列
+        """
+        path = os.path.join(self.date_index_dir, f"{date_str}.jsonl")
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            return self._parse_locations(f)
+
+    def clear(self):
+        """
+        删除全部二级索引，用于重建
+        """
+        for index_dir in (self.player_index_dir, self.date_index_dir):
+            shutil.rmtree(index_dir, ignore_errors=True)
+            os.makedirs(index_dir, exist_ok=True)
@@ -0,0 +1,206 @@
+"""
+游戏历史日志
+
+游戏历史以 JSON Lines 格式顺序追加到分段日志文件中，代替每局一个 JSON 文件：
+data_dir/群号/game_history/YYYY-MM-DD.NNN.jsonl   分段日志，按东八区日期和大小滚动
+data_dir/群号/game_history/index.jsonl            偏移索引，每行 {"g": 游戏ID, "s": 分段文件名, "o": 偏移, "n": 长度}
+
+按游戏ID查询时通过偏移索引直接定位，只需一次 seek 和一次读取。
+"""
+
+import os
+import json
+from datetime import datetime, timedelta, timezone
+from app.scripts.GunRouletteGame.fileio import mark_written
+from app.scripts.GunRouletteGame.metrics import StorageTimer
+from app.scripts.GunRouletteGame.codec import dumps_json, loads_json
+
+# 单个分段日志的大小上限（字节），超过后滚动到新分段
+HISTORY_SEGMENT_MAX_BYTES = 16 * 1024 * 1024
+# 偏移索引文件名
+HISTORY_INDEX_FILENAME = "index.jsonl"
+# 分段日志文件扩展名
+HISTORY_SEGMENT_SUFFIX = ".jsonl"
+
+
+class HistoryLog:
+    """
+    追加写入的分段游戏历史日志。
+    """
+
+    def __init__(self, history_dir):
+        self.history_dir = history_dir
+        os.makedirs(history_dir, exist_ok=True)
+        self.index_file = os.path.join(history_dir, HISTORY_INDEX_FILENAME)
+        self._offsets = None  # {game_id: (segment, offset, length)}，首次查询时加载
+        self._segment_name = None  # 当前追加的分段文件名
+        self._segment_file = None
+        self._index_fp = None
+
+    def _today_str(self):
+        return datetime.now(timezone(timedelta(hours=8))).strftime("%Y-%m-%d")
+
+    def list_segments(self):
+        """
+        按写入顺序列出所有分段日志文件名
+        """
+        return sorted(
+            name
+            for name in os.listdir(self.history_dir)
+            if name.endswith(HISTORY_SEGMENT_SUFFIX) and name != HISTORY_INDEX_FILENAME
+        )
+
+    def _current_segment(self, record_size):
+        """
+        返回当前可追加的分段文件，日期变化或大小超限时滚动到新分段
+        """
+        today_str = self._today_str()
+        if self._segment_file is not None:
+            if (
+                self._segment_name.startswith(today_str)
+                and self._segment_file.tell() + record_size <= HISTORY_SEGMENT_MAX_BYTES
+            ):
+                return self._segment_file
+            self._segment_file.close()
+            self._segment_file = None
+
+        # 找到今天最新的分段，继续追加或新建下一个编号的分段
+        today_segments = [
+            name for name in self.list_segments() if name.startswith(today_str + ".")
+        ]
+        if today_segments:
+            last_name = today_segments[-1]
+            sequence = int(last_name[len(today_str) + 1 : -len(HISTORY_SEGMENT_SUFFIX)])
+            last_path = os.path.join(self.history_dir, last_name)
+            if os.path.getsize(last_path) + record_size > HISTORY_SEGMENT_MAX_BYTES:
+                sequence += 1
+        else:
+            sequence = 0
+        self._segment_name = f"{today_str}.{sequence:03d}{HISTORY_SEGMENT_SUFFIX}"
+        self._segment_file = open(os.path.join(self.history_dir, self._segment_name), "ab")
+        self._segment_file.seek(0, os.SEEK_END)
+        # 上次写入中断留下的半行记录，补一个换行避免与新记录粘连
+        if self._segment_file.tell() > 0:
+            with open(os.path.join(self.history_dir, self._segment_name), "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._segment_file.write(b"\n")
+        return self._segment_file
+
+    def append(self, game_id, game_data):
+        """
+        追加一条游戏历史记录并写入偏移索引
+        """
+        line = (dumps_json(game_data) + "\n").encode("utf-8")
+        with StorageTimer("append"):
+            segment_file = self._current_segment(len(line))
+            offset = segment_file.tell()
+            segment_file.write(line)
+            segment_file.flush()
+            mark_written(os.path.join(self.history_dir, self._segment_name))
+
+            location = (self._segment_name, offset, len(line))
+            self._append_index(game_id, location)
+        if self._offsets is not None:
+            self._offsets[game_id] = location
+        return location
+
+    def _append_index(self, game_id, location):
+        if self._index_fp is None:
+            self._index_fp = open(self.index_file, "a", encoding="utf-8")
+        segment, offset, length = location
+        self._index_fp.write(
+            dumps_json({"g": game_id, "s": segment, "o": offset, "n": length}) + "\n"
+        )
+        self._index_fp.flush()
+        mark_written(self.index_file)
+
+    def _load_offsets(self):
+        if self._offsets is not None:
+            return self._offsets
+        offsets = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = loads_json(line)
+                    except json.JSONDecodeError:
+                        continue  # 跳过写入中断的索引行
+                    # 游戏ID重复时以最后一次写入为准
+                    offsets[entry["g"]] = (entry["s"], entry["o"], entry["n"])
+        self._offsets = offsets
+        return offsets
+
+    def read_at(self, location):
+        """
+        读取指定位置 (分段文件名, 偏移, 长度) 的记录，损坏时返回 None
+        """
+        segment, offset, length = location
+        try:
+            with StorageTimer("read"):
+                with open(os.path.join(self.history_dir, segment), "rb") as f:
+                    f.seek(offset)
+                    return loads_json(f.read(length).decode("utf-8"))
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError):
+            return None
+
+    def get(self, game_id):
+        """
+        按游戏ID读取历史记录，不存在时返回 None
+        """
+        location = self._load_offsets().get(game_id)
+        if location is None:
+            return None
+        return self.read_at(location)
+
+    def iter_records(self):
+        """
+        按写入顺序遍历所有记录，返回 (位置, 记录)，跳过损坏的行
+        """
+        for segment in self.list_segments():
+            offset = 0
+            with open(os.path.join(self.history_dir, segment), "rb") as f:
+                for line in f:
+                    location = (segment, offset, len(line))
+                    offset += len(line)
+                    try:
+                        yield location, loads_json(line.decode("utf-8"))
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        continue
+
+    def rebuild_index(self, on_record=None):
+        """
+        扫描所有分段日志重建偏移索引，返回记录数。
+        on_record(位置, 记录) 会在扫描每条记录时调用，供其他索引在同一次扫描中重建。
+        """
+        if self._index_fp is not None:
+            self._index_fp.close()
+            self._index_fp = None
+        offsets = {}
+        record_count = 0
+        tmp_file = self.index_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for location, game_data in self.iter_records():
+                game_id = game_data.get("game_id")
+                if game_id is None:
+                    continue
+                segment, offset, length = location
+                f.write(
+                    dumps_json({"g": game_id, "s": segment, "o": offset, "n": length})
+                    + "\n"
+                )
+                offsets[game_id] = location
+                record_count += 1
+                if on_record is not None:
+                    on_record(location, game_data)
+        os.replace(tmp_file, self.index_file)
+        self._offsets = offsets
+        return record_count
+
+    def close(self):
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+        if self._index_fp is not None:
+            self._index_fp.close()
+            self._index_fp = None
@@ -0,0 +1,42 @@
+"""
+群组锁
+
+同一群组的游戏状态修改（开始、biu、结束、签到）必须串行执行，
+每个群组一把 asyncio.Lock，不同群组之间互不阻塞。
+asyncio.Lock 按等待顺序唤醒，突发的 biu 消息会按到达顺序依次处理。
+被追踪的事件会记录等待锁的时间（lock_wait 区段）。
+"""
+
+import asyncio
+from app.scripts.GunRouletteGame.tracing import span
+
+# {group_id: asyncio.Lock}
+_group_locks = {}
+
+
+class GroupLock(asyncio.Lock):
+    """
+    记录等待时间的群组锁
+    """
+
+    def __init__(self, group_id):
+        super().__init__()
+        self.group_id = group_id
+
+    async def acquire(self):
+        if not self.locked():
+            return await super().acquire()
+        with span("lock_wait", group_id=self.group_id):
+            return await super().acquire()
+
+
+def get_group_lock(group_id):
+    """
+    获取群组对应的锁，首次使用时创建
+    """
+    group_id = str(group_id)
+    lock = _group_locks.get(group_id)
+    if lock is None:
+        lock = GroupLock(group_id)
+        _group_locks[group_id] = lock
+    return lock
@@ -12,50 +12,159 @@ sys.path.append(
 )
 
 from app.config import *
-from app.api import send_group_msg, send_private_msg, owner_id
-from app.switch import load_switch, save_switch
+from app.api import send_private_msg, owner_id
 from app.scripts.GunRouletteGame.commands import *
-
-# 数据存储路径，实际开发时，请将GunRouletteGame替换为具体的数据存放路径
-DATA_DIR = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
-    "data",
-    "GunRouletteGame",
+from app.scripts.GunRouletteGame.DataManager import (
+    BASE_DATA_DIR,
+    evict_data_manager,
+    get_loaded_data_managers,
+    is_data_manager_loaded,
+)
+from app.scripts.GunRouletteGame.signin import get_loaded_signin_sequencers, get_utc8_now
+from app.scripts.GunRouletteGame.executor import get_io_stats, run_io
+from app.scripts.GunRouletteGame.fileio import sync_pending_writes
+from app.scripts.GunRouletteGame.locks import get_group_lock
+from app.scripts.GunRouletteGame.outbox import get_outbox_stats, queue_group_msg
+from app.scripts.GunRouletteGame.profiling import (
+    get_profile_settings,
+    profile_command,
+    set_profile_settings,
+)
+from app.scripts.GunRouletteGame.tracing import flush_traces, start_trace
+from app.scripts.GunRouletteGame.sharding import is_shard_worker, route_event
+from app.scripts.GunRouletteGame.expiry import get_expiry_scheduler
+from app.scripts.GunRouletteGame.metrics import (
+    METRICS_FILE,
+    METRICS_PORT,
+    register_gauge,
+    start_metrics_server,
+    write_metrics_file,
+)
+from app.scripts.GunRouletteGame.switch_cache import (
+    get_cached_switch,
+    invalidate_switch,
+    load_function_status,
+    save_function_status,
+)
+from app.scripts.GunRouletteGame.dispatcher import (
+    Command,
+    CommandContext,
+    CommandRegistry,
 )
 
+# 数据存储路径，与 DataManager 保持一致
+DATA_DIR = BASE_DATA_DIR
 
-# 查看功能开关状态
-def load_function_status(group_id):
-    return load_switch(group_id, "GunRouletteGame")
+# Prometheus 指标文件路径，为空时不写入
+METRICS_FILE_PATH = (
+    METRICS_FILE if METRICS_FILE is not None else os.path.join(DATA_DIR, "metrics.prom")
+)
 
+register_gauge(
+    "gun_roulette_active_games",
+    "Groups with a roulette game in progress",
+    lambda: sum(
+        1
+        for data_manager in get_loaded_data_managers()
+        if data_manager.game_status.get("current_game") is not None
+    ),
+)
+register_gauge(
+    "gun_roulette_expiry_scheduled_games",
+    "Running games tracked by the idle expiry scheduler",
+    lambda: len(get_expiry_scheduler()),
+)
+register_gauge(
+    "gun_roulette_loaded_groups",
+    "Groups with a resident DataManager",
+    lambda: len(get_loaded_data_managers()),
+)
+register_gauge(
+    "gun_roulette_io_tasks",
+    "Storage thread pool tasks, by state",
+    lambda: {
+        (state,): value
+        for state, value in get_io_stats().items()
+        if state != "workers"
+    },
+    ("state",),
+)
+register_gauge(
+    "gun_roulette_outbox_pending_messages",
+    "Group replies waiting in the outbox",
+    lambda: sum(stats["pending"] for stats in get_outbox_stats().values()),
+)
 
-# 保存功能开关状态
-def save_function_status(group_id, status):
-    save_switch(group_id, "GunRouletteGame", status)
+# 分片工作进程不启动指标接口，避免多个进程监听同一端口
+if METRICS_PORT and not is_shard_worker():
+    try:
+        start_metrics_server()
+    except OSError as e:
+        logging.error(f"启动 GunRouletteGame 指标接口失败: {e}")
 
 
 # 处理开关状态
 async def toggle_function_status(websocket, group_id, message_id, authorized_user_flag):
     """切换指定群组的功能开关状态"""
     if not authorized_user_flag:  # 使用传入的标志
-        await send_group_msg(
+        await queue_group_msg(
             websocket,
             group_id,
             f"[CQ:reply,id={message_id}]抱歉，您没有权限操作 GunRouletteGame 功能开关。",
         )
         return
 
-    current_status = load_function_status(group_id)
+    # 切换前重新读取开关文件，以文件中的状态为准
+    invalidate_switch(group_id)
+    current_status = await run_io(load_function_status, group_id)
     new_status = not current_status
-    save_function_status(group_id, new_status)
+    await run_io(save_function_status, group_id, new_status)
     status_text = "开启" if new_status else "关闭"
-    await send_group_msg(
+    await queue_group_msg(
         websocket,
         group_id,
         f"[CQ:reply,id={message_id}]轮盘游戏功能已{status_text}，发送 `轮盘菜单` 查看功能菜单玩法。",
     )
 
 
+# 将到达写回间隔的群组脏数据落盘
+async def flush_due_groups():
+    """在群组锁内、存储线程池中写回到期的群组数据"""
+    # 先写入各群组待写入的签到记录（连同积分一起提交），并为常驻的群组提前加载当天的
+    # 签到记录，避免签到高峰时读取文件；已因闲置移除的群组不提前加载，以免重新载入
+    today_date_str = get_utc8_now().strftime("%Y-%m-%d")
+    for sequencer in get_loaded_signin_sequencers():
+        if sequencer.has_pending() or (
+            not sequencer.is_ready(today_date_str)
+            and is_data_manager_loaded(sequencer.group_id)
+        ):
+            async with get_group_lock(sequencer.group_id):
+                await run_io(sequencer.persist)
+                await run_io(sequencer.load_day, today_date_str)
+    for data_manager in get_loaded_data_managers():
+        if data_manager.is_flush_due():
+            async with get_group_lock(data_manager.group_id):
+                await run_io(data_manager.flush_if_due)
+    # 写回并移除闲置的群组，释放玩家缓存和打开的文件，下次访问时重新加载
+    for data_manager in get_loaded_data_managers():
+        if data_manager.is_idle():
+            async with get_group_lock(data_manager.group_id):
+                await run_io(evict_data_manager, data_manager.group_id)
+    # 同步签到、历史日志等不经过写回的文件
+    await run_io(sync_pending_writes)
+    # 导出运行指标
+    if METRICS_FILE_PATH:
+        try:
+            await run_io(write_metrics_file, METRICS_FILE_PATH)
+        except OSError as e:
+            logging.error(f"写入指标文件 {METRICS_FILE_PATH} 失败: {e}")
+    # 写入追踪区段
+    try:
+        await run_io(flush_traces)
+    except OSError as e:
+        logging.error(f"写入追踪区段失败: {e}")
+
+
 BAN_GROUP_ID = ["1234567890", "1046961227"]
 
 
@@ -63,119 +172,177 @@ def is_ban_group(group_id):
     return group_id in BAN_GROUP_ID
 
 
-# 群消息处理函数
-async def handle_group_message(websocket, msg):
-    """处理群消息"""
-    # 确保数据目录存在
-    os.makedirs(DATA_DIR, exist_ok=True)
-    try:
-        user_id = str(msg.get("user_id"))
-        group_id = str(msg.get("group_id"))
-        raw_message = str(msg.get("raw_message", "")).strip()
-        message_id = str(msg.get("message_id"))
-        role = str(msg.get("sender", {}).get("role", ""))
-        is_authorized_user = user_id in owner_id or role in ["admin", "owner"]
+# 以下为命令表中各命令的处理函数，参数由 CommandContext 提供
+async def _command_toggle(websocket, context):
+    # toggle_function_status 内部已经有权限判断
+    await toggle_function_status(
+        websocket, context.group_id, context.message_id, context.is_authorized_user
+    )
 
-        # 处理开关命令 (grg)
-        if raw_message.lower() == "grg":
-            # toggle_function_status 内部已经有权限判断，但这里提前判断也可以
-            # 为了统一，toggle_function_status 也应该接收 is_authorized_user
-            await toggle_function_status(
-                websocket, group_id, message_id, is_authorized_user
-            )
-            return
 
-        # 检查功能是否开启
-        if not load_function_status(group_id):
-            return
+async def _command_menu(websocket, context):
+    await handle_roulette_menu(websocket, context.group_id, context.message_id)
 
-        # 功能已开启，处理游戏相关命令
-        if raw_message.lower() == "轮盘菜单":
-            if is_ban_group(group_id):
-                await send_group_msg(
-                    websocket,
-                    group_id,
-                    f"[CQ:reply,id={message_id}]抱歉，该群组已禁止使用轮盘游戏功能，请前往1042934535专用群。",
-                )
-                return
-            await handle_roulette_menu(websocket, group_id, message_id)
-            return
 
-        if raw_message.startswith("开始轮盘"):
-            if is_ban_group(group_id):
-                await send_group_msg(
-                    websocket,
-                    group_id,
-                    f"[CQ:reply,id={message_id}]抱歉，该群组已禁止使用轮盘游戏功能，请前往1042934535专用群。",
-                )
-                return
-            await handle_start_roulette_game(
-                websocket, group_id, user_id, raw_message, message_id
-            )
-            return
+async def _command_start_game(websocket, context):
+    await handle_start_roulette_game(
+        websocket, context.group_id, context.user_id, context.args, context.message_id
+    )
 
-        if raw_message.startswith("biu"):
-            if is_ban_group(group_id):
-                await send_group_msg(
-                    websocket,
-                    group_id,
-                    f"[CQ:reply,id={message_id}]抱歉，该群组已禁止使用轮盘游戏功能，请前往1042934535专用群。",
-                )
-                return
-            await handle_player_shoot(
-                websocket, group_id, user_id, raw_message, message_id
-            )
-            return
 
-        if raw_message == "轮盘排行":
-            if is_ban_group(group_id):
-                await send_group_msg(
-                    websocket,
-                    group_id,
-                    f"[CQ:reply,id={message_id}]抱歉，该群组已禁止使用轮盘游戏功能，请前往1042934535专用群。",
-                )
-                return
-            await handle_roulette_rank(websocket, group_id, message_id)
-            return
+async def _command_shoot(websocket, context):
+    await handle_player_shoot(
+        websocket, context.group_id, context.user_id, context.args, context.message_id
+    )
+
+
+async def _command_rank(websocket, context):
+    await handle_roulette_rank(websocket, context.group_id, context.message_id)
+
+
+async def _command_my_roulette(websocket, context):
+    await handle_my_roulette(
+        websocket, context.group_id, context.user_id, context.message_id
+    )
+
+
+async def _command_end_game(websocket, context):
+    if context.is_authorized_user:
+        await handle_admin_end_game(websocket, context.group_id, context.message_id)
+    else:
+        await queue_group_msg(
+            websocket,
+            context.group_id,
+            f"[CQ:reply,id={context.message_id}]抱歉，您没有权限结束当前轮盘游戏。",
+        )
+
 
-        if raw_message == "我的轮盘":
-            if is_ban_group(group_id):
-                await send_group_msg(
+async def _command_profile(websocket, context):
+    """轮盘性能分析 [比例|关闭] [内存]，仅机器人管理员可用"""
+    reply = f"[CQ:reply,id={context.message_id}]"
+    if context.user_id not in owner_id:
+        await queue_group_msg(
+            websocket, context.group_id, f"{reply}抱歉，只有机器人管理员可以设置性能分析。"
+        )
+        return
+    parts = context.args.split()
+    if parts:
+        if parts[0] in ("关闭", "off", "0"):
+            set_profile_settings(0)
+        else:
+            try:
+                sample_rate = float(parts[0])
+            except ValueError:
+                await queue_group_msg(
                     websocket,
-                    group_id,
-                    f"[CQ:reply,id={message_id}]抱歉，该群组已禁止使用轮盘游戏功能，请前往1042934535专用群。",
+                    context.group_id,
+                    f"{reply}用法：轮盘性能分析 [0~1 之间的抽样比例|关闭] [内存]",
                 )
                 return
-            await handle_my_roulette(websocket, group_id, user_id, message_id)
-            return
+            set_profile_settings(sample_rate, trace_memory="内存" in parts[1:])
+    sample_rate, trace_memory = get_profile_settings()
+    status = (
+        f"抽样比例 {sample_rate:g}{'，记录内存分配' if trace_memory else ''}"
+        if sample_rate > 0
+        else "已关闭"
+    )
+    await queue_group_msg(
+        websocket, context.group_id, f"{reply}轮盘性能分析：{status}"
+    )
 
-        if raw_message == "结束轮盘":
-            if is_authorized_user:
-                await handle_admin_end_game(websocket, group_id, message_id)
-            else:
-                await send_group_msg(
-                    websocket,
-                    group_id,
-                    f"[CQ:reply,id={message_id}]抱歉，您没有权限结束当前轮盘游戏。",
-                )
+
+async def _command_signin(websocket, context):
+    await handle_roulette_signin(
+        websocket, context.group_id, context.user_id, context.message_id
+    )
+
+
+# 群消息命令表
+COMMAND_REGISTRY = CommandRegistry()
+for _command in (
+    # 开关命令在功能关闭时也需要响应
+    Command(
+        "grg",
+        "grg",
+        _command_toggle,
+        ignore_case=True,
+        check_ban=False,
+        require_enabled=False,
+    ),
+    Command("轮盘菜单", "轮盘菜单", _command_menu, ignore_case=True),
+    Command("开始轮盘", "开始轮盘", _command_start_game, prefix=True),
+    Command("biu", "biu", _command_shoot, prefix=True),
+    Command("轮盘排行", "轮盘排行", _command_rank),
+    Command("我的轮盘", "我的轮盘", _command_my_roulette),
+    Command("结束轮盘", "结束轮盘", _command_end_game, check_ban=False),
+    Command("轮盘签到", "轮盘签到", _command_signin, ignore_case=True),
+    Command(
+        "轮盘性能分析",
+        "轮盘性能分析",
+        _command_profile,
+        prefix=True,
+        check_ban=False,
+        require_enabled=False,
+    ),
+):
+    COMMAND_REGISTRY.register(_command)
+
+
+def get_command_stats():
+    """获取各命令的分发次数和耗时统计"""
+    return COMMAND_REGISTRY.get_stats()
+
+
+# 群消息处理函数
+async def handle_group_message(websocket, msg):
+    """处理群消息"""
+    try:
+        raw_message = str(msg.get("raw_message", "")).strip()
+        # 不是命令的消息直接返回，不访问任何文件
+        matched = COMMAND_REGISTRY.match(raw_message)
+        if matched is None:
             return
+        command, args = matched
 
-        if raw_message.lower() == "轮盘签到":
-            if is_ban_group(group_id):
-                await send_group_msg(
+        user_id = str(msg.get("user_id"))
+        group_id = str(msg.get("group_id"))
+        message_id = str(msg.get("message_id"))
+        role = str(msg.get("sender", {}).get("role", ""))
+        is_authorized_user = user_id in owner_id or role in ["admin", "owner"]
+
+        with start_trace(
+            "handle_group_message", command=command.name, group_id=group_id
+        ):
+            # 检查功能是否开启，开关状态已缓存时不访问文件
+            if command.require_enabled:
+                enabled = get_cached_switch(group_id)
+                if enabled is None:
+                    enabled = await run_io(load_function_status, group_id)
+                if not enabled:
+                    return
+
+            if command.check_ban and is_ban_group(group_id):
+                await queue_group_msg(
                     websocket,
                     group_id,
                     f"[CQ:reply,id={message_id}]抱歉，该群组已禁止使用轮盘游戏功能，请前往1042934535专用群。",
                 )
                 return
-            await handle_roulette_signin(websocket, group_id, user_id, message_id)
-            return
+
+            context = CommandContext(
+                group_id, user_id, message_id, raw_message, args, is_authorized_user
+            )
+            await profile_command(
+                command.name,
+                group_id,
+                lambda: COMMAND_REGISTRY.run(command, websocket, context),
+            )
 
     except Exception as e:
         logging.error(f"处理GunRouletteGame群消息失败: {e}")
-        await send_group_msg(
+        await queue_group_msg(
             websocket,
-            group_id,
+            msg.get("group_id"),
             "处理GunRouletteGame群消息失败，错误信息：" + str(e),
         )
         return
@@ -184,7 +351,6 @@ async def handle_group_message(websocket, msg):
 # 私聊消息处理函数
 async def handle_private_message(websocket, msg):
     """处理私聊消息"""
-    os.makedirs(DATA_DIR, exist_ok=True)
     try:
         user_id = str(msg.get("user_id"))
         raw_message = str(msg.get("raw_message"))
@@ -203,8 +369,6 @@ async def handle_private_message(websocket, msg):
 # 群通知处理函数
 async def handle_group_notice(websocket, msg):
     """处理群通知"""
-    # 确保数据目录存在
-    os.makedirs(DATA_DIR, exist_ok=True)
     try:
         user_id = str(msg.get("user_id"))
         group_id = str(msg.get("group_id"))
@@ -213,7 +377,7 @@ async def handle_group_notice(websocket, msg):
 
     except Exception as e:
         logging.error(f"处理GunRouletteGame群通知失败: {e}")
-        await send_group_msg(
+        await queue_group_msg(
             websocket,
             group_id,
             "处理GunRouletteGame群通知失败，错误信息：" + str(e),
@@ -231,7 +395,7 @@ async def handle_response(websocket, msg):
             pass
     except Exception as e:
         logging.error(f"处理GunRouletteGame回调事件失败: {e}")
-        await send_group_msg(
+        await queue_group_msg(
             websocket,
             msg.get("group_id"),
             f"处理GunRouletteGame回调事件失败，错误信息：{str(e)}",
@@ -262,11 +426,18 @@ async def handle_events(websocket, msg):
             await handle_response(websocket, msg)
             return
 
+        # 分片模式下群消息和心跳交给工作进程处理
+        if route_event(websocket, msg):
+            return
+
         post_type = msg.get("post_type")
 
         # 处理元事件，每次心跳时触发，用于一些定时任务
         if post_type == "meta_event":
-            pass
+            # 结算闲置超时的游戏，结算结果随后一并写回
+            await handle_idle_game_expiry(websocket)
+            # 定时写回各群组内存中的脏数据
+            await flush_due_groups()
 
         # 处理消息事件，用于处理群消息和私聊消息
         elif post_type == "message":
@@ -298,7 +469,7 @@ async def handle_events(websocket, msg):
         if post_type == "message":
             message_type = msg.get("message_type")
             if message_type == "group":
-                await send_group_msg(
+                await queue_group_msg(
                     websocket,
                     msg.get("group_id"),
                     f"处理GunRouletteGame{error_type}事件失败，错误信息：{str(e)}",
@@ -0,0 +1,321 @@
+"""
+运行指标
+
+进程内维护计数器和延迟直方图，按 Prometheus 文本格式导出：
+- gun_roulette_commands_total{command,status}           各命令处理次数
+- gun_roulette_command_duration_seconds{command}        各命令处理耗时
+- gun_roulette_storage_io_seconds{operation}            状态文件读写耗时（次数见 _count）
+- gun_roulette_games_ended_total{outcome}               已结束的游戏局数
+- gun_roulette_active_games 等                          心跳时由回调计算的当前值
+
+导出方式：
+- 每次心跳写入 Prometheus 文本文件（默认 data/GunRouletteGame/metrics.prom，
+  可用环境变量 GUN_ROULETTE_METRICS_FILE 指定，设为空字符串关闭），
+  供 node_exporter 的 textfile collector 采集
+- 设置环境变量 GUN_ROULETTE_METRICS_PORT 时，在 127.0.0.1 上提供 /metrics HTTP 接口
+"""
+
+import os
+import time
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.scripts.GunRouletteGame.tracing import span
+
+# 延迟直方图的桶上界（秒）
+DEFAULT_LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+# 指标文件路径，None 表示使用数据目录下的 metrics.prom
+METRICS_FILE = os.environ.get("GUN_ROULETTE_METRICS_FILE")
+# HTTP 接口端口，为空时不启动
+METRICS_PORT = os.environ.get("GUN_ROULETTE_METRICS_PORT", "")
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs)
+        + "}"
+    )
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    按标签区分的计数器
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # {labelvalues: value}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram:
+    """
+    按标签区分的直方图，观测值按桶上界累计
+    """
+
+    def __init__(
+        self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # {labelvalues: [各桶计数..., 总数, 总和]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = [0] * (len(self.buckets) + 2)
+                series[-1] = 0.0
+                self._series[labelvalues] = series
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def count(self, *labelvalues):
+        series = self._series.get(labelvalues)
+        return series[-2] if series else 0
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for labelvalues, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames, labelvalues, ("le", _format_value(bound))
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues, ("le", "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {series[-2]}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_count{labels} {series[-2]}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class Gauge:
+    """
+    导出时通过回调计算当前值的指标，回调返回数值或 {标签值元组: 数值}
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+        ]
+        try:
+            value = self.callback()
+        except Exception as e:
+            logging.error(f"计算指标 {self.name} 失败: {e}")
+            return lines
+        values = value if isinstance(value, dict) else {(): value}
+        for labelvalues, labelled_value in sorted(values.items()):
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(labelled_value)}"
+            )
+        return lines
+
+
+_metrics = []  # 按注册顺序排列的指标
+_gauges = {}  # {name: Gauge}，同名回调指标只保留最后注册的一个
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_gauge(name, documentation, callback, labelnames=()):
+    """
+    注册回调指标，重复注册同名指标时替换回调
+    """
+    gauge = Gauge(name, documentation, callback, labelnames)
+    if name in _gauges:
+        _metrics[_metrics.index(_gauges[name])] = gauge
+    else:
+        _metrics.append(gauge)
+    _gauges[name] = gauge
+    return gauge
+
+
+COMMANDS_TOTAL = _register(
+    Counter(
+        "gun_roulette_commands_total",
+        "Group commands handled, by command and status",
+        ("command", "status"),
+    )
+)
+COMMAND_DURATION = _register(
+    Histogram(
+        "gun_roulette_command_duration_seconds",
+        "Group command handling latency",
+        ("command",),
+    )
+)
+STORAGE_IO_DURATION = _register(
+    Histogram(
+        "gun_roulette_storage_io_seconds",
+        "State file read/write/append/fsync latency",
+        ("operation",),
+    )
+)
+GAMES_ENDED_TOTAL = _register(
+    Counter(
+        "gun_roulette_games_ended_total",
+        "Roulette games ended, by outcome",
+        ("outcome",),
+    )
+)
+
+
+class StorageTimer:
+    """
+    记录一次状态文件操作的耗时，被追踪的事件同时记录 storage.<操作> 区段：
+
+        with StorageTimer("read"):
+            ...
+    """
+
+    __slots__ = ("operation", "_started", "_span")
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def __enter__(self):
+        self._span = span("storage." + self.operation)
+        self._span.__enter__()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        STORAGE_IO_DURATION.observe(
+            time.perf_counter() - self._started, self.operation
+        )
+        self._span.__exit__(exc_type, exc, traceback)
+        return False
+
+
+def render_metrics():
+    """
+    以 Prometheus 文本格式导出所有指标
+    """
+    lines = []
+    for metric in list(_metrics):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path):
+    """
+    原子写入 Prometheus 文本文件
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_metrics())
+    os.replace(tmp_path, path)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # 不输出访问日志
+
+
+_http_server = None
+
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """
+    在后台线程中启动 /metrics HTTP 接口，已启动时直接返回
+    """
+    global _http_server
+    if _http_server is not None:
+        return _http_server
+    port = int(port if port is not None else METRICS_PORT)
+    _http_server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(
+        target=_http_server.serve_forever,
+        name="GunRouletteGameMetrics",
+        daemon=True,
+    ).start()
+    logging.info(f"GunRouletteGame 指标接口已启动: http://{host}:{port}/metrics")
+    return _http_server
@@ -0,0 +1,254 @@
+"""
+群消息发送队列
+
+命令处理函数不直接调用 send_group_msg，而是通过 queue_group_msg 放入所在群组的发送队列：
+- 合并：同一群组在 OUTBOX_COALESCE_SECONDS 内产生的同优先级消息合并为一条发送，
+  合并后的消息不超过 OUTBOX_MAX_MESSAGE_CHARS 个字符，只保留第一条的回复引用
+- 限速：每个群组按令牌桶限制每秒发送的消息数，允许 OUTBOX_BURST 条的突发
+- 优先级：游戏结果优先于普通提示，菜单、排行榜等查询结果最后发送
+- 背压：每个群组最多 OUTBOX_MAX_PENDING 条待发送消息，队列已满时调用方等待，不丢弃消息
+
+实际发送由 set_sender 设置的异步函数 sender(websocket, group_id, message) 完成，
+默认为 app.api.send_group_msg。被追踪的事件的消息发送时记录 send_group_msg 区段，
+合并发送时记在第一条被追踪的消息所属的追踪中，其余追踪的 trace_id 记入 linked_traces。
+"""
+
+import os
+import re
+import heapq
+import asyncio
+import logging
+import itertools
+from app.api import send_group_msg
+from app.scripts.GunRouletteGame.tracing import (
+    current_trace_ref,
+    detach_trace,
+    span_from_ref,
+)
+
+# 消息优先级，数值越小越先发送
+PRIORITY_RESULT = 0  # 游戏开始、biu、结算、签到结果
+PRIORITY_NORMAL = 1  # 错误和其他提示
+PRIORITY_QUERY = 2  # 菜单、排行榜、个人信息
+
+# 合并窗口（秒）
+OUTBOX_COALESCE_SECONDS = float(
+    os.environ.get("GUN_ROULETTE_OUTBOX_COALESCE_SECONDS", "0.2")
+)
+# 每个群组每秒最多发送的消息数
+OUTBOX_MESSAGES_PER_SECOND = float(
+    os.environ.get("GUN_ROULETTE_OUTBOX_MESSAGES_PER_SECOND", "1")
+)
+# 令牌桶容量，即允许连续发送的消息数
+OUTBOX_BURST = int(os.environ.get("GUN_ROULETTE_OUTBOX_BURST", "3"))
+# 每个群组最多待发送的消息数，超出后调用方等待
+OUTBOX_MAX_PENDING = int(os.environ.get("GUN_ROULETTE_OUTBOX_MAX_PENDING", "100"))
+# 合并后单条消息的最大字符数
+OUTBOX_MAX_MESSAGE_CHARS = 1500
+# 合并消息之间的分隔
+OUTBOX_MESSAGE_SEPARATOR = "\n\n"
+
+_REPLY_PREFIX_PATTERN = re.compile(r"^\[CQ:reply,id=[^\]]*\]\s*")
+
+_sender = send_group_msg
+_outboxes = {}  # {group_id: GroupOutbox}
+_sequence = itertools.count()
+
+
+def set_sender(sender):
+    """
+    设置实际发送消息的异步函数 sender(websocket, group_id, message)
+    """
+    global _sender
+    _sender = sender
+
+
+def get_sender():
+    return _sender
+
+
+class GroupOutbox:
+    """
+    单个群组的发送队列，由一个发送任务按优先级取出、合并、限速发送。
+    """
+
+    def __init__(self, group_id):
+        self.group_id = group_id
+        # [(priority, sequence, websocket, message, 入队时间, 追踪引用)]
+        self._heap = []
+        self._slots = asyncio.Semaphore(OUTBOX_MAX_PENDING)
+        self._task = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tokens = float(OUTBOX_BURST)
+        self._last_refill = None
+        self.sent_count = 0
+        self.merged_count = 0
+
+    def pending_count(self):
+        return len(self._heap)
+
+    async def put(self, websocket, message, priority):
+        # 队列已满时在此等待发送任务腾出位置
+        await self._slots.acquire()
+        heapq.heappush(
+            self._heap,
+            (
+                priority,
+                next(_sequence),
+                websocket,
+                message,
+                asyncio.get_running_loop().time(),
+                current_trace_ref(),
+            ),
+        )
+        self._idle.clear()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _wait_for_token(self):
+        loop = asyncio.get_running_loop()
+        if OUTBOX_MESSAGES_PER_SECOND <= 0:
+            return
+        while True:
+            now = loop.time()
+            if self._last_refill is not None:
+                self._tokens = min(
+                    float(OUTBOX_BURST),
+                    self._tokens
+                    + (now - self._last_refill) * OUTBOX_MESSAGES_PER_SECOND,
+                )
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / OUTBOX_MESSAGES_PER_SECOND)
+
+    def _take_batch(self):
+        """
+        取出最高优先级的消息，并合并其后同优先级、同连接的消息
+        """
+        priority, _, websocket, message, enqueue_time, trace_ref = heapq.heappop(
+            self._heap
+        )
+        trace_refs = [trace_ref] if trace_ref is not None else []
+        parts = [message]
+        length = len(message)
+        taken = 1
+        while self._heap:
+            next_priority, _, next_websocket, next_message, _, next_trace_ref = (
+                self._heap[0]
+            )
+            if next_priority != priority or next_websocket is not websocket:
+                break
+            next_message = _REPLY_PREFIX_PATTERN.sub("", next_message)
+            added_length = len(OUTBOX_MESSAGE_SEPARATOR) + len(next_message)
+            if length + added_length > OUTBOX_MAX_MESSAGE_CHARS:
+                break
+            heapq.heappop(self._heap)
+            parts.append(next_message)
+            length += added_length
+            taken += 1
+            if next_trace_ref is not None:
+                trace_refs.append(next_trace_ref)
+        if taken > 1:
+            message = OUTBOX_MESSAGE_SEPARATOR.join(
+                part.rstrip("\n") for part in parts
+            )
+        return websocket, message, taken, enqueue_time, trace_refs
+
+    async def _run(self):
+        # 发送任务由第一条消息的入队者创建，不继承其追踪
+        detach_trace()
+        try:
+            loop = asyncio.get_running_loop()
+            while self._heap:
+                # 最先发送的消息入队不足一个合并窗口时，等待窗口内的其他消息；
+                # 积压时消息早已超过窗口，直接发送
+                coalesce_delay = (
+                    self._heap[0][4] + OUTBOX_COALESCE_SECONDS - loop.time()
+                )
+                if coalesce_delay > 0:
+                    await asyncio.sleep(coalesce_delay)
+                await self._wait_for_token()
+                websocket, message, taken, enqueue_time, trace_refs = (
+                    self._take_batch()
+                )
+                try:
+                    with _send_span(trace_refs, self.group_id, taken, enqueue_time):
+                        await _sender(websocket, self.group_id, message)
+                except Exception as e:
+                    logging.error(
+                        f"发送群 {self.group_id} 的消息失败: {e}", exc_info=True
+                    )
+                finally:
+                    for _ in range(taken):
+                        self._slots.release()
+                self.sent_count += 1
+                self.merged_count += taken - 1
+        finally:
+            if not self._heap:
+                self._idle.set()
+
+    async def drain(self):
+        """
+        等待队列中的消息全部发送
+        """
+        await self._idle.wait()
+
+
+def _send_span(trace_refs, group_id, taken, enqueue_time):
+    """
+    发送区段记在第一条被追踪的消息所属的追踪中，合并的其他追踪记为 linked_traces
+    """
+    if not trace_refs:
+        return span_from_ref(None, "send_group_msg")
+    attrs = {
+        "group_id": group_id,
+        "merged": taken,
+        "queued_ms": round(
+            (asyncio.get_running_loop().time() - enqueue_time) * 1000, 3
+        ),
+    }
+    linked_traces = list(dict.fromkeys(trace_id for trace_id, _ in trace_refs))[1:]
+    if linked_traces:
+        attrs["linked_traces"] = linked_traces
+    return span_from_ref(trace_refs[0], "send_group_msg", **attrs)
+
+
+def get_outbox(group_id):
+    group_id = str(group_id)
+    outbox = _outboxes.get(group_id)
+    if outbox is None:
+        outbox = GroupOutbox(group_id)
+        _outboxes[group_id] = outbox
+    return outbox
+
+
+async def queue_group_msg(websocket, group_id, message, priority=PRIORITY_NORMAL):
+    """
+    将群消息放入发送队列，队列已满时等待
+    """
+    await get_outbox(group_id).put(websocket, message, priority)
+
+
+async def drain_outboxes():
+    """
+    等待所有群组的发送队列清空
+    """
+    for outbox in list(_outboxes.values()):
+        await outbox.drain()
+
+
+def get_outbox_stats():
+    """
+    获取各群组发送队列状态 {group_id: {pending, sent, merged}}
+    """
+    return {
+        group_id: {
+            "pending": outbox.pending_count(),
+            "sent": outbox.sent_count,
+            "merged": outbox.merged_count,
+        }
+        for group_id, outbox in _outboxes.items()
+    }
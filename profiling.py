@@ -0,0 +1,229 @@
+"""
+事件性能分析
+
+按比例抽样群命令，在 cProfile（可选 tracemalloc）下执行，并把结果写入数据目录旁的
+GunRouletteGame_profiles 目录（可用环境变量 GUN_ROULETTE_PROFILE_DIR 指定），不放在
+数据目录中，以免被当作群组目录：
+PROFILE_DIR/时间-命令-群号.prof   pstats 格式，可用 python -m pstats 或 snakeviz 查看
+PROFILE_DIR/时间-命令-群号.txt    累计耗时前 PROFILE_TOP_FUNCTIONS 的函数和内存分配位置
+
+事件循环线程和通过 run_io 进入存储线程池的调用分别采样，合并到同一份结果中。
+结果在命令结束后交给存储线程池写入，不阻塞事件循环，也不计入命令的耗时。
+抽样比例由环境变量 GUN_ROULETTE_PROFILE_RATE（0~1）设定，也可由机器人管理员发送
+“轮盘性能分析 比例 [内存]”调整，发送“轮盘性能分析 关闭”关闭。
+GUN_ROULETTE_PROFILE_MEMORY=1 时同时用 tracemalloc 记录内存分配。
+关闭时每个命令只多一次浮点数比较。
+"""
+
+import os
+import io
+import time
+import asyncio
+import random
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+import contextvars
+from app.scripts.GunRouletteGame.DataManager import BASE_DATA_DIR
+from app.scripts.GunRouletteGame.tracing import detach_trace
+
+# 性能分析结果目录，默认为与数据目录同级的 GunRouletteGame_profiles
+PROFILE_DIR = os.environ.get("GUN_ROULETTE_PROFILE_DIR") or (
+    os.path.normpath(BASE_DATA_DIR) + "_profiles"
+)
+# 文本摘要中列出的函数数和内存分配位置数
+PROFILE_TOP_FUNCTIONS = 30
+PROFILE_TOP_ALLOCATIONS = 20
+
+_sample_rate = float(os.environ.get("GUN_ROULETTE_PROFILE_RATE", "0") or 0)
+_trace_memory = os.environ.get("GUN_ROULETTE_PROFILE_MEMORY", "") == "1"
+# 同一时间只分析一个事件：cProfile 同一线程只能启用一个分析器，也避免结果相互混杂
+_profiling_lock = threading.Lock()
+_current_profile = contextvars.ContextVar("gun_roulette_event_profile", default=None)
+# 正在后台写入的分析结果，保留任务引用直到写入完成
+_write_tasks = set()
+
+
+def get_profile_settings():
+    """
+    获取当前抽样比例和是否记录内存分配
+    """
+    return _sample_rate, _trace_memory
+
+
+def set_profile_settings(sample_rate, trace_memory=False):
+    """
+    设置抽样比例（0 表示关闭）和是否记录内存分配
+    """
+    global _sample_rate, _trace_memory
+    _sample_rate = min(1.0, max(0.0, float(sample_rate)))
+    _trace_memory = bool(trace_memory)
+
+
+class EventProfile:
+    """
+    一次被抽样事件的分析数据
+    """
+
+    def __init__(self, command_name, group_id):
+        self.command_name = command_name
+        self.group_id = group_id
+        self.loop_profiler = cProfile.Profile()
+        self._io_profilers = []
+        self._io_lock = threading.Lock()
+
+    def wrap_io_call(self, call):
+        """
+        包装提交到存储线程池的调用，在工作线程中单独分析
+        """
+
+        def profiled_call():
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(call)
+            finally:
+                with self._io_lock:
+                    self._io_profilers.append(profiler)
+
+        return profiled_call
+
+    def stats(self):
+        stats = pstats.Stats(self.loop_profiler)
+        with self._io_lock:
+            for profiler in self._io_profilers:
+                stats.add(profiler)
+        return stats
+
+
+def current_event_profile():
+    """
+    获取当前事件的分析数据，未被抽样时返回 None
+    """
+    return _current_profile.get()
+
+
+def _safe_filename_part(value):
+    return "".join(ch if ch.isalnum() else "_" for ch in str(value))
+
+
+def _write_profile(profile, elapsed, memory_snapshots):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base_name = os.path.join(
+        PROFILE_DIR,
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-"
+        f"{_safe_filename_part(profile.command_name)}-{_safe_filename_part(profile.group_id)}",
+    )
+    stats = profile.stats()
+    stats.dump_stats(base_name + ".prof")
+
+    summary = io.StringIO()
+    summary.write(
+        f"命令: {profile.command_name}  群: {profile.group_id}  耗时: {elapsed * 1000:.2f}ms\n\n"
+    )
+    stats.stream = summary
+    stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+    if memory_snapshots is not None:
+        before, after = memory_snapshots
+        summary.write("\n内存分配位置（事件期间新增，按大小排序）:\n")
+        for stat in after.compare_to(before, "lineno")[:PROFILE_TOP_ALLOCATIONS]:
+            summary.write(f"{stat}\n")
+    with open(base_name + ".txt", "w", encoding="utf-8") as f:
+        f.write(summary.getvalue())
+
+
+async def _write_profile_in_background(profile, elapsed, memory_snapshots):
+    """
+    在存储线程池中汇总并写入分析结果，写入完成后才允许抽样下一个事件
+    """
+    # executor 在提交调用时引用本模块，在这里再导入，避免循环导入
+    from app.scripts.GunRouletteGame.executor import run_io
+
+    detach_trace()
+    try:
+        await run_io(_write_profile, profile, elapsed, memory_snapshots)
+    except Exception as e:
+        logging.error(f"写入性能分析结果失败: {e}", exc_info=True)
+    finally:
+        _profiling_lock.release()
+
+
+async def profile_command(command_name, group_id, run):
+    """
+    按抽样比例在分析器下执行命令协程函数 run()，未被抽样时直接执行
+    """
+    if _sample_rate <= 0 or random.random() >= _sample_rate:
+        return await run()
+    if not _profiling_lock.acquire(blocking=False):
+        return await run()
+
+    profile = EventProfile(command_name, group_id)
+    token = _current_profile.set(profile)
+    trace_memory = _trace_memory and not tracemalloc.is_tracing()
+    memory_before = None
+    if trace_memory:
+        tracemalloc.start()
+        memory_before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    try:
+        # 事件循环线程中的执行只在本事件的步骤之间启用，await 期间停用，
+        # 避免把其他群组的处理计入本事件
+        return await _run_with_loop_profiler(profile.loop_profiler, run)
+    finally:
+        elapsed = time.perf_counter() - started
+        memory_snapshots = None
+        if trace_memory:
+            memory_snapshots = (memory_before, tracemalloc.take_snapshot())
+            tracemalloc.stop()
+        # 先恢复上下文，后台写入不会被当作本事件的存储调用再次分析
+        _current_profile.reset(token)
+        try:
+            task = asyncio.ensure_future(
+                _write_profile_in_background(profile, elapsed, memory_snapshots)
+            )
+        except Exception:
+            _profiling_lock.release()
+            raise
+        _write_tasks.add(task)
+        task.add_done_callback(_write_tasks.discard)
+
+
+async def _run_with_loop_profiler(profiler, run):
+    """
+    逐步驱动协程，每一步执行时启用分析器
+    """
+    coroutine = run()
+    send_value = None
+    send_exception = None
+    while True:
+        profiler.enable()
+        try:
+            if send_exception is not None:
+                awaitable = coroutine.throw(send_exception)
+            else:
+                awaitable = coroutine.send(send_value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            profiler.disable()
+        send_value = None
+        send_exception = None
+        try:
+            send_value = await _Yield(awaitable)
+        except BaseException as e:
+            send_exception = e
+
+
+class _Yield:
+    """
+    把协程产出的 future 原样交给事件循环
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __await__(self):
+        return (yield self.value)
@@ -0,0 +1,130 @@
+"""
+排行榜索引
+
+维护群组内所有玩家分数的有序索引，随玩家分数变化增量更新，
+查询前 K 名时无需扫描 player_data 目录。
+"""
+
+import os
+import bisect
+from app.scripts.GunRouletteGame.fileio import atomic_write_data
+from app.scripts.GunRouletteGame.codec import CodecError, decode
+
+# 索引文件格式版本，格式变化时递增以触发重建
+RANK_INDEX_VERSION = 1
+
+
+class RankIndex:
+    """
+    排行榜索引类。
+
+    索引文件内容格式：
+    {
+        "version": 1,
+        "scores": {"user_id": total_score, ...}
+    }
+    内存中额外维护按 (-总得分, 玩家ID) 升序排列的列表，前 K 名即列表前 K 项。
+    """
+
+    def __init__(self, index_file, player_data_dir):
+        self.index_file = index_file
+        self.player_data_dir = player_data_dir
+        self._scores = {}  # {user_id: total_score}
+        self._sorted = []  # [(-total_score, user_id)]
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        """
+        加载索引文件，文件缺失、损坏、版本不符或已过期时从玩家数据重建
+        """
+        if self._is_stale():
+            self.rebuild()
+            return
+        try:
+            with open(self.index_file, "rb") as f:
+                index_data = decode(f.read())
+        except (CodecError, OSError):
+            self.rebuild()
+            return
+        if index_data.get("version") != RANK_INDEX_VERSION:
+            self.rebuild()
+            return
+        self._set_scores(index_data.get("scores", {}))
+
+    def _is_stale(self):
+        """
+        索引文件不存在，或 player_data 目录在索引写入后发生过变化（新增/删除玩家文件）
+        """
+        if not os.path.exists(self.index_file):
+            return True
+        try:
+            index_mtime = os.stat(self.index_file).st_mtime_ns
+            dir_mtime = os.stat(self.player_data_dir).st_mtime_ns
+        except OSError:
+            return True
+        return dir_mtime > index_mtime
+
+    def rebuild(self):
+        """
+        扫描 player_data 目录重建索引
+        """
+        scores = {}
+        for player_file in os.listdir(self.player_data_dir):
+            if not player_file.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.player_data_dir, player_file), "rb") as f:
+                    player_data = decode(f.read())
+                scores[str(player_data["user_id"])] = player_data["total_score"]
+            except (CodecError, KeyError, OSError):
+                continue  # 跳过损坏的玩家文件
+        self._set_scores(scores)
+        self._dirty = True
+        self.save()
+
+    def _set_scores(self, scores):
+        self._scores = dict(scores)
+        self._sorted = sorted((-score, user_id) for user_id, score in scores.items())
+
+    def update(self, user_id, total_score):
+        """
+        更新单个玩家的分数，O(log N) 定位，分数未变化时不做任何操作
+        """
+        user_id = str(user_id)
+        old_score = self._scores.get(user_id)
+        if old_score == total_score:
+            return
+        if old_score is not None:
+            position = bisect.bisect_left(self._sorted, (-old_score, user_id))
+            del self._sorted[position]
+        bisect.insort(self._sorted, (-total_score, user_id))
+        self._scores[user_id] = total_score
+        self._dirty = True
+
+    def top(self, k):
+        """
+        获取分数最高的前 k 名玩家
+        返回列表，每个元素是一个字典，包含玩家ID、总得分
+        """
+        return [
+            {"user_id": user_id, "total_score": -negative_score}
+            for negative_score, user_id in self._sorted[:k]
+        ]
+
+    def save(self):
+        """
+        索引有变化时写入索引文件；没有变化时只更新索引文件的修改时间。
+        玩家文件的原子写入会更新 player_data 目录的修改时间，写入玩家数据后都要调用，
+        否则分数未变的写入也会使下次加载时判断索引已过期而全量重建
+        """
+        if not self._dirty:
+            try:
+                os.utime(self.index_file)
+                return
+            except OSError:
+                pass  # 索引文件不存在，写入一份
+        atomic_write_data(
+            self.index_file, {"version": RANK_INDEX_VERSION, "scores": self._scores}
+        )
+        self._dirty = False
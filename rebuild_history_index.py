@@ -0,0 +1,42 @@
+"""
+重建游戏历史索引
+
+为已有的数据目录重建游戏历史的偏移索引和按玩家、按日期的二级索引，
+JSON 存储后端下同时将旧版每局一个文件的历史记录迁移到分段日志。
+
+用法：python -m app.scripts.GunRouletteGame.rebuild_history_index [群号 ...]
+不指定群号时处理 data/GunRouletteGame 下的所有群组目录，其他目录跳过。
+"""
+
+import os
+import sys
+from app.scripts.GunRouletteGame.DataManager import BASE_DATA_DIR, get_data_manager
+from app.scripts.GunRouletteGame.storage import is_group_data_dir
+
+
+def rebuild_history_indexes(group_ids=None):
+    """
+    重建指定群组（默认全部群组）的游戏历史索引，返回 {group_id: 记录数}
+    """
+    if not group_ids:
+        if not os.path.isdir(BASE_DATA_DIR):
+            return {}
+        group_ids = sorted(
+            name
+            for name in os.listdir(BASE_DATA_DIR)
+            if is_group_data_dir(os.path.join(BASE_DATA_DIR, name))
+        )
+    results = {}
+    for group_id in group_ids:
+        results[group_id] = get_data_manager(group_id).rebuild_history_indexes()
+    return results
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    for group_id, record_count in rebuild_history_indexes(argv).items():
+        print(f"群 {group_id}: 已重建 {record_count} 条游戏历史索引")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+多进程分片
+
+设置环境变量 GUN_ROULETTE_SHARDS=N（N > 0）后，handle_events 把群消息事件按群号的 CRC32
+分配给 N 个工作进程之一，同一群组始终由同一个进程处理，该进程独占这些群组的 DataManager、
+签到和开关缓存等内存状态；心跳事件广播给所有工作进程，各自写回自己的群组。
+
+- 工作进程用 spawn 方式启动，在自己的事件循环中运行同一套 main.handle_events，
+  同一群组的事件按到达顺序依次处理，不同群组并发处理
+- 工作进程的发送队列照常合并、限速，实际发送改为通过管道交回主进程，
+  主进程按群组依次调用 outbox.get_sender() 发送，同一群组的回复保持顺序，不同群组互不等待
+- 每个工作进程的指标写入 metrics-shardN.prom，追踪区段写入追踪目录下的 shardN/
+- 工作进程意外退出时，下一条分配给它的事件会重新启动该进程（未写回的数据会丢失）
+
+未设置或为 0 时不启动工作进程，所有事件在当前进程中处理。
+"""
+
+import os
+import zlib
+import atexit
+import queue
+import asyncio
+import logging
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from app.scripts.GunRouletteGame.outbox import drain_outboxes, get_sender, set_sender
+
+# 工作进程数，0 表示不分片
+SHARD_COUNT = int(os.environ.get("GUN_ROULETTE_SHARDS", "0") or 0)
+# 停止时等待工作进程写回数据并退出的秒数
+SHARD_STOP_TIMEOUT_SECONDS = 30
+
+# 工作进程中为本进程的分片序号，主进程中为 None
+_shard_index = None
+# 工作进程入口，压力测试可替换为先注册框架替身的入口
+_worker_entry = None
+_pool = None
+
+
+def is_shard_worker():
+    """
+    当前进程是否为分片工作进程
+    """
+    return _shard_index is not None
+
+
+def get_shard_index():
+    return _shard_index
+
+
+def shard_for_group(group_id, shard_count=None):
+    """
+    群组所属的分片序号，与进程无关，重启后不变
+    """
+    shard_count = shard_count or SHARD_COUNT
+    return zlib.crc32(str(group_id).encode("utf-8")) % shard_count
+
+
+def set_worker_entry(entry):
+    """
+    替换工作进程入口 entry(shard_index, event_connection, reply_connection)，
+    entry 必须可以被 spawn 方式启动的子进程导入，并最终调用 worker_main
+    """
+    global _worker_entry
+    _worker_entry = entry
+
+
+class _OrderedGroupQueue:
+    """
+    每个群组一个先进先出的任务队列：同一群组的任务依次执行，不同群组的任务互不等待
+    """
+
+    def __init__(self):
+        self._jobs = {}  # {group_id: deque[无参数协程函数]}
+        self._tasks = {}  # {group_id: 执行任务}
+
+    def put(self, group_id, job):
+        jobs = self._jobs.get(group_id)
+        if jobs is None:
+            jobs = deque()
+            self._jobs[group_id] = jobs
+        jobs.append(job)
+        if group_id not in self._tasks:
+            self._tasks[group_id] = asyncio.ensure_future(self._run(group_id, jobs))
+
+    async def _run(self, group_id, jobs):
+        try:
+            while jobs:
+                job = jobs.popleft()
+                try:
+                    await job()
+                except Exception as e:
+                    logging.error(f"处理群 {group_id} 的分片任务失败: {e}", exc_info=True)
+        finally:
+            # 队列为空后移除，期间没有 await，不会漏掉新加入的任务
+            del self._jobs[group_id]
+            del self._tasks[group_id]
+
+    async def drain(self):
+        """
+        等待所有群组的任务执行完
+        """
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+
+class _ShardWorker:
+    """
+    主进程中的一个工作进程句柄：写线程发送事件，读线程接收回复并交给事件循环
+    """
+
+    def __init__(self, index, pool):
+        self.index = index
+        self._pool = pool
+        self._outgoing = queue.SimpleQueue()
+        context = multiprocessing.get_context("spawn")
+        event_reader, self._event_writer = context.Pipe(duplex=False)
+        self._reply_reader, reply_writer = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_worker_entry or worker_main,
+            args=(index, event_reader, reply_writer),
+            name=f"GunRouletteGameShard{index}",
+            daemon=True,
+        )
+        self.process.start()
+        event_reader.close()
+        reply_writer.close()
+        threading.Thread(
+            target=self._write_loop, name=f"{self.process.name}Writer", daemon=True
+        ).start()
+        threading.Thread(
+            target=self._read_loop, name=f"{self.process.name}Reader", daemon=True
+        ).start()
+
+    def send(self, item):
+        self._outgoing.put(item)
+
+    def _write_loop(self):
+        while True:
+            item = self._outgoing.get()
+            try:
+                self._event_writer.send(item)
+            except (OSError, ValueError) as e:
+                logging.error(f"向分片工作进程 {self.index} 发送事件失败: {e}")
+                return
+            if item is None:
+                self._event_writer.close()
+                return
+
+    def _read_loop(self):
+        while True:
+            try:
+                reply = self._reply_reader.recv()
+            except (EOFError, OSError):
+                return
+            self._pool.loop.call_soon_threadsafe(self._pool.on_reply, self.index, reply)
+
+
+class _ShardPool:
+    """
+    主进程中的工作进程集合
+    """
+
+    def __init__(self, shard_count):
+        self.loop = asyncio.get_running_loop()
+        self.shard_count = shard_count
+        self._websockets = {}  # {group_id: 最近一次事件的 websocket}
+        # 最近一次心跳的 websocket，用于重启后尚未收到消息的群组（如闲置游戏自动结束）
+        self._heartbeat_websocket = None
+        self._replies = _OrderedGroupQueue()
+        self._sync_waiters = {}  # {token: future}
+        self._sync_tokens = itertools.count()
+        self.workers = [_ShardWorker(index, self) for index in range(shard_count)]
+
+    def _get_worker(self, index):
+        worker = self.workers[index]
+        if not worker.process.is_alive():
+            logging.error(
+                f"分片工作进程 {index} 已退出（退出码 {worker.process.exitcode}），重新启动"
+            )
+            worker = _ShardWorker(index, self)
+            self.workers[index] = worker
+        return worker
+
+    def send_event(self, websocket, msg):
+        group_id = str(msg.get("group_id"))
+        self._websockets[group_id] = websocket
+        self._get_worker(shard_for_group(group_id, self.shard_count)).send(
+            ("event", msg)
+        )
+
+    def broadcast(self, websocket, msg):
+        self._heartbeat_websocket = websocket
+        for index in range(self.shard_count):
+            self._get_worker(index).send(("event", msg))
+
+    def on_reply(self, index, reply):
+        kind = reply[0]
+        if kind == "send":
+            _, group_id, message = reply
+            websocket = self._websockets.get(group_id, self._heartbeat_websocket)
+            self._replies.put(
+                group_id, lambda: get_sender()(websocket, group_id, message)
+            )
+        elif kind == "synced":
+            waiter = self._sync_waiters.pop(reply[1], None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self):
+        waiters = []
+        for index in range(self.shard_count):
+            token = next(self._sync_tokens)
+            waiter = self.loop.create_future()
+            self._sync_waiters[token] = waiter
+            self._get_worker(index).send(("sync", token))
+            waiters.append(waiter)
+        await asyncio.gather(*waiters)
+        await self._replies.drain()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.send(None)
+        for worker in self.workers:
+            worker.process.join(SHARD_STOP_TIMEOUT_SECONDS)
+            if worker.process.is_alive():
+                logging.error(f"分片工作进程 {worker.index} 未按时退出，强制结束")
+                worker.process.terminate()
+
+
+def route_event(websocket, msg):
+    """
+    分片模式下把群消息事件交给所属的工作进程、把心跳广播给所有工作进程。
+    返回 True 表示事件已转交，调用方不再处理
+    """
+    global _pool
+    if SHARD_COUNT <= 0 or _shard_index is not None:
+        return False
+    post_type = msg.get("post_type")
+    is_group_message = (
+        post_type == "message"
+        and msg.get("message_type") == "group"
+        and msg.get("group_id") is not None
+    )
+    if not is_group_message and post_type != "meta_event":
+        return False
+    if _pool is None:
+        _pool = _ShardPool(SHARD_COUNT)
+        atexit.register(stop_shards)
+    if is_group_message:
+        _pool.send_event(websocket, msg)
+    else:
+        _pool.broadcast(websocket, msg)
+    return True
+
+
+async def drain_shards():
+    """
+    等待已转交的事件全部处理完、回复全部发送
+    """
+    if _pool is not None:
+        await _pool.drain()
+
+
+def stop_shards():
+    """
+    通知工作进程写回数据并退出，等待其结束
+    """
+    global _pool
+    if _pool is not None:
+        pool = _pool
+        _pool = None
+        pool.stop()
+
+
+def worker_main(shard_index, event_connection, reply_connection):
+    """
+    工作进程入口
+    """
+    global _shard_index
+    _shard_index = shard_index
+    asyncio.run(_serve(shard_index, event_connection, reply_connection))
+
+
+def _configure_worker_outputs(shard_index, main):
+    from app.scripts.GunRouletteGame import tracing
+
+    suffix = f"shard{shard_index}"
+    if main.METRICS_FILE_PATH:
+        root, extension = os.path.splitext(main.METRICS_FILE_PATH)
+        main.METRICS_FILE_PATH = f"{root}-{suffix}{extension}"
+    tracing.TRACE_DIR = os.path.join(tracing.get_trace_dir(), suffix)
+
+
+async def _serve(shard_index, event_connection, reply_connection):
+    # 标记为工作进程之后再导入 main，工作进程中不会再次分片，也不启动指标接口
+    from app.scripts.GunRouletteGame import main
+    from app.scripts.GunRouletteGame.executor import shutdown_io_executor
+    from app.scripts.GunRouletteGame.signin import persist_all_signins
+    from app.scripts.GunRouletteGame.DataManager import flush_all_data_managers
+
+    _configure_worker_outputs(shard_index, main)
+    loop = asyncio.get_running_loop()
+    incoming = asyncio.Queue()
+
+    async def send_to_parent(websocket, group_id, message):
+        reply_connection.send(("send", str(group_id), message))
+
+    set_sender(send_to_parent)
+
+    def read_loop():
+        while True:
+            try:
+                item = event_connection.recv()
+            except (EOFError, OSError):
+                item = None
+            loop.call_soon_threadsafe(incoming.put_nowait, item)
+            if item is None:
+                return
+
+    threading.Thread(target=read_loop, name="GunRouletteGameShardReader", daemon=True).start()
+
+    groups = _OrderedGroupQueue()
+    while True:
+        item = await incoming.get()
+        if item is None:
+            break
+        kind = item[0]
+        if kind == "event":
+            msg = item[1]
+            group_id = msg.get("group_id")
+            # 心跳单独排队，不与群消息相互等待，也不会重叠执行
+            key = "meta_event" if group_id is None else str(group_id)
+            groups.put(key, lambda msg=msg: main.handle_events(None, msg))
+        elif kind == "sync":
+            await groups.drain()
+            await drain_outboxes()
+            reply_connection.send(("synced", item[1]))
+
+    await groups.drain()
+    await drain_outboxes()
+    # 签到写入会为玩家累加积分，先写入签到再写回所有群组
+    persist_all_signins()
+    flush_all_data_managers()
+    shutdown_io_executor()
+    reply_connection.close()
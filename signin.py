@@ -1,14 +1,17 @@
 """
 签到系统
+
+每天签到开始时大量群友会在几秒内同时签到争夺前几名奖励。签到名次由群组常驻的
+SigninSequencer 在内存中按处理顺序分配，不读写文件；签到记录和积分累计在内存中，
+按批量或时间间隔在同一事务中写入存储。查询积分的命令会先写入待写入的签到。
 """
 
-import os
-import json
+import time
+import atexit
+import threading
 from datetime import datetime, timedelta, timezone
-from app.scripts.GunRouletteGame.DataManager import DataManager  # 确保导入
-
-# 签到记录文件名
-SIGNIN_RECORDS_FILENAME = "signin_records.json"
+from app.scripts.GunRouletteGame.DataManager import get_data_manager
+from app.scripts.GunRouletteGame.tracing import traced
 
 # 签到奖励配置
 SIGNIN_BASE_POINTS = 10  # 基础签到分数
@@ -20,71 +23,190 @@ SIGNIN_BONUS_POINTS = {  # 名次额外奖励
 SIGNIN_START_HOUR_UTC8 = 8  # 签到开始时间 (东八区)
 SIGNIN_END_HOUR_UTC8 = 23  # 签到结束时间 (东八区)
 
+# 未写入存储的签到记录达到该数量时触发批量写入
+SIGNIN_PERSIST_BATCH_SIZE = 50
+# 未写入存储的签到记录最长保留时间（秒）
+SIGNIN_PERSIST_INTERVAL_SECONDS = 1.0
 
-class SignIn:
-    def __init__(self, group_id, user_id):  # 移除 data_manager 参数
+# 进程内常驻的签到序号分配器 {group_id: SigninSequencer}
+_signin_sequencers = {}
+_signin_sequencers_lock = threading.Lock()
+
+
+def get_utc8_now():
+    """获取当前的东八区时间"""
+    return datetime.now(timezone(timedelta(hours=8)))
+
+
+def get_signin_sequencer(group_id):
+    """
+    获取群组对应的常驻签到序号分配器
+    """
+    group_id = str(group_id)
+    sequencer = _signin_sequencers.get(group_id)
+    if sequencer is None:
+        with _signin_sequencers_lock:
+            sequencer = _signin_sequencers.get(group_id)
+            if sequencer is None:
+                sequencer = SigninSequencer(group_id)
+                _signin_sequencers[group_id] = sequencer
+    return sequencer
+
+
+def get_loaded_signin_sequencers():
+    """获取当前进程中已创建的所有签到序号分配器"""
+    return list(_signin_sequencers.values())
+
+
+def persist_all_signins():
+    """将所有群组未写入的签到记录立即写入存储，进程退出时调用"""
+    for sequencer in get_loaded_signin_sequencers():
+        sequencer.persist()
+
+
+# 在 DataManager 的退出写回之前执行，保证签到积分也被写回
+atexit.register(persist_all_signins)
+
+
+class SigninSequencer:
+    """
+    群组签到序号分配器。
+
+    内存中保存当天已签到的 {user_id: 签到记录} 和名次计数，签到时只做字典查询和计数加一，
+    名次严格按调用顺序分配。新的签到记录和积分放入待写入队列，由 persist 批量写入存储。
+    load_day 和 persist 包含文件读写，应在存储线程池中、持有群组锁时调用；
+    sign 只访问内存，可直接在事件循环中调用。
+    """
+
+    def __init__(self, group_id):
         self.group_id = str(group_id)
-        self.user_id = str(user_id)
-        self.data_manager = DataManager(group_id=self.group_id)  # 内部实例化
-        # 构建数据目录路径，与 DataManager 保持一致性
-        base_data_path = os.path.join(
-            os.path.dirname(
-                os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            ),
-            "data",
-            "GunRouletteGame",
-        )
-        self.group_data_dir = os.path.join(base_data_path, self.group_id)
-        os.makedirs(self.group_data_dir, exist_ok=True)  # 确保群组数据目录存在
+        self.date_str = None  # 当前加载的东八区日期
+        self._signed = {}  # {user_id: signin_entry}
+        self._pending = []  # [(date_str, signin_entry)]，尚未写入存储的签到
+        self._pending_since = None
+        self._lock = threading.Lock()
+
+    def is_ready(self, date_str):
+        """
+        指定日期的签到记录是否已加载
+        """
+        return self.date_str == date_str
+
+    @traced("SigninSequencer.load_day")
+    def load_day(self, date_str):
+        """
+        从存储加载指定日期的签到记录，已加载时不重复读取
+        """
+        if self.is_ready(date_str):
+            return
+        # 心跳也会提前加载当天的签到记录，不计为群组活动
+        storage = get_data_manager(self.group_id, touch=False).storage
+        signed = {entry["user_id"]: entry for entry in storage.get_signins(date_str)}
+        with self._lock:
+            # 加入同一天尚未写入存储的签到
+            for pending_date, entry in self._pending:
+                if pending_date == date_str:
+                    signed[entry["user_id"]] = entry
+            self._signed = signed
+            self.date_str = date_str
+
+    def sign(self, user_id, now_utc8):
+        """
+        为用户分配当天的签到名次。
 
-        self.records_file_path = os.path.join(
-            self.group_data_dir, SIGNIN_RECORDS_FILENAME
+        Returns:
+            tuple: (签到记录, 是否为新签到)。已签到时返回原有记录和 False。
+        """
+        date_str = now_utc8.strftime("%Y-%m-%d")
+        if not self.is_ready(date_str):
+            raise RuntimeError(f"群 {self.group_id} 的 {date_str} 签到记录尚未加载")
+        with self._lock:
+            existing_entry = self._signed.get(user_id)
+            if existing_entry is not None:
+                return existing_entry, False
+            signin_order = len(self._signed) + 1
+            signin_entry = {
+                "user_id": user_id,
+                "timestamp": now_utc8.isoformat(),
+                "order": signin_order,
+                "points_awarded": SIGNIN_BASE_POINTS
+                + SIGNIN_BONUS_POINTS.get(signin_order, 0),
+            }
+            self._signed[user_id] = signin_entry
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.append((date_str, signin_entry))
+        return signin_entry, True
+
+    def is_persist_due(self):
+        """
+        待写入的签到达到批量大小或已等待超过写入间隔
+        """
+        if not self._pending:
+            return False
+        return (
+            len(self._pending) >= SIGNIN_PERSIST_BATCH_SIZE
+            or time.monotonic() - self._pending_since >= SIGNIN_PERSIST_INTERVAL_SECONDS
         )
-        self.signin_records = self._load_signin_records()
 
-    def _get_utc8_now(self):
-        """获取当前的东八区时间"""
-        return datetime.now(timezone(timedelta(hours=8)))
+    def has_pending(self):
+        return bool(self._pending)
 
-    def _load_signin_records(self):
+    @traced("SigninSequencer.persist")
+    def persist(self):
         """
-        加载指定群组的签到记录。
-        文件内容格式：
-        {
-          "YYYY-MM-DD": { // 东八区日期字符串
-            "sign_ins": [
-              {"user_id": "xxx", "timestamp": "iso_timestamp_utc8", "order": 1, "points_awarded": 60},
-              {"user_id": "yyy", "timestamp": "iso_timestamp_utc8", "order": 2, "points_awarded": 40}
-            ]
-          },
-          // ... 其他日期的记录
-        }
+        将待写入的签到记录批量写入存储，并在同一事务中为签到玩家累加积分、写回玩家数据，
+        返回时签到记录和积分都已提交
         """
-        if os.path.exists(self.records_file_path):
-            try:
-                with open(self.records_file_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                # 文件损坏或未找到（理论上FileNotFound已被os.path.exists处理）
-                return {}  # 返回空字典，将在保存时创建新文件
-        return {}  # 文件不存在，返回空字典
-
-    def _save_signin_records(self):
-        """保存签到记录到文件。"""
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+            self._pending_since = None
+        if not pending:
+            return
+        data_manager = get_data_manager(self.group_id)
+        entries_by_date = {}
+        score_changes = {}
+        for date_str, signin_entry in pending:
+            entries_by_date.setdefault(date_str, []).append(signin_entry)
+            user_id = signin_entry["user_id"]
+            score_changes[user_id] = (
+                score_changes.get(user_id, 0) + signin_entry["points_awarded"]
+            )
+        data_manager.add_player_scores(score_changes)
         try:
-            with open(self.records_file_path, "w", encoding="utf-8") as f:
-                json.dump(self.signin_records, f, ensure_ascii=False, indent=4)
-        except IOError as e:
-            # 实际应用中应处理这个错误，例如logging
-            # logging.error(f"Error saving sign-in records for group {self.group_id}: {e}")
-            print(
-                f"Error saving sign-in records for group {self.group_id}: {e}"
-            )  # 暂时用print
-            pass  # 简单处理，避免程序崩溃
+            with data_manager.storage.transaction():
+                for date_str, entries in entries_by_date.items():
+                    data_manager.storage.add_signins(date_str, entries)
+                data_manager.flush()
+        except Exception:
+            # 写入失败时撤销内存中的积分并放回队列，下次重试；
+            # 已写入的签到记录在重试时由存储跳过，不会重复
+            data_manager.add_player_scores(
+                {user_id: -points for user_id, points in score_changes.items()}
+            )
+            with self._lock:
+                self._pending = pending + self._pending
+                self._pending_since = time.monotonic()
+            raise
 
+
+class SignIn:
+    def __init__(self, group_id, user_id):  # 移除 data_manager 参数
+        self.group_id = str(group_id)
+        self.user_id = str(user_id)
+        # 签到名次和记录由群组常驻的序号分配器管理
+        self.sequencer = get_signin_sequencer(self.group_id)
+
+    def _get_utc8_now(self):
+        """获取当前的东八区时间"""
+        return get_utc8_now()
+
+    @traced("SignIn.perform_signin")
     def perform_signin(self):
         """
         处理用户签到逻辑。
+        当天的签到记录未加载时会先从存储加载（包含文件读取），之后只访问内存。
 
         Returns:
             dict: 包含签到结果和消息的字典。
@@ -101,39 +223,22 @@ class SignIn:
                 "message": f"不在签到时间内哦！请在每天东八区 {SIGNIN_START_HOUR_UTC8}:00 - {SIGNIN_END_HOUR_UTC8-1}:59 之间签到。",
             }
 
-        # 2. 获取或初始化当天的签到记录
-        daily_records = self.signin_records.setdefault(today_date_str, {"sign_ins": []})
-
-        # 3. 检查用户是否已签到
-        for record in daily_records["sign_ins"]:
-            if record["user_id"] == self.user_id:
-                return {
-                    "success": False,
-                    "message": f"您今天已经签到过了，获得了 {record.get('points_awarded', '未知')} 点积分。",
-                }
+        # 2. 分配签到名次，已签到时返回原有记录
+        self.sequencer.load_day(today_date_str)
+        signin_entry, is_new = self.sequencer.sign(self.user_id, now_utc8)
+        if not is_new:
+            return {
+                "success": False,
+                "message": f"您今天已经签到过了，获得了 {signin_entry.get('points_awarded', '未知')} 点积分。",
+            }
 
-        # 4. 执行签到
-        signin_order = len(daily_records["sign_ins"]) + 1
+        # 3. 签到记录和积分由序号分配器批量写入存储
+        signin_order = signin_entry["order"]
         base_points = SIGNIN_BASE_POINTS
         bonus_points = SIGNIN_BONUS_POINTS.get(signin_order, 0)
-        total_points_awarded = base_points + bonus_points
-
-        # 5. 添加签到记录
-        signin_entry = {
-            "user_id": self.user_id,
-            "timestamp": now_utc8.isoformat(),
-            "order": signin_order,
-            "points_awarded": total_points_awarded,
-        }
-        daily_records["sign_ins"].append(signin_entry)
-        self._save_signin_records()
-
-        # 6. 更新玩家总积分 (通过 self.data_manager 实例)
-        self.data_manager.update_player_score(self.user_id, total_points_awarded)
-        # 确保 DataManager 也保存了玩家数据的更改
-        # self.data_manager.save_player_data(self.user_id, self.data_manager.get_player_data(self.user_id)) # update_player_score 内部应该已经保存了
+        total_points_awarded = signin_entry["points_awarded"]
 
-        # 7. 构建成功消息
+        # 4. 构建成功消息
         message = f"🎉签到成功！您是今天第 {signin_order} 位签到的勇士！\n"
         message += f"获得了基础积分 {base_points} 点。"
         if bonus_points > 0:
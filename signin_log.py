@@ -0,0 +1,149 @@
+"""
+签到记录日志
+
+签到记录按东八区日期分文件追加写入：
+data_dir/群号/signin_records/YYYY-MM-DD.jsonl   每行一条签到记录
+
+只加载最近访问日期的记录到内存，用 {user_id: 记录} 判断是否重复签到，
+记录数即当天的签到名次计数，每次签到只追加一行，与群组签到历史长短无关。
+旧版的 signin_records.json 会在首次加载时拆分为按日文件。
+"""
+
+import os
+import json
+import logging
+from collections import OrderedDict
+from app.scripts.GunRouletteGame.fileio import (
+    TEMP_SUFFIX,
+    load_data_with_recovery,
+    mark_written,
+)
+from app.scripts.GunRouletteGame.metrics import StorageTimer
+from app.scripts.GunRouletteGame.codec import dumps_json, loads_json
+
+# 旧版签到记录文件名
+SIGNIN_RECORDS_FILENAME = "signin_records.json"
+# 按日签到记录目录名
+SIGNIN_RECORDS_DIRNAME = "signin_records"
+# 内存中缓存的签到日期数量
+SIGNIN_CACHED_DAYS = 2
+
+
+class SigninLog:
+    """
+    按日分区的签到记录。
+    """
+
+    def __init__(self, data_dir):
+        self.signin_dir = os.path.join(data_dir, SIGNIN_RECORDS_DIRNAME)
+        os.makedirs(self.signin_dir, exist_ok=True)
+        self._days = OrderedDict()  # {date_str: {user_id: signin_entry}}，按签到顺序排列
+        self._migrate_legacy_records(os.path.join(data_dir, SIGNIN_RECORDS_FILENAME))
+
+    def _day_file(self, date_str):
+        return os.path.join(self.signin_dir, f"{date_str}.jsonl")
+
+    def _migrate_legacy_records(self, legacy_file):
+        """
+        将旧版 signin_records.json 拆分为按日文件，原文件重命名为 .migrated
+        """
+        if not os.path.exists(legacy_file):
+            return
+        legacy_records = load_data_with_recovery(legacy_file) or {}
+        for date_str, daily_records in legacy_records.items():
+            day_file = self._day_file(date_str)
+            tmp_file = day_file + TEMP_SUFFIX
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                for signin_entry in daily_records.get("sign_ins", []):
+                    f.write(dumps_json(signin_entry) + "\n")
+            os.replace(tmp_file, day_file)
+            mark_written(day_file)
+        if os.path.exists(legacy_file):
+            os.replace(legacy_file, legacy_file + ".migrated")
+        logging.info(f"签到记录 {legacy_file} 已拆分为按日文件")
+
+    def _load_day(self, date_str):
+        day = self._days.get(date_str)
+        if day is not None:
+            self._days.move_to_end(date_str)
+            return day
+        day = {}
+        day_file = self._day_file(date_str)
+        if os.path.exists(day_file):
+            with StorageTimer("read"):
+                with open(day_file, "r", encoding="utf-8") as f:
+                    content = f.read()
+            for line in content.splitlines():
+                try:
+                    signin_entry = loads_json(line)
+                except json.JSONDecodeError:
+                    continue  # 跳过写入中断的行
+                day.setdefault(signin_entry["user_id"], signin_entry)
+            if content and not content.endswith("\n"):
+                # 上次写入中断留下的半行记录，补一个换行避免与新记录粘连
+                with open(day_file, "a", encoding="utf-8") as f:
+                    f.write("\n")
+        self._days[date_str] = day
+        while len(self._days) > SIGNIN_CACHED_DAYS:
+            self._days.popitem(last=False)
+        return day
+
+    def get(self, date_str, user_id):
+        """
+        获取用户当天的签到记录，未签到返回 None
+        """
+        return self._load_day(date_str).get(str(user_id))
+
+    def count(self, date_str):
+        """
+        获取当天已签到人数
+        """
+        return len(self._load_day(date_str))
+
+    def entries(self, date_str):
+        """
+        获取当天的签到记录列表，按签到顺序排列
+        """
+        return list(self._load_day(date_str).values())
+
+    def append(self, date_str, signin_entries):
+        """
+        追加一批签到记录，一次写入。
+        当天已有记录的玩家跳过（与 SQLite 后端的 INSERT OR IGNORE 一致），
+        写入签到后提交积分失败、整批重试时不会重复追加
+        """
+        day = self._load_day(date_str)
+        signin_entries = [
+            signin_entry
+            for signin_entry in signin_entries
+            if signin_entry["user_id"] not in day
+        ]
+        if not signin_entries:
+            return
+        day_file = self._day_file(date_str)
+        try:
+            with StorageTimer("append"):
+                with open(day_file, "a", encoding="utf-8") as f:
+                    f.write(
+                        "".join(
+                            dumps_json(signin_entry) + "\n"
+                            for signin_entry in signin_entries
+                        )
+                    )
+        except BaseException:
+            # 可能已写入部分记录，丢弃缓存，下次从文件重新加载
+            self._days.pop(date_str, None)
+            raise
+        mark_written(day_file)
+        for signin_entry in signin_entries:
+            day[signin_entry["user_id"]] = signin_entry
+
+    def dates(self):
+        """
+        列出所有有签到记录的日期
+        """
+        return sorted(
+            name[: -len(".jsonl")]
+            for name in os.listdir(self.signin_dir)
+            if name.endswith(".jsonl")
+        )
@@ -0,0 +1,467 @@
+"""
+经济模拟器
+
+按 GameManager 的规则模拟大量轮盘游戏，用于调整 DEFAULT_BULLET_COUNT、置权范围和计分倍数：
+- 每局从玩家池中抽取不重复的玩家依次biu，每次biu以 1/biubiu数 的概率中弹，
+  中弹即结束；biubiu数次都未中弹或愿意参与的玩家都已biu时按无人中弹结算
+- 得分变化由 GameManager.calculate_score_change 计算，与实际结算一致
+- 置权点数由可替换的置权策略决定，策略可以参考玩家当天开始时的累计得分
+
+安装了 NumPy 时按天批量抽样（中弹位置直接按几何分布抽取，与逐次biu等价），
+单核每秒可模拟数百万局；未安装时使用逐次biu的纯 Python 实现，结果的统计分布相同，速度较慢。
+
+输出：每天新增的总分（分数通胀）、每局和每次参与的得分均值与标准差、中弹位置分布、
+模拟结束时玩家累计得分的分布。命令行入口见 benchmarks/economy.py。
+"""
+
+import math
+import time
+import random
+from app.scripts.GunRouletteGame.GameManager import (
+    DEFAULT_BULLET_COUNT,
+    MAX_BET_AMOUNT,
+    MIN_BET_AMOUNT,
+    calculate_score_change,
+)
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+# NumPy 引擎每批模拟的局数上限，限制内存占用
+SIMULATION_BATCH_GAMES = 250_000
+
+
+class BetStrategy:
+    """
+    置权策略基类。
+
+    子类至少实现 bet()；NumPy 引擎调用 bets() 批量生成，默认逐个调用 bet()，
+    内置策略都重写了 bets()。
+    """
+
+    name = "base"
+
+    def bet(self, rng, player_id, score, min_bet, max_bet):
+        """
+        返回一名玩家的置权点数。
+
+        Args:
+            rng: random.Random
+            player_id: 玩家编号（0 起）
+            score: 玩家当天开始时的累计得分
+            min_bet, max_bet: 允许的置权范围
+        """
+        raise NotImplementedError
+
+    def bets(self, rng, player_ids, scores, min_bet, max_bet):
+        """
+        批量返回置权点数，参数和返回值都是与 player_ids 形状相同的 NumPy 数组。
+        rng 为 numpy.random.Generator。
+        """
+        python_rng = random.Random(int(rng.integers(2**63)))
+        flat_bets = [
+            self.bet(python_rng, int(player_id), int(score), min_bet, max_bet)
+            for player_id, score in zip(player_ids.ravel(), scores.ravel())
+        ]
+        return np.array(flat_bets, dtype=np.int64).reshape(player_ids.shape)
+
+
+class FixedBetStrategy(BetStrategy):
+    """
+    固定置权，超出范围时取边界值
+    """
+
+    def __init__(self, amount):
+        self.amount = int(amount)
+        self.name = f"fixed:{self.amount}"
+
+    def bet(self, rng, player_id, score, min_bet, max_bet):
+        return min(max_bet, max(min_bet, self.amount))
+
+    def bets(self, rng, player_ids, scores, min_bet, max_bet):
+        return np.full(
+            player_ids.shape, min(max_bet, max(min_bet, self.amount)), dtype=np.int64
+        )
+
+
+class UniformBetStrategy(BetStrategy):
+    """
+    在置权范围内均匀随机
+    """
+
+    name = "uniform"
+
+    def bet(self, rng, player_id, score, min_bet, max_bet):
+        return rng.randint(min_bet, max_bet)
+
+    def bets(self, rng, player_ids, scores, min_bet, max_bet):
+        return rng.integers(min_bet, max_bet + 1, size=player_ids.shape)
+
+
+class ChaseBetStrategy(BetStrategy):
+    """
+    累计得分为负时按最大置权翻本，否则按最小置权
+    """
+
+    name = "chase"
+
+    def bet(self, rng, player_id, score, min_bet, max_bet):
+        return max_bet if score < 0 else min_bet
+
+    def bets(self, rng, player_ids, scores, min_bet, max_bet):
+        return np.where(scores < 0, max_bet, min_bet).astype(np.int64)
+
+
+class ProtectBetStrategy(BetStrategy):
+    """
+    累计得分高于 threshold 时按最小置权保分，否则按最大置权
+    """
+
+    def __init__(self, threshold=1000):
+        self.threshold = int(threshold)
+        self.name = f"protect:{self.threshold}"
+
+    def bet(self, rng, player_id, score, min_bet, max_bet):
+        return min_bet if score > self.threshold else max_bet
+
+    def bets(self, rng, player_ids, scores, min_bet, max_bet):
+        return np.where(scores > self.threshold, min_bet, max_bet).astype(np.int64)
+
+
+def get_bet_strategy(spec):
+    """
+    按名称创建置权策略：
+    fixed:N      固定置权 N
+    min / max    最小 / 最大置权
+    uniform      均匀随机
+    chase        得分为负时最大置权，否则最小置权
+    protect[:N]  得分高于 N（默认 1000）时最小置权，否则最大置权
+    """
+    if isinstance(spec, BetStrategy):
+        return spec
+    name, _, argument = str(spec).partition(":")
+    if name == "fixed":
+        return FixedBetStrategy(argument or MIN_BET_AMOUNT)
+    if name == "min":
+        return FixedBetStrategy(MIN_BET_AMOUNT)
+    if name == "max":
+        return FixedBetStrategy(MAX_BET_AMOUNT)
+    if name == "uniform":
+        return UniformBetStrategy()
+    if name == "chase":
+        return ChaseBetStrategy()
+    if name == "protect":
+        return ProtectBetStrategy(argument or 1000)
+    raise ValueError(f"未知的置权策略: {spec}")
+
+
+class SimulationConfig:
+    """
+    一次模拟的参数。
+
+    Args:
+        bullet_count: biubiu数
+        players_per_game: 每局愿意参与的玩家数，少于biubiu数时最后按无人中弹结算
+        population: 玩家池大小，每局从中抽取不重复的玩家
+        games_per_day: 每天的局数
+        days: 模拟天数
+        strategy: 置权策略或策略名称
+        min_bet, max_bet: 置权范围，默认与 GameManager 相同
+        seed: 随机种子
+    """
+
+    def __init__(
+        self,
+        bullet_count=DEFAULT_BULLET_COUNT,
+        players_per_game=DEFAULT_BULLET_COUNT,
+        population=1000,
+        games_per_day=10_000,
+        days=30,
+        strategy="uniform",
+        min_bet=MIN_BET_AMOUNT,
+        max_bet=MAX_BET_AMOUNT,
+        seed=1,
+    ):
+        self.bullet_count = max(1, int(bullet_count))
+        self.players_per_game = max(1, int(players_per_game))
+        self.population = int(population)
+        self.games_per_day = int(games_per_day)
+        self.days = int(days)
+        self.strategy = get_bet_strategy(strategy)
+        self.min_bet = int(min_bet)
+        self.max_bet = int(max_bet)
+        self.seed = seed
+        if self.min_bet > self.max_bet:
+            raise ValueError("最小置权不能大于最大置权")
+        if self.shots_per_game() > self.population:
+            raise ValueError("每局参与人数不能超过玩家池大小")
+
+    def shots_per_game(self):
+        """
+        每局最多biu的次数
+        """
+        return min(self.bullet_count, self.players_per_game)
+
+    def to_dict(self):
+        return {
+            "bullet_count": self.bullet_count,
+            "players_per_game": self.players_per_game,
+            "population": self.population,
+            "games_per_day": self.games_per_day,
+            "days": self.days,
+            "strategy": self.strategy.name,
+            "min_bet": self.min_bet,
+            "max_bet": self.max_bet,
+            "seed": self.seed,
+        }
+
+
+class _RunningStats:
+    """
+    累计均值和标准差
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+
+    def add(self, count, total, total_squares):
+        self.count += int(count)
+        self.total += float(total)
+        self.total_squares += float(total_squares)
+
+    def to_dict(self):
+        if not self.count:
+            return {"mean": 0.0, "std": 0.0}
+        mean = self.total / self.count
+        variance = max(0.0, self.total_squares / self.count - mean * mean)
+        return {"mean": mean, "std": math.sqrt(variance)}
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def _distribution(values):
+    values = sorted(values)
+    count = len(values)
+    mean = sum(values) / count if count else 0.0
+    variance = sum((value - mean) ** 2 for value in values) / count if count else 0.0
+    return {
+        "mean": mean,
+        "std": math.sqrt(variance),
+        "min": values[0] if values else 0,
+        "p1": _percentile(values, 0.01),
+        "p50": _percentile(values, 0.50),
+        "p99": _percentile(values, 0.99),
+        "max": values[-1] if values else 0,
+    }
+
+
+def expected_hit_positions(bullet_count, shots_per_game):
+    """
+    按规则计算的中弹位置分布 {第几次biu中弹: 概率, "none": 无人中弹的概率}
+    """
+    hit_probability = 1.0 / bullet_count
+    positions = {
+        str(shot): (1 - hit_probability) ** (shot - 1) * hit_probability
+        for shot in range(1, shots_per_game + 1)
+    }
+    positions["none"] = (1 - hit_probability) ** shots_per_game
+    return positions
+
+
+def _sample_distinct_players(rng, games, shots, population):
+    """
+    为每局抽取 shots 名不重复的玩家，返回 (games, shots) 数组
+    """
+    if shots * 2 > population:
+        keys = rng.random((games, population))
+        return np.argpartition(keys, shots - 1, axis=1)[:, :shots]
+    player_ids = rng.integers(0, population, size=(games, shots))
+    while True:
+        ordered = np.sort(player_ids, axis=1)
+        duplicated = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+        count = int(duplicated.sum())
+        if not count:
+            return player_ids
+        # 有重复玩家的局整体重新抽取，结果仍是不重复组合上的均匀分布
+        player_ids[duplicated] = rng.integers(0, population, size=(count, shots))
+
+
+def _simulate_numpy(config):
+    rng = np.random.default_rng(config.seed)
+    shots = config.shots_per_game()
+    scores = np.zeros(config.population, dtype=np.int64)
+    hit_counts = np.zeros(shots + 1, dtype=np.int64)  # 最后一项为无人中弹
+    game_stats = _RunningStats()
+    participation_stats = _RunningStats()
+    daily_inflation = []
+    total_shots = 0
+    shot_index = np.arange(shots)
+
+    for _ in range(config.days):
+        day_change = np.zeros(config.population, dtype=np.int64)
+        remaining = config.games_per_day
+        while remaining > 0:
+            games = min(remaining, SIMULATION_BATCH_GAMES)
+            remaining -= games
+            player_ids = _sample_distinct_players(
+                rng, games, shots, config.population
+            )
+            bets = np.clip(
+                config.strategy.bets(
+                    rng, player_ids, scores[player_ids], config.min_bet, config.max_bet
+                ),
+                config.min_bet,
+                config.max_bet,
+            )
+            # 第几次biu（0 起）首次中弹；不小于 shots 表示本局无人中弹
+            hit_positions = rng.geometric(1.0 / config.bullet_count, size=games) - 1
+            hit_positions = np.minimum(hit_positions, shots)
+            shots_fired = np.minimum(hit_positions + 1, shots)
+            fired = shot_index < shots_fired[:, None]
+            is_hit = shot_index == hit_positions[:, None]
+            changes = calculate_score_change(config.bullet_count, bets, is_hit) * fired
+
+            hit_counts += np.bincount(hit_positions, minlength=shots + 1)
+            game_changes = changes.sum(axis=1)
+            game_stats.add(
+                games, game_changes.sum(), np.square(game_changes, dtype=np.float64).sum()
+            )
+            fired_changes = changes[fired]
+            participation_stats.add(
+                fired_changes.size,
+                fired_changes.sum(),
+                np.square(fired_changes, dtype=np.float64).sum(),
+            )
+            total_shots += int(shots_fired.sum())
+            day_change += np.bincount(
+                player_ids[fired], weights=fired_changes, minlength=config.population
+            ).astype(np.int64)
+        scores += day_change
+        daily_inflation.append(int(day_change.sum()))
+
+    return {
+        "hit_counts": hit_counts.tolist(),
+        "game_stats": game_stats,
+        "participation_stats": participation_stats,
+        "daily_inflation": daily_inflation,
+        "total_shots": total_shots,
+        "scores": scores.tolist(),
+    }
+
+
+def _simulate_python(config):
+    rng = random.Random(config.seed)
+    shots = config.shots_per_game()
+    hit_probability = 1.0 / config.bullet_count
+    scores = [0] * config.population
+    hit_counts = [0] * (shots + 1)
+    game_stats = _RunningStats()
+    participation_stats = _RunningStats()
+    daily_inflation = []
+    total_shots = 0
+
+    for _ in range(config.days):
+        day_change = [0] * config.population
+        for _ in range(config.games_per_day):
+            player_ids = rng.sample(range(config.population), shots)
+            hit_position = shots
+            participants = []
+            # 与 player_shoot 相同：逐次biu，每次以 1/biubiu数 的概率中弹，中弹即结束
+            for shot, player_id in enumerate(player_ids):
+                bet = config.strategy.bet(
+                    rng, player_id, scores[player_id], config.min_bet, config.max_bet
+                )
+                participants.append(
+                    (player_id, min(config.max_bet, max(config.min_bet, bet)))
+                )
+                if rng.random() < hit_probability:
+                    hit_position = shot
+                    break
+            hit_counts[hit_position] += 1
+            total_shots += len(participants)
+            game_change = 0
+            for shot, (player_id, bet) in enumerate(participants):
+                change = calculate_score_change(
+                    config.bullet_count, bet, shot == hit_position
+                )
+                day_change[player_id] += change
+                game_change += change
+                participation_stats.add(1, change, change * change)
+            game_stats.add(1, game_change, game_change * game_change)
+        for player_id, change in enumerate(day_change):
+            scores[player_id] += change
+        daily_inflation.append(sum(day_change))
+
+    return {
+        "hit_counts": hit_counts,
+        "game_stats": game_stats,
+        "participation_stats": participation_stats,
+        "daily_inflation": daily_inflation,
+        "total_shots": total_shots,
+        "scores": scores,
+    }
+
+
+def simulate(config, engine="auto"):
+    """
+    运行一次模拟。
+
+    Args:
+        config: SimulationConfig
+        engine: "numpy"、"python" 或 "auto"（安装了 NumPy 时使用 NumPy）
+
+    Returns:
+        dict: 模拟参数和统计结果
+    """
+    if engine == "auto":
+        engine = "numpy" if np is not None else "python"
+    if engine == "numpy" and np is None:
+        raise RuntimeError("未安装 NumPy，无法使用 numpy 引擎")
+
+    started = time.perf_counter()
+    if engine == "numpy":
+        raw = _simulate_numpy(config)
+    else:
+        raw = _simulate_python(config)
+    elapsed = time.perf_counter() - started
+
+    shots = config.shots_per_game()
+    total_games = config.games_per_day * config.days
+    hit_counts = raw["hit_counts"]
+    hit_positions = {
+        str(shot + 1): hit_counts[shot] / total_games if total_games else 0.0
+        for shot in range(shots)
+    }
+    hit_positions["none"] = hit_counts[shots] / total_games if total_games else 0.0
+    daily_inflation = raw["daily_inflation"]
+    return {
+        "engine": engine,
+        "config": config.to_dict(),
+        "games": total_games,
+        "shots": raw["total_shots"],
+        "elapsed_seconds": elapsed,
+        "games_per_second": total_games / elapsed if elapsed else 0.0,
+        "hit_rate": 1.0 - hit_positions["none"],
+        "hit_positions": hit_positions,
+        "expected_hit_positions": expected_hit_positions(config.bullet_count, shots),
+        "score_per_game": raw["game_stats"].to_dict(),
+        "score_per_participation": raw["participation_stats"].to_dict(),
+        "daily_inflation": {
+            **_distribution(daily_inflation),
+            "per_player_mean": (
+                sum(daily_inflation) / len(daily_inflation) / config.population
+                if daily_inflation
+                else 0.0
+            ),
+        },
+        "player_scores": _distribution(raw["scores"]),
+    }
@@ -0,0 +1,667 @@
+"""
+存储后端
+
+DataManager 通过统一的存储接口读写游戏状态、玩家数据、游戏历史和签到记录，
+当前提供两种实现：
+- JsonStorage：每个玩家一个 JSON 文件的原有目录结构
+- SqliteStorage：每个群组一个 WAL 模式的 SQLite 数据库，支持事务和索引查询
+
+通过 STORAGE_BACKEND（或环境变量 GUN_ROULETTE_STORAGE_BACKEND）按部署选择后端。
+"""
+
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+from app.scripts.GunRouletteGame.rank_index import RankIndex
+from app.scripts.GunRouletteGame.history_log import HistoryLog
+from app.scripts.GunRouletteGame.signin_log import SigninLog
+from app.scripts.GunRouletteGame.history_index import HistoryIndex, history_date_of
+from app.scripts.GunRouletteGame.metrics import StorageTimer
+from app.scripts.GunRouletteGame.fileio import (
+    DURABILITY_MODE,
+    atomic_write_data,
+    load_data_with_recovery,
+    mark_written,
+)
+from app.scripts.GunRouletteGame.codec import dumps_json, loads_json
+
+# 存储后端类型："json" 或 "sqlite"
+STORAGE_BACKEND = os.environ.get("GUN_ROULETTE_STORAGE_BACKEND", "json")
+
+# SQLite 数据库文件名
+SQLITE_DB_FILENAME = "roulette.db"
+# JSON 后端的游戏日志文件名
+GAME_JOURNAL_FILENAME = "game_journal.jsonl"
+
+
+def create_storage(data_dir, backend=None):
+    """
+    根据配置创建群组数据目录对应的存储后端实例
+    """
+    backend = backend or STORAGE_BACKEND
+    if backend == "json":
+        return JsonStorage(data_dir)
+    if backend == "sqlite":
+        return SqliteStorage(data_dir)
+    raise ValueError(f"未知的存储后端: {backend}")
+
+
+def is_group_data_dir(data_dir):
+    """
+    判断目录是否为群组数据目录：目录名为群号（纯数字），或已有游戏状态文件或 SQLite 数据库。
+    遍历数据根目录的工具用它跳过其他目录，避免在其中创建群组数据
+    """
+    if not os.path.isdir(data_dir):
+        return False
+    if os.path.basename(os.path.normpath(data_dir)).isdigit():
+        return True
+    return os.path.exists(os.path.join(data_dir, "game_status.json")) or os.path.exists(
+        os.path.join(data_dir, SQLITE_DB_FILENAME)
+    )
+
+
+def peek_current_game(data_dir, backend=None):
+    """
+    只读取群组数据目录中的游戏状态快照和游戏日志，返回 (current_game, 是否有游戏日志)，
+    不创建存储实例，也不创建任何目录，用于启动时查找有进行中游戏的群组
+    """
+    backend = backend or STORAGE_BACKEND
+    db_path = os.path.join(data_dir, SQLITE_DB_FILENAME)
+    # SQLite 后端尚未创建数据库时，加载群组会先导入原有的 JSON 文件
+    if backend == "sqlite" and os.path.exists(db_path):
+        try:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                row = conn.execute(
+                    "SELECT data FROM game_status WHERE id = 1"
+                ).fetchone()
+                has_events = (
+                    conn.execute("SELECT 1 FROM game_events LIMIT 1").fetchone()
+                    is not None
+                )
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None, False
+        game_status = loads_json(row[0]) if row else None
+    else:
+        game_status = load_data_with_recovery(
+            os.path.join(data_dir, "game_status.json")
+        )
+        journal_file = os.path.join(data_dir, GAME_JOURNAL_FILENAME)
+        has_events = os.path.exists(journal_file) and os.path.getsize(journal_file) > 0
+    if not isinstance(game_status, dict):
+        return None, has_events
+    return game_status.get("current_game"), has_events
+
+
+class Storage:
+    """
+    存储后端接口。
+
+    所有读取方法在数据不存在或损坏时返回 None（列表类返回空列表），
+    由调用方决定默认值。
+    """
+
+    @contextmanager
+    def transaction(self):
+        """
+        将多次写入合并为一次提交，不支持事务的后端直接执行
+        """
+        yield
+
+    def load_game_status(self):
+        raise NotImplementedError
+
+    def save_game_status(self, game_status):
+        raise NotImplementedError
+
+    def append_game_event(self, event):
+        """
+        向游戏日志追加一条进行中游戏的事件
+        """
+        raise NotImplementedError
+
+    def load_game_events(self):
+        """
+        获取上次清空之后的所有游戏日志事件，按追加顺序排列
+        """
+        raise NotImplementedError
+
+    def clear_game_events(self):
+        """
+        游戏状态快照写入后清空游戏日志
+        """
+        raise NotImplementedError
+
+    def load_player(self, user_id):
+        raise NotImplementedError
+
+    def save_players(self, players):
+        """
+        批量保存玩家数据 {user_id: player_data}
+        """
+        raise NotImplementedError
+
+    def top_players(self, k):
+        """
+        获取已保存数据中分数最高的前 k 名玩家
+        返回列表，每个元素是一个字典，包含玩家ID、总得分
+        """
+        raise NotImplementedError
+
+    def get_game_history(self, game_id):
+        raise NotImplementedError
+
+    def save_game_history(self, game_id, game_data):
+        raise NotImplementedError
+
+    def get_player_history(self, user_id, limit):
+        """
+        获取玩家最近 limit 局的游戏历史记录，最新的在前
+        """
+        raise NotImplementedError
+
+    def get_history_by_date(self, date_str):
+        """
+        获取指定日期（东八区 YYYY-MM-DD）开始的所有游戏历史记录
+        """
+        raise NotImplementedError
+
+    def rebuild_history_indexes(self):
+        """
+        根据已保存的游戏历史重建按玩家和按日期的索引，返回索引的记录数
+        """
+        raise NotImplementedError
+
+    def get_signins(self, date_str):
+        """
+        获取指定日期（东八区 YYYY-MM-DD）的签到记录列表，按签到顺序排列
+        """
+        raise NotImplementedError
+
+    def get_signin(self, date_str, user_id):
+        """
+        获取用户在指定日期的签到记录，未签到返回 None
+        """
+        raise NotImplementedError
+
+    def count_signins(self, date_str):
+        """
+        获取指定日期已签到人数，即下一位签到者的名次减一
+        """
+        raise NotImplementedError
+
+    def add_signin(self, date_str, signin_entry):
+        raise NotImplementedError
+
+    def add_signins(self, date_str, signin_entries):
+        """
+        批量添加同一日期的签到记录，玩家当天已有记录时跳过，重复写入同一批记录不会产生重复
+        """
+        for signin_entry in signin_entries:
+            self.add_signin(date_str, signin_entry)
+
+    def close(self):
+        pass
+
+
+class JsonStorage(Storage):
+    """
+    JSON 文件存储后端，目录结构：
+    data_dir/群号/game_status.json
+    data_dir/群号/game_journal.jsonl（上次快照之后进行中游戏的事件，每行一条）
+    data_dir/群号/player_data/玩家QQ号.json
+    data_dir/群号/game_history/YYYY-MM-DD.NNN.jsonl（追加写入的分段日志，见 history_log.py）
+    data_dir/群号/game_history/by_player/、by_date/（二级索引，见 history_index.py）
+    data_dir/群号/game_history/游戏ID.json（旧版每局一个文件，只读兼容，重建索引时迁移到日志）
+    data_dir/群号/signin_records/YYYY-MM-DD.jsonl（按日签到记录，见 signin_log.py）
+    data_dir/群号/rank_index.json
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.game_history_dir = os.path.join(data_dir, "game_history")
+        self.player_data_dir = os.path.join(data_dir, "player_data")
+        os.makedirs(self.game_history_dir, exist_ok=True)
+        os.makedirs(self.player_data_dir, exist_ok=True)
+
+        self.status_file = os.path.join(data_dir, "game_status.json")
+        self.journal_file = os.path.join(data_dir, GAME_JOURNAL_FILENAME)
+        self.rank_index = RankIndex(
+            os.path.join(data_dir, "rank_index.json"), self.player_data_dir
+        )
+        self.history_log = HistoryLog(self.game_history_dir)
+        self.history_index = HistoryIndex(self.game_history_dir)
+        self.signin_log = SigninLog(data_dir)
+
+    @staticmethod
+    def _read_json(path):
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return None
+
+    def load_game_status(self):
+        return load_data_with_recovery(self.status_file)
+
+    def save_game_status(self, game_status):
+        atomic_write_data(self.status_file, game_status)
+
+    def append_game_event(self, event):
+        with StorageTimer("append"):
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write(dumps_json(event) + "\n")
+        mark_written(self.journal_file)
+
+    def load_game_events(self):
+        if not os.path.exists(self.journal_file):
+            return []
+        events = []
+        with StorageTimer("read"):
+            with open(self.journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        events.append(loads_json(line))
+                    except json.JSONDecodeError:
+                        # 追加时中断留下的不完整行
+                        continue
+        return events
+
+    def clear_game_events(self):
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, "w", encoding="utf-8"):
+                pass
+
+    def load_player(self, user_id):
+        return load_data_with_recovery(
+            os.path.join(self.player_data_dir, f"{user_id}.json")
+        )
+
+    def save_players(self, players):
+        for user_id, player_data in players.items():
+            atomic_write_data(
+                os.path.join(self.player_data_dir, f"{user_id}.json"), player_data
+            )
+            self.rank_index.update(user_id, player_data["total_score"])
+        # 排行榜索引在玩家文件之后写入，保证索引不早于玩家数据
+        self.rank_index.save()
+
+    def top_players(self, k):
+        return self.rank_index.top(k)
+
+    def get_game_history(self, game_id):
+        game_data = self.history_log.get(game_id)
+        if game_data is None:
+            # 兼容旧版每局一个文件的历史记录
+            game_data = self._read_json(
+                os.path.join(self.game_history_dir, f"{game_id}.json")
+            )
+        return game_data
+
+    def save_game_history(self, game_id, game_data):
+        location = self.history_log.append(game_id, game_data)
+        self.history_index.add(location, game_data)
+
+    def get_player_history(self, user_id, limit):
+        return self._read_locations(self.history_index.player_locations(user_id, limit))
+
+    def get_history_by_date(self, date_str):
+        return self._read_locations(self.history_index.date_locations(date_str))
+
+    def _read_locations(self, locations):
+        records = []
+        for location in locations:
+            game_data = self.history_log.read_at(location)
+            if game_data is not None:
+                records.append(game_data)
+        return records
+
+    def rebuild_history_indexes(self):
+        """
+        将旧版单文件历史记录迁移到分段日志（原文件移动到 game_history/legacy/），
+        然后重建偏移索引和二级索引
+        """
+        legacy_dir = os.path.join(self.game_history_dir, "legacy")
+        legacy_files = sorted(
+            name for name in os.listdir(self.game_history_dir) if name.endswith(".json")
+        )
+        if legacy_files:
+            os.makedirs(legacy_dir, exist_ok=True)
+        for history_file in legacy_files:
+            history_path = os.path.join(self.game_history_dir, history_file)
+            game_data = self._read_json(history_path)
+            if game_data is not None:
+                self.history_log.append(game_data["game_id"], game_data)
+            os.replace(history_path, os.path.join(legacy_dir, history_file))
+
+        self.history_index.clear()
+        return self.history_log.rebuild_index(on_record=self.history_index.add)
+
+    def iter_game_history(self):
+        """
+        遍历所有游戏历史记录，包括旧版单文件记录和分段日志中的记录
+        """
+        for history_file in sorted(os.listdir(self.game_history_dir)):
+            if history_file.endswith(".json"):
+                game_data = self._read_json(
+                    os.path.join(self.game_history_dir, history_file)
+                )
+                if game_data is not None:
+                    yield game_data
+        for _, game_data in self.history_log.iter_records():
+            yield game_data
+
+    def get_signins(self, date_str):
+        return self.signin_log.entries(date_str)
+
+    def get_signin(self, date_str, user_id):
+        return self.signin_log.get(date_str, user_id)
+
+    def count_signins(self, date_str):
+        return self.signin_log.count(date_str)
+
+    def add_signin(self, date_str, signin_entry):
+        self.signin_log.append(date_str, [signin_entry])
+
+    def add_signins(self, date_str, signin_entries):
+        self.signin_log.append(date_str, signin_entries)
+
+    def close(self):
+        self.history_log.close()
+
+
+class SqliteStorage(Storage):
+    """
+    SQLite 存储后端，数据库文件为 data_dir/群号/roulette.db，使用 WAL 日志模式。
+
+    首次创建数据库时会自动导入同目录下已有的 JSON 数据。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS game_status (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        data TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS game_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        data TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS players (
+        user_id TEXT PRIMARY KEY,
+        total_score INTEGER NOT NULL,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_players_score ON players (total_score DESC, user_id);
+    CREATE TABLE IF NOT EXISTS game_history (
+        game_id TEXT PRIMARY KEY,
+        start_time TEXT,
+        end_time TEXT,
+        outcome TEXT,
+        hit_player_id TEXT,
+        data TEXT NOT NULL,
+        start_date TEXT
+    );
+    CREATE TABLE IF NOT EXISTS game_participants (
+        game_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        end_time TEXT,
+        PRIMARY KEY (game_id, user_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_game_participants_user
+        ON game_participants (user_id, end_time DESC);
+    CREATE TABLE IF NOT EXISTS signins (
+        date TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        signin_order INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (date, user_id)
+    );
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        db_path = os.path.join(data_dir, SQLITE_DB_FILENAME)
+        is_new_db = not os.path.exists(db_path)
+        # isolation_level=None 关闭隐式事务，由 transaction() 显式控制
+        self._conn = sqlite3.connect(
+            db_path, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # 与 JSON 后端的持久化模式对应：always 每次提交都同步，batch 由 WAL 检查点同步
+        synchronous = {"always": "FULL", "batch": "NORMAL"}.get(DURABILITY_MODE, "OFF")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.executescript(self.SCHEMA)
+        self._transaction_depth = 0
+        if is_new_db:
+            self._import_json_data()
+        else:
+            self._migrate_schema()
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_game_history_start_date "
+            "ON game_history (start_date)"
+        )
+
+    def _migrate_schema(self):
+        """
+        为早期创建的数据库补充 start_date 列并重建历史索引
+        """
+        columns = [
+            row[1] for row in self._conn.execute("PRAGMA table_info(game_history)")
+        ]
+        if "start_date" not in columns:
+            self._conn.execute("ALTER TABLE game_history ADD COLUMN start_date TEXT")
+            self.rebuild_history_indexes()
+
+    @contextmanager
+    def transaction(self):
+        if self._transaction_depth:
+            # 已处于事务中，并入外层事务统一提交
+            self._transaction_depth += 1
+            try:
+                yield
+            finally:
+                self._transaction_depth -= 1
+            return
+        self._transaction_depth = 1
+        self._conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        else:
+            with StorageTimer("commit"):
+                self._conn.execute("COMMIT")
+        finally:
+            self._transaction_depth = 0
+
+    def _import_json_data(self):
+        """
+        从同目录下的 JSON 文件导入已有数据，用于从 JSON 后端切换到 SQLite 后端
+        """
+        if not os.path.exists(os.path.join(self.data_dir, "game_status.json")):
+            return
+        json_storage = JsonStorage(self.data_dir)
+        with self.transaction():
+            game_status = json_storage.load_game_status()
+            if game_status is not None:
+                self.save_game_status(game_status)
+            for event in json_storage.load_game_events():
+                self.append_game_event(event)
+            players = {}
+            for player_file in os.listdir(json_storage.player_data_dir):
+                if player_file.endswith(".json"):
+                    user_id = player_file[: -len(".json")]
+                    player_data = json_storage.load_player(user_id)
+                    if player_data is not None:
+                        players[user_id] = player_data
+            self.save_players(players)
+            for game_data in json_storage.iter_game_history():
+                self.save_game_history(game_data["game_id"], game_data)
+            for date_str in json_storage.signin_log.dates():
+                self.add_signins(date_str, json_storage.get_signins(date_str))
+
+    def load_game_status(self):
+        with StorageTimer("read"):
+            row = self._conn.execute(
+                "SELECT data FROM game_status WHERE id = 1"
+            ).fetchone()
+        return loads_json(row[0]) if row else None
+
+    def save_game_status(self, game_status):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO game_status (id, data) VALUES (1, ?)",
+            (dumps_json(game_status),),
+        )
+
+    def append_game_event(self, event):
+        self._conn.execute(
+            "INSERT INTO game_events (data) VALUES (?)",
+            (dumps_json(event),),
+        )
+
+    def load_game_events(self):
+        with StorageTimer("read"):
+            rows = self._conn.execute(
+                "SELECT data FROM game_events ORDER BY seq"
+            ).fetchall()
+        return [loads_json(row[0]) for row in rows]
+
+    def clear_game_events(self):
+        self._conn.execute("DELETE FROM game_events")
+
+    def load_player(self, user_id):
+        with StorageTimer("read"):
+            row = self._conn.execute(
+                "SELECT data FROM players WHERE user_id = ?", (str(user_id),)
+            ).fetchone()
+        return loads_json(row[0]) if row else None
+
+    def save_players(self, players):
+        with self.transaction():
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO players (user_id, total_score, data) VALUES (?, ?, ?)",
+                [
+                    (
+                        str(user_id),
+                        player_data["total_score"],
+                        dumps_json(player_data),
+                    )
+                    for user_id, player_data in players.items()
+                ],
+            )
+
+    def top_players(self, k):
+        rows = self._conn.execute(
+            "SELECT user_id, total_score FROM players ORDER BY total_score DESC, user_id LIMIT ?",
+            (k,),
+        ).fetchall()
+        return [{"user_id": user_id, "total_score": score} for user_id, score in rows]
+
+    def get_game_history(self, game_id):
+        row = self._conn.execute(
+            "SELECT data FROM game_history WHERE game_id = ?", (game_id,)
+        ).fetchone()
+        return loads_json(row[0]) if row else None
+
+    def save_game_history(self, game_id, game_data):
+        with self.transaction():
+            self._conn.execute(
+                "INSERT OR REPLACE INTO game_history "
+                "(game_id, start_time, end_time, outcome, hit_player_id, data, start_date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    game_id,
+                    game_data.get("start_time"),
+                    game_data.get("end_time"),
+                    game_data.get("outcome"),
+                    game_data.get("hit_player_id"),
+                    dumps_json(game_data),
+                    history_date_of(game_data),
+                ),
+            )
+            self._index_participants(game_id, game_data)
+
+    def _index_participants(self, game_id, game_data):
+        self._conn.execute("DELETE FROM game_participants WHERE game_id = ?", (game_id,))
+        self._conn.executemany(
+            "INSERT INTO game_participants (game_id, user_id, end_time) VALUES (?, ?, ?)",
+            [
+                (game_id, str(user_id), game_data.get("end_time"))
+                for user_id in game_data.get("participants_log", {})
+            ],
+        )
+
+    def get_player_history(self, user_id, limit):
+        rows = self._conn.execute(
+            "SELECT h.data FROM game_participants p "
+            "JOIN game_history h ON h.game_id = p.game_id "
+            "WHERE p.user_id = ? ORDER BY p.end_time DESC LIMIT ?",
+            (str(user_id), limit),
+        ).fetchall()
+        return [loads_json(row[0]) for row in rows]
+
+    def get_history_by_date(self, date_str):
+        rows = self._conn.execute(
+            "SELECT data FROM game_history WHERE start_date = ? ORDER BY start_time",
+            (date_str,),
+        ).fetchall()
+        return [loads_json(row[0]) for row in rows]
+
+    def rebuild_history_indexes(self):
+        rows = self._conn.execute("SELECT game_id, data FROM game_history").fetchall()
+        with self.transaction():
+            self._conn.execute("DELETE FROM game_participants")
+            for game_id, data in rows:
+                game_data = loads_json(data)
+                self._conn.execute(
+                    "UPDATE game_history SET start_date = ? WHERE game_id = ?",
+                    (history_date_of(game_data), game_id),
+                )
+                self._index_participants(game_id, game_data)
+        return len(rows)
+
+    def get_signins(self, date_str):
+        rows = self._conn.execute(
+            "SELECT data FROM signins WHERE date = ? ORDER BY signin_order",
+            (date_str,),
+        ).fetchall()
+        return [loads_json(row[0]) for row in rows]
+
+    def get_signin(self, date_str, user_id):
+        row = self._conn.execute(
+            "SELECT data FROM signins WHERE date = ? AND user_id = ?",
+            (date_str, str(user_id)),
+        ).fetchone()
+        return loads_json(row[0]) if row else None
+
+    def count_signins(self, date_str):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM signins WHERE date = ?", (date_str,)
+        ).fetchone()[0]
+
+    def add_signin(self, date_str, signin_entry):
+        self.add_signins(date_str, [signin_entry])
+
+    def add_signins(self, date_str, signin_entries):
+        with self.transaction():
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO signins (date, user_id, signin_order, data) VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        date_str,
+                        signin_entry["user_id"],
+                        signin_entry["order"],
+                        dumps_json(signin_entry),
+                    )
+                    for signin_entry in signin_entries
+                ],
+            )
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,70 @@
+"""
+功能开关缓存
+
+app.switch.load_switch 每次调用都会读取开关文件。开关状态只在管理员发送 grg 时变化，
+因此在内存中缓存每个群组的开关状态：toggle_function_status 通过 save_function_status
+写入时同步更新缓存，其他修改开关文件的代码应调用 invalidate_switch 使缓存失效。
+缓存项超过 SWITCH_CACHE_TTL_SECONDS 后重新读取，兜底未调用 invalidate_switch 的外部修改。
+"""
+
+import time
+import threading
+from app.switch import load_switch, save_switch
+
+# 开关名称
+SWITCH_NAME = "GunRouletteGame"
+# 缓存有效期（秒）
+SWITCH_CACHE_TTL_SECONDS = 60
+
+# {group_id: (开关状态, 读取时间)}
+_switch_cache = {}
+_switch_cache_lock = threading.Lock()
+
+
+def get_cached_switch(group_id):
+    """
+    从缓存获取开关状态，不访问文件。未缓存或已过期时返回 None
+    """
+    cached = _switch_cache.get(str(group_id))
+    if cached is None:
+        return None
+    status, loaded_at = cached
+    if time.monotonic() - loaded_at > SWITCH_CACHE_TTL_SECONDS:
+        return None
+    return status
+
+
+def load_function_status(group_id):
+    """
+    获取开关状态，未缓存时读取开关文件并写入缓存
+    """
+    status = get_cached_switch(group_id)
+    if status is not None:
+        return status
+    # 读取文件时持有锁，避免与 save_function_status 交错写入过期状态
+    with _switch_cache_lock:
+        status = get_cached_switch(group_id)
+        if status is None:
+            status = bool(load_switch(group_id, SWITCH_NAME))
+            _switch_cache[str(group_id)] = (status, time.monotonic())
+    return status
+
+
+def save_function_status(group_id, status):
+    """
+    保存开关状态，并同步更新缓存
+    """
+    with _switch_cache_lock:
+        save_switch(group_id, SWITCH_NAME, status)
+        _switch_cache[str(group_id)] = (bool(status), time.monotonic())
+
+
+def invalidate_switch(group_id=None):
+    """
+    使开关缓存失效，group_id 为空时清空所有群组的缓存
+    """
+    with _switch_cache_lock:
+        if group_id is None:
+            _switch_cache.clear()
+        else:
+            _switch_cache.pop(str(group_id), None)
@@ -0,0 +1,260 @@
+"""
+事件追踪
+
+按比例抽样群命令，为每个被抽样的事件分配 trace_id，并记录带耗时的区段（span）：
+- handle_group_message   分发（开关检查、禁用群检查）到命令处理结束
+- command                命令处理函数
+- lock_wait              等待群组锁
+- run_io                 存储线程池调用（含排队等待），线程中的区段挂在其下
+- GameManager.*          游戏逻辑各步骤
+- DataManager.flush      写回
+- storage.<操作>         每次状态文件读写、追加、fsync 和 SQLite 提交
+- send_group_msg         发送队列实际发送，记录消息在队列中的等待时间
+
+区段按行写入数据目录旁的 GunRouletteGame_traces/日期.jsonl（可用环境变量 GUN_ROULETTE_TRACE_DIR
+指定目录，不放在数据目录中，以免被当作群组目录），每行一个 JSON 对象：
+trace_id, span_id, parent_id, name, start（Unix 时间戳）, duration_ms, thread, attrs，出错时带 error。
+区段先缓存在内存中，由心跳写入文件，进程退出时写入剩余部分。
+
+抽样比例由环境变量 GUN_ROULETTE_TRACE_RATE（0~1，默认 0）设定。
+未被抽样的事件中 span() 只读取一次 contextvar。
+"""
+
+import os
+import json
+import time
+import atexit
+import random
+import logging
+import threading
+import functools
+import contextvars
+from collections import deque
+
+# 追踪结果目录，为空时使用与数据目录同级的 GunRouletteGame_traces
+TRACE_DIR = os.environ.get("GUN_ROULETTE_TRACE_DIR", "")
+# 内存中最多缓存的区段数，超出时丢弃最早的区段
+TRACE_BUFFER_LIMIT = 20000
+
+_sample_rate = float(os.environ.get("GUN_ROULETTE_TRACE_RATE", "0") or 0)
+_current_span = contextvars.ContextVar("gun_roulette_trace_span", default=None)
+_finished_spans = deque()
+_finished_lock = threading.Lock()
+_dropped_count = 0
+
+
+def get_trace_rate():
+    return _sample_rate
+
+
+def set_trace_rate(sample_rate):
+    """
+    设置抽样比例，0 表示关闭
+    """
+    global _sample_rate
+    _sample_rate = min(1.0, max(0.0, float(sample_rate)))
+
+
+def _new_id(bits):
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def _record(span_data):
+    global _dropped_count
+    with _finished_lock:
+        if len(_finished_spans) >= TRACE_BUFFER_LIMIT:
+            _finished_spans.popleft()
+            _dropped_count += 1
+        _finished_spans.append(span_data)
+
+
+class Span:
+    """
+    一个计时区段，作为上下文管理器使用，进入时成为当前区段
+    """
+
+    __slots__ = (
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "attrs",
+        "_start",
+        "_started",
+        "_token",
+    )
+
+    def __init__(self, trace_id, parent_id, name, attrs):
+        self.trace_id = trace_id
+        self.span_id = _new_id(32)
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+
+    def set_attribute(self, key, value):
+        self.attrs[key] = value
+
+    def __enter__(self):
+        self._start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration = time.perf_counter() - self._started
+        _current_span.reset(self._token)
+        span_data = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self._start, 6),
+            "duration_ms": round(duration * 1000, 3),
+            "thread": threading.current_thread().name,
+            "attrs": self.attrs,
+        }
+        if exc_type is not None:
+            span_data["error"] = f"{exc_type.__name__}: {exc}"
+        _record(span_data)
+        return False
+
+
+class _NoopSpan:
+    """
+    未被抽样时使用的空区段
+    """
+
+    __slots__ = ()
+
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def start_trace(name, **attrs):
+    """
+    按抽样比例开始一个新的追踪，返回根区段；未被抽样时返回空区段
+    """
+    if _sample_rate <= 0 or random.random() >= _sample_rate:
+        return _NOOP_SPAN
+    return Span(_new_id(64), None, name, attrs)
+
+
+def span(name, **attrs):
+    """
+    在当前追踪中创建子区段，当前没有追踪时返回空区段
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP_SPAN
+    return Span(parent.trace_id, parent.span_id, name, attrs)
+
+
+def traced(name):
+    """
+    装饰器：在当前追踪中为同步函数的每次调用记录区段
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parent = _current_span.get()
+            if parent is None:
+                return func(*args, **kwargs)
+            with Span(parent.trace_id, parent.span_id, name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def current_trace_ref():
+    """
+    获取当前区段的 (trace_id, span_id)，用于在其他任务中关联到该追踪；没有追踪时返回 None
+    """
+    current = _current_span.get()
+    if current is None:
+        return None
+    return current.trace_id, current.span_id
+
+
+def span_from_ref(trace_ref, name, **attrs):
+    """
+    以 current_trace_ref() 的结果为父区段创建区段，trace_ref 为 None 时返回空区段
+    """
+    if trace_ref is None:
+        return _NOOP_SPAN
+    trace_id, parent_id = trace_ref
+    return Span(trace_id, parent_id, name, attrs)
+
+
+def detach_trace():
+    """
+    在后台任务开始时调用，使其不再继承创建它的事件的追踪
+    """
+    _current_span.set(None)
+
+
+def get_trace_dir():
+    """
+    获取追踪结果目录
+    """
+    if TRACE_DIR:
+        return TRACE_DIR
+    # 存储层通过 metrics 引用本模块，数据目录在写入时再获取，避免循环导入
+    from app.scripts.GunRouletteGame.DataManager import BASE_DATA_DIR
+
+    return os.path.normpath(BASE_DATA_DIR) + "_traces"
+
+
+def flush_traces():
+    """
+    把缓存的区段按日期追加写入 JSONL 文件
+    """
+    global _dropped_count
+    with _finished_lock:
+        if not _finished_spans and not _dropped_count:
+            return
+        spans = list(_finished_spans)
+        _finished_spans.clear()
+        dropped = _dropped_count
+        _dropped_count = 0
+    if dropped:
+        logging.warning(f"追踪区段缓存已满，丢弃了 {dropped} 个区段")
+    if not spans:
+        return
+    trace_dir = get_trace_dir()
+    os.makedirs(trace_dir, exist_ok=True)
+    spans_by_date = {}
+    for span_data in spans:
+        date_str = time.strftime("%Y-%m-%d", time.localtime(span_data["start"]))
+        spans_by_date.setdefault(date_str, []).append(span_data)
+    for date_str, day_spans in spans_by_date.items():
+        with open(
+            os.path.join(trace_dir, f"{date_str}.jsonl"), "a", encoding="utf-8"
+        ) as f:
+            f.write(
+                "".join(
+                    json.dumps(span_data, ensure_ascii=False) + "\n"
+                    for span_data in day_spans
+                )
+            )
+
+
+def _flush_traces_at_exit():
+    try:
+        flush_traces()
+    except Exception as e:
+        logging.error(f"写入追踪区段失败: {e}")
+
+
+atexit.register(_flush_traces_at_exit)